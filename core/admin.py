@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
-from .models import NotaFiscal, Empresa, PerfilUsuario, Cliente
+from .models import NotaFiscal, NotaFiscalItem, Empresa, PerfilUsuario, Cliente
 
 
 @admin.register(Empresa)
@@ -118,8 +118,20 @@ admin.site.unregister(User)
 admin.site.register(User, CustomUserAdmin)
 
 
+class NotaFiscalItemInline(admin.TabularInline):
+    model = NotaFiscalItem
+    extra = 0
+    can_delete = False
+    fields = ('numero_item', 'codigo', 'descricao', 'ncm', 'quantidade', 'valor_unitario', 'valor_total', 'desconto')
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(NotaFiscal)
 class NotaFiscalAdmin(admin.ModelAdmin):
+    inlines = (NotaFiscalItemInline,)
     list_display = ('numero', 'serie', 'ambiente', 'data_emissao', 'valor_total', 'status', 'protocolo_autorizacao')
     list_filter = ('ambiente', 'serie', 'status', 'data_emissao')
     search_fields = ('numero', 'cliente__nome', 'chave', 'protocolo_autorizacao')
@@ -15,4 +15,10 @@ class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     
     # Define o nome amigável que aparecerá no painel administrativo
-    verbose_name = 'Gestão Principal (Notas e Home)'
\ No newline at end of file
+    verbose_name = 'Gestão Principal (Notas e Home)'
+
+    def ready(self):
+        from django.db.models.signals import post_save
+        from .services import nota_fiscal_salva
+        # DANFE e PDF da NuvemFiscal em cache saem quando a nota é cancelada
+        post_save.connect(nota_fiscal_salva, sender='core.NotaFiscal')
@@ -0,0 +1,117 @@
+"""
+Arquivo de XMLs antigos: tira do banco o xml_assinado de notas com mais de
+XML_ARQUIVO_DIAS dias e guarda em arquivos .xml.gz endereçados pelo conteúdo.
+
+O XML autorizado só volta a ser lido em auditorias, mas é o que mais ocupa
+espaço na tabela de notas. Arquivado, a coluna fica NULL e a nota guarda
+apenas o hash (xml_assinado_arquivo); ler nota.xml_assinado busca o arquivo
+automaticamente (ver XMLComprimidoField), então DANFE, exportações e o
+pacote do contador continuam funcionando sem mudança.
+
+Os arquivos ficam no storage 'arquivo_xml' (settings.STORAGES), em
+<hash[:2]>/<hash[2:4]>/<hash>.xml.gz — o mesmo XML é gravado uma única vez.
+O destino precisa ser durável e o mesmo lido em produção: sem
+XML_ARQUIVO_DIR ou XML_ARQUIVO_STORAGE configurados, arquivar_xmls recusa.
+
+Funções principais:
+    guardar_xml(xml) -> chave
+    ler_xml(chave) -> xml
+    arquivar_xmls(dias=None, empresa=None, lote=500) -> quantidade de notas
+"""
+
+import gzip
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import NotaFiscal
+
+STORAGE = "arquivo_xml"
+
+
+def arquivo_configurado():
+    """Destino definido explicitamente (diretório persistente ou outro backend, como S3)."""
+    backend = settings.STORAGES.get(STORAGE, {}).get("BACKEND", "")
+    return bool(settings.XML_ARQUIVO_DIR) or backend != "django.core.files.storage.FileSystemStorage"
+
+
+def _storage():
+    return storages[STORAGE]
+
+
+def _caminho(chave):
+    return f"{chave[:2]}/{chave[2:4]}/{chave}.xml.gz"
+
+
+def guardar_xml(xml):
+    """Grava o XML comprimido (se ainda não existir) e devolve a chave (sha256 do conteúdo)."""
+    dados = xml.encode("utf-8")
+    chave = hashlib.sha256(dados).hexdigest()
+    caminho = _caminho(chave)
+
+    storage = _storage()
+    if not storage.exists(caminho):
+        # mtime=0: mesmo XML gera sempre os mesmos bytes
+        storage.save(caminho, ContentFile(gzip.compress(dados, mtime=0)))
+    return chave
+
+
+def ler_xml(chave):
+    with _storage().open(_caminho(chave), "rb") as arquivo:
+        return gzip.decompress(arquivo.read()).decode("utf-8")
+
+
+def notas_a_arquivar(dias=None, empresa=None):
+    """Notas com XML ainda no banco emitidas há mais de `dias` dias."""
+    dias = settings.XML_ARQUIVO_DIAS if dias is None else dias
+    notas = NotaFiscal.objects.filter(
+        xml_assinado__isnull=False,
+        data_emissao__lt=timezone.now() - timedelta(days=dias),
+    )
+    if empresa is not None:
+        notas = notas.filter(empresa=empresa)
+    return notas
+
+
+def arquivar_xmls(dias=None, empresa=None, lote=500):
+    """
+    Move o xml_assinado das notas antigas para o arquivo, em lotes paginados
+    por id (cada lote em uma transação). O XML só sai do banco depois de
+    gravado e conferido no arquivo. Retorna quantas notas foram arquivadas.
+    """
+    if not arquivo_configurado():
+        raise ImproperlyConfigured(
+            "Defina XML_ARQUIVO_DIR (disco persistente) ou XML_ARQUIVO_STORAGE antes de arquivar XMLs."
+        )
+    pendentes = notas_a_arquivar(dias, empresa).com_xml().only("id", "xml_assinado")
+
+    arquivadas = 0
+    ultimo_id = 0
+    while True:
+        notas = list(pendentes.filter(id__gt=ultimo_id).order_by("id")[:lote])
+        if not notas:
+            break
+        ultimo_id = notas[-1].id
+
+        chaves = {}
+        for nota in notas:
+            chave = guardar_xml(nota.xml_assinado)
+            if ler_xml(chave) != nota.xml_assinado:
+                print(f"Arquivo do XML da nota {nota.id} não confere; mantido no banco.")
+                continue
+            chaves[nota.id] = chave
+
+        with transaction.atomic():
+            for nota_id, chave in chaves.items():
+                # update() direto: bulk_update leria o XML de volta pelo ponteiro
+                arquivadas += NotaFiscal.objects.filter(
+                    id=nota_id, xml_assinado__isnull=False
+                ).update(xml_assinado=None, xml_assinado_arquivo=chave)
+        print(f"{arquivadas} notas arquivadas...")
+    return arquivadas
@@ -2,21 +2,23 @@
 Geração de DANFE NFC-e (cupom 80 mm) para emissão SEFAZ direto.
 Adaptado de matech-backend/fiscal/danfe.py para o modelo do mateco.
 
-Itens e pagamentos são extraídos do xml_assinado da NotaFiscal.
+Itens vêm de NotaFiscalItem; notas antigas sem itens estruturados
+ainda são lidas do xml_assinado da NotaFiscal.
 Função principal: gerar_danfe_nfce(nota_fiscal) -> bytes (PDF)
-Dependências: reportlab, qrcode[pil]
+Dependências: reportlab, qrcode
 """
 
+from functools import lru_cache
 from io import BytesIO
 
 import qrcode
 from lxml import etree
+from reportlab.graphics.shapes import Drawing, Rect
 from reportlab.lib import colors
 from reportlab.lib.styles import ParagraphStyle
 from reportlab.lib.units import mm as MM
 from reportlab.platypus import (
     HRFlowable,
-    Image,
     Paragraph,
     SimpleDocTemplate,
     Spacer,
@@ -106,18 +108,43 @@ def _sp(h=1):
 def _p(texto, estilo=None):
     return Paragraph(str(texto or ""), estilo or _L)
 
-def _qr(url, size_mm=32):
+@lru_cache(maxsize=256)
+def _qr_modulos(url):
+    """
+    Matriz do QR Code reduzida a retângulos horizontais (linha, coluna, largura).
+    Memoizada por URL: reimpressões e a segunda passada do layout não recalculam.
+    """
     qr = qrcode.QRCode(version=None,
                        error_correction=qrcode.constants.ERROR_CORRECT_M,
-                       box_size=10, border=2)
+                       border=2)
     qr.add_data(url)
     qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
-    buf = BytesIO()
-    img.save(buf, format="PNG")
-    buf.seek(0)
+    matriz = qr.get_matrix()
+
+    runs = []
+    for lin, linha in enumerate(matriz):
+        col = 0
+        while col < len(linha):
+            if linha[col]:
+                ini = col
+                while col < len(linha) and linha[col]:
+                    col += 1
+                runs.append((lin, ini, col - ini))
+            else:
+                col += 1
+    return len(matriz), tuple(runs)
+
+def _qr(url, size_mm=32):
+    """QR Code vetorial (retângulos ReportLab), sem rasterizar PNG."""
+    n, runs = _qr_modulos(url)
     s = size_mm * MM
-    return Image(buf, width=s, height=s)
+    mod = s / n
+    d = Drawing(s, s)
+    for lin, col, largura in runs:
+        # origem do PDF é no canto inferior: inverte o eixo das linhas
+        d.add(Rect(col * mod, s - (lin + 1) * mod, largura * mod, mod,
+                   fillColor=colors.black, strokeColor=None, strokeWidth=0))
+    return d
 
 def _tabela_2col(rows, w_label=None):
     wl = w_label or _IW * 0.65
@@ -146,13 +173,25 @@ def _pag_nome(codigo):
     return _TPAG.get(str(codigo).zfill(2), f"Forma {codigo}")
 
 # ── extração do XML ───────────────────────────────────────────────────────────
-def _parse_xml(xml_str):
-    """Extrai itens e pagamentos do XML autorizado da NFC-e."""
+def _raiz_xml(xml_str):
     if not xml_str:
-        return [], []
+        return None
     try:
-        root = etree.fromstring(xml_str.encode() if isinstance(xml_str, str) else xml_str)
+        return etree.fromstring(xml_str.encode() if isinstance(xml_str, str) else xml_str)
     except Exception:
+        return None
+
+def _pagamentos(root):
+    """detPag do XML: a nota pode ter mais de uma forma e o valor pago inclui o troco."""
+    return [{
+        "forma": det_pag.findtext("nfe:tPag", "01", _NS),
+        "valor": float(det_pag.findtext("nfe:vPag", "0", _NS) or 0),
+    } for det_pag in root.findall(".//nfe:detPag", _NS)]
+
+def _parse_xml(xml_str):
+    """Extrai itens e pagamentos do XML autorizado da NFC-e."""
+    root = _raiz_xml(xml_str)
+    if root is None:
         return [], []
 
     itens = []
@@ -169,20 +208,34 @@ def _parse_xml(xml_str):
             "preco_total":float(prod.findtext("nfe:vProd", "0", _NS) or 0),
         })
 
-    pagamentos = []
-    for det_pag in root.findall(".//nfe:detPag", _NS):
-        pagamentos.append({
-            "forma": det_pag.findtext("nfe:tPag", "01", _NS),
-            "valor": float(det_pag.findtext("nfe:vPag", "0", _NS) or 0),
-        })
-
-    return itens, pagamentos
+    return itens, _pagamentos(root)
+
+def _itens_e_pagamentos(nota_fiscal):
+    """
+    Itens da tabela NotaFiscalItem (gravados na emissão); o XML só é relido
+    por inteiro para notas antigas que ainda não têm itens estruturados.
+    Os pagamentos (formas e troco) vêm sempre do detPag do XML; sem XML, os
+    renderizadores usam forma_pagamento/valor_total da nota.
+    """
+    relacao = getattr(nota_fiscal, "itens", None)
+    if relacao is not None and getattr(nota_fiscal, "pk", None):
+        itens = [{
+            "codigo":      i.codigo,
+            "nome":        i.descricao,
+            "qtde":        float(i.quantidade),
+            "unidade":     i.unidade,
+            "preco_unit":  float(i.valor_unitario),
+            "preco_total": float(i.valor_total),
+        } for i in relacao.all()]
+        if itens:
+            root = _raiz_xml(nota_fiscal.xml_assinado)
+            return itens, _pagamentos(root) if root is not None else []
+    return _parse_xml(nota_fiscal.xml_assinado)
 
 # ── montagem do conteúdo ─────────────────────────────────────────────────────
-def _build_story(nota_fiscal):
+def _build_story(nota_fiscal, itens, pagamentos):
     story = []
     empresa = nota_fiscal.empresa
-    itens, pagamentos = _parse_xml(nota_fiscal.xml_assinado)
 
     # — cabeçalho —
     story.append(_p(empresa.nome_fantasia or empresa.nome, _GR))
@@ -332,13 +385,15 @@ class _MeasureDoc(SimpleDocTemplate):
 
 def gerar_danfe_nfce(nota_fiscal) -> bytes:
     """Gera o DANFE NFC-e em formato PDF (80 mm) e devolve os bytes."""
+    itens, pagamentos = _itens_e_pagamentos(nota_fiscal)
+
     buf1 = BytesIO()
     doc1 = _MeasureDoc(
         buf1, pagesize=(_LARGURA, 9999 * MM),
         leftMargin=_MARGEM_H, rightMargin=_MARGEM_H,
         topMargin=_MARGEM_V, bottomMargin=_MARGEM_V,
     )
-    doc1.build(_build_story(nota_fiscal))
+    doc1.build(_build_story(nota_fiscal, itens, pagamentos))
     altura = (9999 * MM - doc1.min_frame_y) + _MARGEM_V + 3 * MM
 
     buf2 = BytesIO()
@@ -347,6 +402,6 @@ def gerar_danfe_nfce(nota_fiscal) -> bytes:
         leftMargin=_MARGEM_H, rightMargin=_MARGEM_H,
         topMargin=_MARGEM_V, bottomMargin=_MARGEM_V,
     )
-    doc2.build(_build_story(nota_fiscal))
+    doc2.build(_build_story(nota_fiscal, itens, pagamentos))
     buf2.seek(0)
     return buf2.read()
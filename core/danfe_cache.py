@@ -0,0 +1,63 @@
+"""
+Cache dos PDFs de DANFE gerados localmente (core.danfe).
+
+A emissão (SEFAZ direto) gera o DANFE logo depois de gravar a nota, ainda
+dentro da requisição e antes da resposta ao PDV, e guarda no cache do
+Django: a primeira impressão, que vem em seguida, já sai do cache. Não há
+thread em segundo plano, que em serverless não sobrevive ao fim da
+requisição. Com o cache padrão (memória local) cada processo tem a sua
+cópia; para compartilhar entre processos, configure CACHES.
+
+Nota cancelada não usa o cache: o cancelamento descarta o PDF guardado.
+
+Funções principais:
+    pre_renderizar_danfe(nota_fiscal)
+    obter_danfe_pdf(nota_fiscal) -> bytes
+    descartar_danfe_pdf(nota_id)
+"""
+
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.danfe import gerar_danfe_nfce
+
+logger = logging.getLogger(__name__)
+
+
+def _chave(nota_id):
+    return f"danfe:pdf:{nota_id}"
+
+
+def _timeout():
+    return getattr(settings, "DANFE_CACHE_TIMEOUT", 60 * 60 * 24)
+
+
+def pre_renderizar_danfe(nota_fiscal):
+    """
+    Gera e guarda o DANFE da nota recém-emitida. Chamar depois do commit da
+    nota; uma falha vai para o log e a impressão gera o PDF na hora.
+    """
+    try:
+        cache.set(_chave(nota_fiscal.id), gerar_danfe_nfce(nota_fiscal), _timeout())
+    except Exception:
+        logger.exception("Falha ao pré-renderizar o DANFE da nota %s", nota_fiscal.id)
+
+
+def obter_danfe_pdf(nota_fiscal) -> bytes:
+    """Devolve o PDF do cache ou gera (e guarda) na hora."""
+    from core.vendas_diarias import nota_cancelada
+
+    if nota_cancelada(nota_fiscal):
+        return gerar_danfe_nfce(nota_fiscal)
+    pdf = cache.get(_chave(nota_fiscal.id))
+    if pdf is None:
+        pdf = gerar_danfe_nfce(nota_fiscal)
+        cache.set(_chave(nota_fiscal.id), pdf, _timeout())
+    return pdf
+
+
+def descartar_danfe_pdf(nota_id):
+    """Apaga o DANFE em cache da nota."""
+    cache.delete(_chave(nota_id))
@@ -0,0 +1,161 @@
+"""
+Geração do DANFE NFC-e em comandos ESC/POS (impressora térmica 80 mm).
+
+Alternativa ao PDF de core.danfe para o caixa: os bytes são enviados direto à
+impressora (agente local ou WebUSB), sem ReportLab nem diálogo de impressão.
+Usa os mesmos itens de core.danfe (NotaFiscalItem) e o QR Code nativo da impressora.
+
+Função principal: gerar_escpos_nfce(nota_fiscal) -> bytes
+"""
+
+from core.danfe import (
+    _br,
+    _fmt_chave,
+    _fmt_cnpj,
+    _fmt_cpf_cnpj,
+    _fmt_data,
+    _fmt_qtd,
+    _itens_e_pagamentos,
+    _pag_nome,
+)
+
+# ── comandos ESC/POS ─────────────────────────────────────────────────────────
+_ESC = b"\x1b"
+_GS  = b"\x1d"
+
+_INIT       = _ESC + b"@"
+_CODEPAGE   = _ESC + b"t\x03"          # CP860 (português)
+_ALIGN_L    = _ESC + b"a\x00"
+_ALIGN_C    = _ESC + b"a\x01"
+_BOLD_ON    = _ESC + b"E\x01"
+_BOLD_OFF   = _ESC + b"E\x00"
+_CORTE      = _GS + b"VB\x00"          # avança o papel e corta parcialmente
+
+_ENCODING = "cp860"
+_COLUNAS  = 48                          # Fonte A em bobina de 80 mm
+
+
+def _avanco(linhas=1):
+    return _ESC + b"d" + bytes([linhas])
+
+
+def _txt(texto):
+    return (str(texto or "") + "\n").encode(_ENCODING, errors="replace")
+
+
+def _hr():
+    return _txt("-" * _COLUNAS)
+
+
+def _lr(esquerda, direita):
+    """
+    Linha com texto à esquerda e valor alinhado à direita. O valor nunca é
+    cortado: se não couber, o texto da esquerda some e a impressora quebra a linha.
+    """
+    esquerda, direita = str(esquerda), str(direita)
+    espaco = max(0, _COLUNAS - len(direita) - 1)
+    return _txt(f"{esquerda[:espaco].ljust(espaco)} {direita}")
+
+
+def _qrcode(url, modulo=5):
+    """QR Code nativo (GS ( k): modelo 2, correção M."""
+    dados = url.encode("ascii", errors="replace")
+    n = len(dados) + 3
+    return b"".join([
+        _GS + b"(k\x04\x001A2\x00",
+        _GS + b"(k\x03\x001C" + bytes([modulo]),
+        _GS + b"(k\x03\x001E1",
+        _GS + b"(k" + bytes([n % 256, n // 256]) + b"1P0" + dados,
+        _GS + b"(k\x03\x001Q0",
+    ])
+
+
+def gerar_escpos_nfce(nota_fiscal) -> bytes:
+    """Gera o DANFE NFC-e como fluxo ESC/POS e devolve os bytes."""
+    empresa = nota_fiscal.empresa
+    itens, pagamentos = _itens_e_pagamentos(nota_fiscal)
+    out = [_INIT, _CODEPAGE]
+
+    # — cabeçalho —
+    out += [_ALIGN_C, _BOLD_ON, _txt(empresa.nome_fantasia or empresa.nome), _BOLD_OFF]
+    end = ", ".join(filter(None, [
+        empresa.logradouro, empresa.numero,
+        empresa.bairro, empresa.cidade, empresa.uf,
+    ]))
+    if end.strip():
+        out.append(_txt(end))
+    out.append(_txt(f"CNPJ: {_fmt_cnpj(empresa.cnpj)}  IE: {empresa.inscricao_estadual or ''}"))
+    out.append(_hr())
+
+    # — título —
+    out += [_BOLD_ON, _txt("DANFE NFC-e Documento Auxiliar da"),
+            _txt("Nota Fiscal de Consumidor Eletrônica"), _BOLD_OFF, _hr()]
+
+    # — itens —
+    out += [_ALIGN_L, _BOLD_ON, _lr("CÓD DESCRIÇÃO", "QTDE UN x VL UNIT = TOTAL"), _BOLD_OFF]
+    valor_subtotal = 0.0
+    for item in itens:
+        valor_subtotal += item["preco_total"]
+        out.append(_txt(f"{item['codigo']} {item['nome']}"))
+        out.append(_lr(
+            "",
+            f"{_fmt_qtd(item['qtde'])} {item['unidade']} x {_br(item['preco_unit'])} = {_br(item['preco_total'])}",
+        ))
+    out.append(_hr())
+
+    # — totais —
+    valor_nf = float(nota_fiscal.valor_total)
+    desconto = round(valor_subtotal - valor_nf, 2)
+    out.append(_lr("Qtd. Total de Itens", len(itens)))
+    out.append(_lr("Valor Total R$", _br(valor_subtotal)))
+    if desconto > 0.005:
+        out.append(_lr("Desconto R$", f"-{_br(desconto)}"))
+    out += [_BOLD_ON, _lr("Valor a Pagar R$", _br(valor_nf)), _BOLD_OFF]
+    out.append(_hr())
+
+    # — pagamentos —
+    if not pagamentos:
+        pagamentos = [{"forma": nota_fiscal.forma_pagamento, "valor": valor_nf}]
+    soma_pag = sum(p["valor"] for p in pagamentos)
+    out += [_BOLD_ON, _lr("FORMA PAGAMENTO", "VALOR PAGO R$"), _BOLD_OFF]
+    for pag in pagamentos:
+        out.append(_lr(_pag_nome(pag["forma"]), _br(pag["valor"])))
+    troco = round(max(0.0, soma_pag - valor_nf), 2)
+    if troco > 0:
+        out.append(_lr("Troco R$", _br(troco)))
+    out.append(_hr())
+
+    # — chave de acesso —
+    out += [_ALIGN_C, _BOLD_ON, _txt("Consulte pela Chave de Acesso em"), _BOLD_OFF,
+            _txt("www.sefaz.ma.gov.br/nfce/consulta"), _txt(_fmt_chave(nota_fiscal.chave))]
+
+    # — consumidor —
+    if nota_fiscal.cliente and getattr(nota_fiscal.cliente, "cpf_cnpj", None):
+        out.append(_hr())
+        out.append(_txt(f"CONSUMIDOR - CPF: {_fmt_cpf_cnpj(nota_fiscal.cliente.cpf_cnpj)}"))
+        out.append(_txt(nota_fiscal.cliente.nome or ""))
+    out.append(_hr())
+
+    # — dados da NFC-e —
+    out.append(_BOLD_ON)
+    if (nota_fiscal.ambiente or "homologacao") == "homologacao":
+        out.append(_txt("*** AMBIENTE DE HOMOLOGAÇÃO ***"))
+        out.append(_txt("*** SEM VALOR FISCAL ***"))
+    out.append(_txt(f"NFCe n. {nota_fiscal.numero:09d}  Série {nota_fiscal.serie}"))
+    out.append(_txt(_fmt_data(nota_fiscal.data_emissao)))
+    out += [_txt("Via Consumidor"), _BOLD_OFF]
+
+    if nota_fiscal.protocolo_autorizacao:
+        out.append(_txt(f"Protocolo de Autorização: {nota_fiscal.protocolo_autorizacao}"))
+        out.append(_txt(f"Data de Autorização: {_fmt_data(nota_fiscal.data_emissao)}"))
+
+    # — QR-Code —
+    if nota_fiscal.qrcode_url:
+        out += [_avanco(1), _qrcode(nota_fiscal.qrcode_url), _avanco(1)]
+
+    out.append(_hr())
+    out.append(_txt("Tributos Totais Incidentes"))
+    out.append(_txt("(Lei Federal 12.741/2012): R$ -----"))
+
+    out += [_avanco(4), _CORTE]
+    return b"".join(out)
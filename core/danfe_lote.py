@@ -0,0 +1,104 @@
+"""
+Exportação em lote de DANFEs NFC-e como um ZIP gerado em streaming.
+
+Os PDFs são renderizados em um pool de processos (core.danfe é CPU-bound) e
+escritos no ZIP à medida que ficam prontos. Apenas uma janela de
+`2 x workers` notas fica em memória por vez, independentemente de quantas
+notas foram selecionadas.
+
+Função principal: gerar_zip_danfes(notas, workers=None) -> iterator[bytes]
+"""
+
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from django.conf import settings
+
+from core.utils import BufferZip
+
+
+def _init_worker():
+    """Inicializa o Django nos processos do pool (contexto 'spawn')."""
+    import django
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "setup.settings")
+    django.setup()
+
+
+def renderizar_pdf(nota):
+    """
+    Gera o PDF de uma nota, seguindo a mesma regra de imprimir_nota.
+
+    Returns:
+        Tuple: (nome_arquivo: str, pdf: bytes | None, erro: str | None)
+    """
+    try:
+        if not nota.id_nota or nota.xml_assinado:
+            from core.danfe import gerar_danfe_nfce
+            return f"danfe_{nota.serie}_{nota.numero}.pdf", gerar_danfe_nfce(nota), None
+
+        from core.services import NuvemFiscalService
+        pdf, erro = NuvemFiscalService.baixar_pdf(nota.empresa, nota.id_nota, ambiente=nota.ambiente)
+        return f"nota_{nota.serie}_{nota.numero}.pdf", pdf, erro
+    except Exception as e:
+        return f"nota_{nota.serie}_{nota.numero}.pdf", None, str(e)
+
+
+def _renderizar_em_ordem(notas, workers):
+    """Renderiza as notas preservando a ordem, com no máximo 2 x workers pendentes."""
+    if workers <= 1:
+        for nota in notas:
+            yield renderizar_pdf(nota)
+        return
+
+    # 'spawn' evita herdar conexões de banco abertas no processo pai via fork.
+    try:
+        executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=get_context("spawn"), initializer=_init_worker,
+        )
+    except (OSError, NotImplementedError):
+        # Ambientes serverless sem /dev/shm não suportam multiprocessing.
+        for nota in notas:
+            yield renderizar_pdf(nota)
+        return
+
+    with executor:
+        pendentes = deque()
+        for nota in notas:
+            pendentes.append(executor.submit(renderizar_pdf, nota))
+            if len(pendentes) >= workers * 2:
+                yield pendentes.popleft().result()
+        while pendentes:
+            yield pendentes.popleft().result()
+
+
+def gerar_zip_danfes(notas, workers=None):
+    """
+    Gera um ZIP com um PDF por nota, entregue em pedaços de bytes.
+
+    Args:
+        notas: QuerySet (ou iterável) de NotaFiscal com empresa/cliente carregados.
+        workers: tamanho do pool; padrão settings.DANFE_LOTE_WORKERS.
+    """
+    if workers is None:
+        workers = getattr(settings, "DANFE_LOTE_WORKERS", 1)
+    if hasattr(notas, "iterator"):
+        notas = notas.iterator(chunk_size=200)
+
+    buf = BufferZip()
+    erros = []
+    with zipfile.ZipFile(buf, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for nome, pdf, erro in _renderizar_em_ordem(notas, workers):
+            if pdf:
+                zf.writestr(nome, pdf)
+            else:
+                erros.append(f"{nome}: {erro}")
+            dados = buf.drenar()
+            if dados:
+                yield dados
+
+        if erros:
+            zf.writestr("erros.txt", "\n".join(erros))
+    yield buf.drenar()
@@ -0,0 +1,129 @@
+"""
+Roteamento de leituras de relatório para a réplica do banco ('replica').
+
+Só as views marcadas com @leitura_em_replica (histórico, listagens,
+relatórios e exportações) leem da réplica; a emissão e todo o resto seguem
+no banco principal, então relatórios pesados não disputam com o caixa.
+
+Logo depois de uma escrita na mesma sessão (ex.: acabou de emitir uma nota e
+abriu o histórico), as leituras continuam no principal por
+REPLICA_LAG_TOLERANCE segundos, para o usuário não deixar de ver o que
+acabou de gravar enquanto a réplica ainda não recebeu a alteração.
+
+Sem 'replica' em DATABASES, tudo continua no 'default'.
+"""
+
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+REPLICA = 'replica'
+_CHAVE_SESSAO = '_ultima_escrita_db'
+
+_ler_da_replica = ContextVar('ler_da_replica', default=False)
+_houve_escrita = ContextVar('houve_escrita', default=None)
+
+
+def replica_configurada():
+    return REPLICA in settings.DATABASES
+
+
+def _em_transacao():
+    """Dentro de um atomic() no principal, a réplica ainda não viu as escritas da transação."""
+    return connections['default'].in_atomic_block
+
+
+class ReplicaRouter:
+    """DATABASE_ROUTERS: leituras na réplica quando a view pediu, escritas sempre no principal."""
+
+    def db_for_read(self, model, **hints):
+        if _ler_da_replica.get() and replica_configurada() and not _em_transacao():
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        marcador = _houve_escrita.get()
+        if marcador is not None:
+            marcador[0] = True
+        # Explícito: sem isso, um objeto lido da réplica seria salvo de volta nela
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplica e principal têm os mesmos dados: objetos de um podem apontar para o outro
+        if {obj1._state.db, obj2._state.db} <= {'default', REPLICA}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # O schema da réplica vem da replicação do principal
+        if db == REPLICA:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    """Registra na sessão o horário da última escrita feita pela requisição."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        marcador = [False]
+        token = _houve_escrita.set(marcador)
+        try:
+            response = self.get_response(request)
+        finally:
+            _houve_escrita.reset(token)
+
+        if marcador[0] and hasattr(request, 'session'):
+            request.session[_CHAVE_SESSAO] = time.time()
+        return response
+
+
+def _recem_escreveu(request):
+    sessao = getattr(request, 'session', None)
+    if sessao is None:
+        return False
+    ultima = sessao.get(_CHAVE_SESSAO)
+    tolerancia = getattr(settings, 'REPLICA_LAG_TOLERANCE', 5)
+    return ultima is not None and time.time() - ultima < tolerancia
+
+
+def _na_replica(conteudo):
+    """Mantém as leituras na réplica enquanto uma resposta em streaming é gerada."""
+    anterior = _ler_da_replica.get()
+    _ler_da_replica.set(True)
+    try:
+        yield from conteudo
+    finally:
+        _ler_da_replica.set(anterior)
+
+
+def leitura_em_replica(view):
+    """
+    Decorator de views somente-leitura (relatórios, listagens, exportações):
+    as consultas feitas pela view, e pelo corpo de StreamingHttpResponse,
+    vão para a réplica.
+    """
+    @wraps(view)
+    def _view(request, *args, **kwargs):
+        if not replica_configurada() or _recem_escreveu(request):
+            return view(request, *args, **kwargs)
+
+        token = _ler_da_replica.set(True)
+        try:
+            response = view(request, *args, **kwargs)
+            # TemplateResponse (ListView) só consulta o banco ao renderizar
+            if hasattr(response, 'render') and not getattr(response, 'is_rendered', True):
+                response.render()
+        finally:
+            _ler_da_replica.reset(token)
+
+        if getattr(response, 'streaming', False):
+            response.streaming_content = _na_replica(response.streaming_content)
+        return response
+
+    return _view
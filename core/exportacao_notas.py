@@ -0,0 +1,151 @@
+"""
+Exportação da listagem de notas (mesmos filtros de listar_notas) em CSV ou XLSX.
+
+As linhas saem do banco com QuerySet.iterator(chunk_size=...) e são escritas
+à medida que chegam, então a memória fica constante mesmo com centenas de
+milhares de notas. O XLSX é montado à mão (SpreadsheetML mínimo, strings
+inline) dentro de um ZIP em streaming, sem depender de openpyxl.
+
+Funções principais:
+    gerar_csv_notas(notas) -> iterator[bytes]
+    gerar_xlsx_notas(notas) -> iterator[bytes]
+"""
+
+import csv
+import zipfile
+from xml.sax.saxutils import escape
+
+from django.utils import timezone
+
+from core.models import NotaFiscal
+from core.relatorios import ORDEM_LISTAGEM
+from core.utils import BufferZip
+
+CABECALHO = ["Número", "Série", "Chave", "Data", "Cliente", "Forma de Pagamento", "Valor", "Status"]
+
+_CHUNK = 2000
+_FORMAS = dict(NotaFiscal.PAGAMENTO_CHOICES)
+
+
+def _linhas(notas):
+    """(numero, serie, chave, data, cliente, forma, valor: Decimal, status) por nota."""
+    notas = (
+        notas.select_related("cliente")
+        .only(
+            "numero", "serie", "chave", "data_emissao", "forma_pagamento", "valor_total", "status",
+            "cliente__nome", "cliente__apelido",
+        )
+        .order_by(*ORDEM_LISTAGEM)
+    )
+    for nota in notas.iterator(chunk_size=_CHUNK):
+        data = timezone.localtime(nota.data_emissao).strftime("%d/%m/%Y %H:%M") if nota.data_emissao else ""
+        cliente = (nota.cliente.apelido or nota.cliente.nome) if nota.cliente else "Consumidor Final"
+        yield (
+            nota.numero, nota.serie, nota.chave or "", data, cliente,
+            _FORMAS.get(nota.forma_pagamento, nota.forma_pagamento or ""),
+            nota.valor_total, nota.status,
+        )
+
+
+# ─────────────────────────────────────────────
+# CSV
+# ─────────────────────────────────────────────
+
+class _Eco:
+    """Pseudo-arquivo do csv.writer: devolve a linha em vez de guardá-la."""
+
+    def write(self, valor):
+        return valor
+
+
+def gerar_csv_notas(notas):
+    """CSV no padrão do Excel brasileiro: UTF-8 com BOM, ';' e vírgula decimal."""
+    escritor = csv.writer(_Eco(), delimiter=";")
+    yield "\ufeff".encode("utf-8") + escritor.writerow(CABECALHO).encode("utf-8")
+
+    bloco = []
+    for linha in _linhas(notas):
+        *inicio, valor, status = linha
+        bloco.append(escritor.writerow([*inicio, f"{valor:.2f}".replace(".", ","), status]))
+        if len(bloco) >= _CHUNK:
+            yield "".join(bloco).encode("utf-8")
+            bloco.clear()
+    if bloco:
+        yield "".join(bloco).encode("utf-8")
+
+
+# ─────────────────────────────────────────────
+# XLSX
+# ─────────────────────────────────────────────
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Notas" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+
+def _celula(valor):
+    if isinstance(valor, str):
+        return f'<c t="inlineStr"><is><t>{escape(valor)}</t></is></c>'
+    return f"<c><v>{valor}</v></c>"
+
+
+def _linha_xlsx(valores):
+    return "<row>" + "".join(_celula(v) for v in valores) + "</row>"
+
+
+def gerar_xlsx_notas(notas):
+    """Planilha XLSX de uma aba, escrita linha a linha dentro de um ZIP em streaming."""
+    buf = BufferZip()
+    with zipfile.ZipFile(buf, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        zf.writestr("_rels/.rels", _RELS)
+        zf.writestr("xl/workbook.xml", _WORKBOOK)
+        zf.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+
+        with zf.open("xl/worksheets/sheet1.xml", mode="w", force_zip64=True) as planilha:
+            planilha.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                + _linha_xlsx(CABECALHO)
+            ).encode("utf-8"))
+
+            for indice, linha in enumerate(_linhas(notas), start=1):
+                planilha.write(_linha_xlsx(linha).encode("utf-8"))
+                if indice % _CHUNK == 0:
+                    dados = buf.drenar()
+                    if dados:
+                        yield dados
+
+            planilha.write(b"</sheetData></worksheet>")
+    yield buf.drenar()
@@ -0,0 +1,98 @@
+"""
+Campos de modelo customizados do core.
+"""
+
+import logging
+import zlib
+
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+logger = logging.getLogger(__name__)
+
+
+class _XMLArquivadoAttribute(DeferredAttribute):
+    """
+    Atributo de XMLComprimidoField(arquivo=...): coluna vazia com ponteiro
+    preenchido lê o XML do arquivo (core.arquivo_xml), uma vez por instância.
+    Se o arquivo não puder ser lido, o XML é None (a falha vai para o log).
+    """
+
+    def __get__(self, instance, cls=None):
+        valor = super().__get__(instance, cls)
+        if instance is None or valor is not None:
+            return valor
+        chave = getattr(instance, self.field.arquivo)
+        if not chave:
+            return None
+
+        lidos = instance.__dict__.setdefault("_xml_arquivado", {})
+        if chave not in lidos:
+            from core.arquivo_xml import ler_xml
+            try:
+                lidos[chave] = ler_xml(chave)
+            except Exception:
+                # Arquivo ausente/ilegível: a nota fica "sem XML" (DANFE pelos itens, manifesto do contador)
+                logger.exception("XML arquivado %s da nota %s não pôde ser lido", chave, instance.pk)
+                return None
+        return lidos[chave]
+
+
+class XMLComprimidoField(models.BinaryField):
+    """
+    Guarda XML (str) comprimido com zlib em uma coluna binária.
+
+    A compressão é transparente: o atributo do modelo continua sendo str (ou
+    None). XMLs de NFC-e assinados (5–50 KB) ficam tipicamente 4–8x menores.
+    String vazia é gravada como NULL.
+
+    Com `arquivo` (nome do campo-ponteiro), o XML pode ter sido movido para o
+    arquivo de XMLs antigos: a coluna fica NULL e a leitura busca no arquivo.
+    """
+
+    description = "XML comprimido (zlib)"
+
+    NIVEL = 6
+
+    def __init__(self, *args, arquivo=None, **kwargs):
+        kwargs.setdefault("null", True)
+        kwargs.setdefault("blank", True)
+        self.arquivo = arquivo
+        if arquivo:
+            self.descriptor_class = _XMLArquivadoAttribute
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.arquivo:
+            kwargs["arquivo"] = self.arquivo
+        return name, path, args, kwargs
+
+    def _descomprimir(self, value):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            return value
+        return zlib.decompress(bytes(value)).decode("utf-8")
+
+    def from_db_value(self, value, expression, connection):
+        return self._descomprimir(value)
+
+    def to_python(self, value):
+        return self._descomprimir(value)
+
+    def get_prep_value(self, value):
+        if value is None or value == "":
+            return None
+        if isinstance(value, str):
+            value = zlib.compress(value.encode("utf-8"), self.NIVEL)
+        return super().get_prep_value(value)
+
+    def pre_save(self, model_instance, add):
+        if self.arquivo:
+            # Valor da coluna, não o lido do arquivo: save() não desfaz o arquivamento
+            return model_instance.__dict__.get(self.attname)
+        return super().pre_save(model_instance, add)
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj) or ""
@@ -0,0 +1,88 @@
+"""
+Montagem das linhas de NotaFiscalItem a partir do XML autorizado ou do carrinho.
+
+O XML é a fonte preferida (é exatamente o que foi autorizado: xProd de
+homologação, vProd arredondado, vDesc rateado). Sem XML (emissão NuvemFiscal),
+usa o carrinho enviado à API, que tem os mesmos valores do payload.
+"""
+
+from decimal import Decimal, InvalidOperation
+
+from lxml import etree
+
+from .models import NotaFiscalItem
+
+_NS = {"nfe": "http://www.portalfiscal.inf.br/nfe"}
+
+
+def _dec(valor, padrao="0"):
+    try:
+        return Decimal(str(valor if valor not in (None, "") else padrao))
+    except (InvalidOperation, ValueError):
+        return Decimal(padrao)
+
+
+def itens_do_xml(xml_str):
+    """Extrai os campos de cada det/prod do XML da NFC-e (lista vazia se inválido)."""
+    if not xml_str:
+        return []
+    try:
+        root = etree.fromstring(xml_str.encode() if isinstance(xml_str, str) else xml_str)
+    except (etree.XMLSyntaxError, ValueError):
+        return []
+
+    itens = []
+    for indice, det in enumerate(root.iterfind(".//nfe:det", _NS), start=1):
+        prod = det.find("nfe:prod", _NS)
+        if prod is None:
+            continue
+        itens.append({
+            "numero_item": int(det.get("nItem") or indice),
+            "codigo": prod.findtext("nfe:cProd", "", _NS),
+            "descricao": prod.findtext("nfe:xProd", "", _NS),
+            "ncm": prod.findtext("nfe:NCM", "", _NS),
+            "unidade": prod.findtext("nfe:uCom", "UN", _NS),
+            "quantidade": _dec(prod.findtext("nfe:qCom", None, _NS)),
+            "valor_unitario": _dec(prod.findtext("nfe:vUnCom", None, _NS)),
+            "valor_total": _dec(prod.findtext("nfe:vProd", None, _NS)),
+            "desconto": _dec(prod.findtext("nfe:vDesc", None, _NS)),
+        })
+    return itens
+
+
+def itens_do_carrinho(itens_carrinho):
+    """Converte os itens do carrinho (JSON do PDV) para os campos de NotaFiscalItem."""
+    return [
+        {
+            "numero_item": indice,
+            "codigo": str(item.get("id", "")),
+            "descricao": str(item.get("nome", ""))[:120],
+            "ncm": item.get("ncm") or "00000000",
+            "unidade": item.get("unidade_medida", "UN"),
+            "quantidade": _dec(item.get("quantidade")),
+            "valor_unitario": _dec(item.get("preco_unitario")),
+            "valor_total": _dec(item.get("valor_total")).quantize(Decimal("0.01")),
+            "desconto": Decimal("0"),
+        }
+        for indice, item in enumerate(itens_carrinho, start=1)
+    ]
+
+
+def montar_itens_nota(nota, itens):
+    """
+    Instancia (sem salvar) os NotaFiscalItem da nota, ligando cada linha ao
+    Produto da mesma empresa cujo id é o cProd. Pronto para bulk_create.
+    """
+    from estoque.models import Produto
+
+    ids = {int(i["codigo"]) for i in itens if str(i["codigo"]).isdigit()}
+    existentes = set(
+        Produto.objects.filter(empresa_id=nota.empresa_id, id__in=ids).values_list("id", flat=True)
+    ) if ids else set()
+
+    objetos = []
+    for item in itens:
+        codigo = str(item["codigo"])
+        produto_id = int(codigo) if codigo.isdigit() and int(codigo) in existentes else None
+        objetos.append(NotaFiscalItem(nota=nota, produto_id=produto_id, **item))
+    return objetos
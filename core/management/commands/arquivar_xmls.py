@@ -0,0 +1,35 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from core.models import Empresa
+from core.arquivo_xml import arquivar_xmls
+
+class Command(BaseCommand):
+    """
+    Move o XML autorizado das notas antigas para o arquivo de XMLs
+    (settings.STORAGES['arquivo_xml']), deixando só o ponteiro no banco.
+    A leitura de nota.xml_assinado continua funcionando normalmente.
+
+    Uso:
+        python manage.py arquivar_xmls [--dias 180] [--empresa <id>] [--lote 500]
+    """
+    help = 'Arquiva (fora do banco) o XML das notas emitidas há mais de N dias.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=None, help='Idade mínima das notas (Padrão: XML_ARQUIVO_DIAS)')
+        parser.add_argument('--empresa', type=int, default=None, help='Restringe a uma empresa (ID)')
+        parser.add_argument('--lote', type=int, default=500, help='Notas por lote/transação (Padrão: 500)')
+
+    def handle(self, *args, **kwargs):
+        empresa = None
+        if kwargs['empresa']:
+            try:
+                empresa = Empresa.objects.get(id=kwargs['empresa'])
+            except Empresa.DoesNotExist:
+                raise CommandError(f"Empresa com ID {kwargs['empresa']} não encontrada.")
+
+        try:
+            arquivadas = arquivar_xmls(dias=kwargs['dias'], empresa=empresa, lote=kwargs['lote'])
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(f'Concluído! {arquivadas} XMLs arquivados'))
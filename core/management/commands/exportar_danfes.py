@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from core.models import Empresa
+from core.relatorios import filtrar_notas
+from core.danfe_lote import gerar_zip_danfes
+
+class Command(BaseCommand):
+    """
+    Comando para exportar em um ZIP os DANFEs das notas de uma Empresa,
+    com os mesmos filtros da tela de histórico (listar_notas).
+
+    Uso:
+        python manage.py exportar_danfes <id_empresa> --inicio 2024-05-01 --fim 2024-05-31 --saida maio.zip
+    """
+    help = 'Exporta os DANFEs das notas filtradas de uma Empresa para um arquivo ZIP.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('empresa_id', type=int, help='ID da empresa emitente')
+        parser.add_argument('--inicio', type=str, default=None, help='Data inicial (AAAA-MM-DD)')
+        parser.add_argument('--fim', type=str, default=None, help='Data final (AAAA-MM-DD)')
+        parser.add_argument('--cliente', type=int, action='append', default=[], help='ID de cliente (pode repetir)')
+        parser.add_argument('--pagamento', type=str, action='append', default=[], help='Forma de pagamento, ex: 01, 17 (pode repetir)')
+        parser.add_argument('--ambiente', type=str, default=None, help='homologacao ou producao (padrão: ambiente ativo da empresa)')
+        parser.add_argument('--workers', type=int, default=None, help='Processos de renderização (padrão: DANFE_LOTE_WORKERS)')
+        parser.add_argument('--saida', type=str, default='danfes.zip', help='Arquivo ZIP de saída (Padrão: danfes.zip)')
+
+    def handle(self, *args, **kwargs):
+        try:
+            empresa = Empresa.objects.get(id=kwargs['empresa_id'])
+        except Empresa.DoesNotExist:
+            self.stdout.write(self.style.ERROR(f'Empresa com ID {kwargs["empresa_id"]} não encontrada!'))
+            return
+
+        notas = (
+            filtrar_notas(
+                empresa,
+                data_inicio=kwargs['inicio'],
+                data_fim=kwargs['fim'],
+                clientes=kwargs['cliente'],
+                pagamentos=kwargs['pagamento'],
+                ambiente=kwargs['ambiente'],
+            )
+            .com_xml()
+            .select_related('empresa', 'cliente')
+            .prefetch_related('itens')
+            .order_by('-numero', '-serie')
+        )
+        total = notas.count()
+        self.stdout.write(f'Exportando {total} nota(s) de {empresa.nome}...')
+
+        tamanho = 0
+        with open(kwargs['saida'], 'wb') as destino:
+            for parte in gerar_zip_danfes(notas, workers=kwargs['workers']):
+                destino.write(parte)
+                tamanho += len(parte)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Concluído! {kwargs["saida"]} ({tamanho / 1024:.1f} KB)'
+        ))
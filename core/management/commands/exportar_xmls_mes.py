@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from core.models import Empresa
+from core.xml_contador import gerar_zip_xmls_mes
+
+class Command(BaseCommand):
+    """
+    Comando para gerar o pacote mensal de XMLs (autorizados e cancelamentos)
+    de uma Empresa para o contador, com manifesto de quantidades e totais.
+
+    Uso:
+        python manage.py exportar_xmls_mes <id_empresa> 2024-05 --saida xmls_maio.zip
+    """
+    help = 'Exporta em um ZIP os XMLs das NFC-e de um mês de uma Empresa (pacote do contador).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('empresa_id', type=int, help='ID da empresa emitente')
+        parser.add_argument('mes', type=str, help='Competência no formato AAAA-MM')
+        parser.add_argument('--ambiente', type=str, default=None, help='homologacao ou producao (padrão: ambiente ativo da empresa)')
+        parser.add_argument('--saida', type=str, default=None, help='Arquivo ZIP de saída (Padrão: xmls_<cnpj>_<AAAAMM>.zip)')
+
+    def handle(self, *args, **kwargs):
+        try:
+            empresa = Empresa.objects.get(id=kwargs['empresa_id'])
+        except Empresa.DoesNotExist:
+            self.stdout.write(self.style.ERROR(f'Empresa com ID {kwargs["empresa_id"]} não encontrada!'))
+            return
+
+        try:
+            ano, mes = (int(parte) for parte in kwargs['mes'].split('-'))
+            if not 1 <= mes <= 12:
+                raise ValueError
+        except ValueError:
+            self.stdout.write(self.style.ERROR('Informe o mês no formato AAAA-MM (ex: 2024-05).'))
+            return
+
+        saida = kwargs['saida'] or f'xmls_{empresa.cnpj}_{ano}{mes:02d}.zip'
+        self.stdout.write(f'Gerando XMLs de {mes:02d}/{ano} de {empresa.nome}...')
+
+        tamanho = 0
+        with open(saida, 'wb') as destino:
+            for parte in gerar_zip_xmls_mes(empresa, ano, mes, ambiente=kwargs['ambiente']):
+                destino.write(parte)
+                tamanho += len(parte)
+
+        self.stdout.write(self.style.SUCCESS(f'Concluído! {saida} ({tamanho / 1024:.1f} KB)'))
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from core import particionamento
+
+class Command(BaseCommand):
+    """
+    Particionamento mensal da tabela de notas fiscais (somente PostgreSQL).
+
+    Uso:
+        python manage.py particionar_notas --converter          # uma vez, com a loja parada
+        python manage.py particionar_notas [--meses 3]          # mensal (cron): cria partições futuras
+        python manage.py particionar_notas --desanexar 2021-01  # solta o mês para arquivar
+    """
+    help = 'Particiona core_notafiscal por mês de emissão e cria as partições dos próximos meses (PostgreSQL).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--converter', action='store_true',
+                            help='Converte a tabela atual em particionada (copia todas as notas)')
+        parser.add_argument('--meses', type=int, default=particionamento.MESES_A_FRENTE,
+                            help='Quantos meses à frente devem ter partição (padrão: 3)')
+        parser.add_argument('--desanexar', type=str, default=None,
+                            help='Desanexa a partição do mês AAAA-MM')
+
+    def handle(self, *args, **kwargs):
+        if not particionamento.suportado():
+            raise CommandError('Particionamento disponível apenas no PostgreSQL; a tabela segue comum.')
+
+        if kwargs['converter']:
+            if particionamento.tabela_particionada():
+                raise CommandError('A tabela de notas já está particionada.')
+            try:
+                inicio = particionamento.converter_tabela(kwargs['meses'])
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(f'Tabela de notas particionada por mês a partir de {inicio:%m/%Y}.')
+        elif not particionamento.tabela_particionada():
+            raise CommandError('A tabela de notas não está particionada. Rode antes com --converter.')
+
+        if kwargs['desanexar']:
+            try:
+                ano, mes = (int(parte) for parte in kwargs['desanexar'].split('-'))
+                nome = particionamento.desanexar_particao(ano, mes)
+            except ValueError as e:
+                raise CommandError(f"Mês inválido ({kwargs['desanexar']}): {e}")
+            self.stdout.write(self.style.SUCCESS(f'Partição {nome} desanexada. Arquive com pg_dump e remova com DROP TABLE.'))
+            return
+
+        try:
+            criadas = particionamento.criar_particoes(kwargs['meses'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        for nome, movidas in criadas:
+            detalhe = f' ({movidas} nota(s) movida(s) da partição padrão)' if movidas else ''
+            self.stdout.write(f'Partição criada: {nome}{detalhe}')
+        self.stdout.write(self.style.SUCCESS(f'Concluído! {len(criadas)} partição(ões) criada(s).'))
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from core.models import NotaFiscal, NotaFiscalItem
+from core.itens_nota import itens_do_xml, montar_itens_nota
+
+class Command(BaseCommand):
+    """
+    Preenche NotaFiscalItem para notas emitidas antes da tabela existir,
+    lendo o xml_assinado em lotes (cada lote em uma transação).
+
+    Uso:
+        python manage.py popular_itens_notas [--empresa <id>] [--lote 500]
+    """
+    help = 'Gera os itens estruturados (NotaFiscalItem) a partir do XML das notas antigas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresa', type=int, default=None, help='Restringe a uma empresa (ID)')
+        parser.add_argument('--lote', type=int, default=500, help='Notas por lote/transação (Padrão: 500)')
+
+    def handle(self, *args, **kwargs):
+        tamanho_lote = kwargs['lote']
+
+        pendentes = NotaFiscal.objects.com_xml().filter(
+            Q(xml_assinado__isnull=False) | Q(xml_assinado_arquivo__isnull=False), itens__isnull=True
+        )
+        if kwargs['empresa']:
+            pendentes = pendentes.filter(empresa_id=kwargs['empresa'])
+
+        notas_processadas = 0
+        itens_criados = 0
+        ultimo_id = 0
+
+        # Paginação por id: cada lote lê só as notas seguintes, sem OFFSET
+        while True:
+            lote = list(
+                pendentes.filter(id__gt=ultimo_id)
+                .order_by('id')
+                .only('id', 'empresa_id', 'xml_assinado', 'xml_assinado_arquivo')[:tamanho_lote]
+            )
+            if not lote:
+                break
+            ultimo_id = lote[-1].id
+
+            objetos = []
+            for nota in lote:
+                objetos.extend(montar_itens_nota(nota, itens_do_xml(nota.xml_assinado)))
+
+            with transaction.atomic():
+                NotaFiscalItem.objects.bulk_create(objetos, batch_size=1000)
+
+            notas_processadas += len(lote)
+            itens_criados += len(objetos)
+            self.stdout.write(f'{notas_processadas} notas processadas...')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Concluído! {notas_processadas} notas | {itens_criados} itens criados'
+        ))
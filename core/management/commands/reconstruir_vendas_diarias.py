@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.models import Empresa
+from core.vendas_diarias import reconstruir_vendas_diarias, reconstruir_vendas_produtos
+
+class Command(BaseCommand):
+    """
+    Recalcula os resumos VendaDiaria e VendaProdutoDiaria a partir das notas
+    e dos seus itens (backfill após a criação das tabelas ou correção de
+    divergências).
+
+    Uso:
+        python manage.py reconstruir_vendas_diarias [--empresa <id>]
+    """
+    help = 'Recalcula os resumos diários de vendas (por pagamento e por produto) a partir das notas fiscais.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresa', type=int, default=None, help='Restringe a uma empresa (ID)')
+
+    def handle(self, *args, **kwargs):
+        empresa = None
+        if kwargs['empresa']:
+            try:
+                empresa = Empresa.objects.get(id=kwargs['empresa'])
+            except Empresa.DoesNotExist:
+                raise CommandError(f"Empresa com ID {kwargs['empresa']} não encontrada.")
+
+        linhas = reconstruir_vendas_diarias(empresa)
+        linhas_produtos = reconstruir_vendas_produtos(empresa)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Concluído! {linhas} linhas de resumo | {linhas_produtos} linhas por produto'
+        ))
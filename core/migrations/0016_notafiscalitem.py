@@ -0,0 +1,37 @@
+# Generated by Django 6.0 on 2026-10-19 11:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_numero_nfce_por_ambiente'),
+        ('estoque', '0003_produto_empresa_alter_produto_codigo_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotaFiscalItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero_item', models.PositiveIntegerField(default=1, verbose_name='Nº do Item (nItem)')),
+                ('codigo', models.CharField(max_length=60, verbose_name='Código (cProd)')),
+                ('descricao', models.CharField(max_length=120, verbose_name='Descrição (xProd)')),
+                ('ncm', models.CharField(blank=True, default='', max_length=8, verbose_name='NCM')),
+                ('unidade', models.CharField(default='UN', max_length=6, verbose_name='Unidade (uCom)')),
+                ('quantidade', models.DecimalField(decimal_places=4, max_digits=15, verbose_name='Quantidade (qCom)')),
+                ('valor_unitario', models.DecimalField(decimal_places=4, max_digits=15, verbose_name='Valor Unitário (vUnCom)')),
+                ('valor_total', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Valor Total (vProd)')),
+                ('desconto', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Desconto (vDesc)')),
+                ('nota', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='itens', to='core.notafiscal', verbose_name='Nota Fiscal')),
+                ('produto', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='itens_vendidos', to='estoque.produto', verbose_name='Produto')),
+            ],
+            options={
+                'verbose_name': 'Item da Nota Fiscal',
+                'verbose_name_plural': 'Itens da Nota Fiscal',
+                'ordering': ['nota', 'numero_item'],
+            },
+        ),
+    ]
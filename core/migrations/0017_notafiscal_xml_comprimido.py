@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-19 12:02
+
+import core.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_notafiscalitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notafiscal',
+            name='xml_assinado_z',
+            field=core.fields.XMLComprimidoField(blank=True, null=True, verbose_name='XML + Protocolo'),
+        ),
+        migrations.AddField(
+            model_name='notafiscal',
+            name='xml_cancelamento_z',
+            field=core.fields.XMLComprimidoField(blank=True, null=True, verbose_name='XML Cancelamento'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+"""
+Copia xml_assinado/xml_cancelamento (texto) para as colunas comprimidas,
+em lotes de notas por id, cada lote em sua própria transação.
+"""
+
+from django.db import migrations, transaction
+
+LOTE = 500
+
+
+def _copiar(apps, origem, destino):
+    NotaFiscal = apps.get_model('core', 'NotaFiscal')
+    ultimo_id = 0
+    while True:
+        lote = list(
+            NotaFiscal.objects.filter(id__gt=ultimo_id)
+            .order_by('id')
+            .only('id', *origem)[:LOTE]
+        )
+        if not lote:
+            break
+        ultimo_id = lote[-1].id
+        for nota in lote:
+            for campo_origem, campo_destino in zip(origem, destino):
+                setattr(nota, campo_destino, getattr(nota, campo_origem))
+        with transaction.atomic():
+            NotaFiscal.objects.bulk_update(lote, list(destino))
+
+
+def comprimir(apps, schema_editor):
+    _copiar(apps, ('xml_assinado', 'xml_cancelamento'), ('xml_assinado_z', 'xml_cancelamento_z'))
+
+
+def descomprimir(apps, schema_editor):
+    _copiar(apps, ('xml_assinado_z', 'xml_cancelamento_z'), ('xml_assinado', 'xml_cancelamento'))
+
+
+class Migration(migrations.Migration):
+
+    # Cada lote tem a própria transação: tabelas grandes não ficam travadas de uma vez.
+    atomic = False
+
+    dependencies = [
+        ('core', '0017_notafiscal_xml_comprimido'),
+    ]
+
+    operations = [
+        migrations.RunPython(comprimir, descomprimir),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-19 12:04
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_comprimir_xml_notas'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='notafiscal',
+            name='xml_assinado',
+        ),
+        migrations.RemoveField(
+            model_name='notafiscal',
+            name='xml_cancelamento',
+        ),
+        migrations.RenameField(
+            model_name='notafiscal',
+            old_name='xml_assinado_z',
+            new_name='xml_assinado',
+        ),
+        migrations.RenameField(
+            model_name='notafiscal',
+            old_name='xml_cancelamento_z',
+            new_name='xml_cancelamento',
+        ),
+    ]
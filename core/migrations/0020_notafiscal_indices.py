@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-10-19 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_remove_xml_texto'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notafiscal',
+            index=models.Index(fields=['empresa', 'ambiente', 'serie', '-numero'], name='nota_numeracao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notafiscal',
+            index=models.Index(fields=['empresa', 'ambiente', '-numero', '-serie'], name='nota_listagem_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notafiscal',
+            index=models.Index(fields=['empresa', 'ambiente', 'data_emissao'], name='nota_periodo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notafiscal',
+            index=models.Index(fields=['chave'], name='nota_chave_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 6.0 on 2026-10-19 12:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def popular_vendas_diarias(apps, schema_editor):
+    """Backfill: um GROUP BY sobre as notas não canceladas (mesma regra de core.vendas_diarias)."""
+    NotaFiscal = apps.get_model('core', 'NotaFiscal')
+    VendaDiaria = apps.get_model('core', 'VendaDiaria')
+
+    linhas = (
+        NotaFiscal.objects.exclude(status__istartswith='cancel')
+        .order_by()
+        .annotate(dia=TruncDate('data_emissao', tzinfo=timezone.get_current_timezone()))
+        .values('empresa_id', 'ambiente', 'dia', 'forma_pagamento', 'cliente_id')
+        .annotate(quantidade_notas=Count('id'), soma=Sum('valor_total'))
+    )
+    VendaDiaria.objects.bulk_create(
+        [
+            VendaDiaria(
+                empresa_id=linha['empresa_id'], ambiente=linha['ambiente'], dia=linha['dia'],
+                forma_pagamento=linha['forma_pagamento'], cliente_id=linha['cliente_id'],
+                quantidade_notas=linha['quantidade_notas'], valor_total=linha['soma'] or 0,
+            )
+            for linha in linhas
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_notafiscal_indices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ambiente', models.CharField(choices=[('homologacao', 'Homologação (Testes)'), ('producao', 'Produção (Real)')], max_length=20, verbose_name='Ambiente')),
+                ('dia', models.DateField(verbose_name='Dia')),
+                ('forma_pagamento', models.CharField(choices=[('01', 'Dinheiro'), ('03', 'Cartão de Crédito'), ('04', 'Cartão de Débito'), ('17', 'PIX')], max_length=2, verbose_name='Forma de Pagamento')),
+                ('quantidade_notas', models.IntegerField(default=0, verbose_name='Qtd. de Notas')),
+                ('valor_total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Valor Total (R$)')),
+                ('cliente', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.cliente', verbose_name='Cliente')),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.empresa', verbose_name='Empresa')),
+            ],
+            options={
+                'verbose_name': 'Venda Diária',
+                'verbose_name_plural': 'Vendas Diárias',
+                'ordering': ['-dia'],
+                'indexes': [models.Index(fields=['empresa', 'ambiente', 'dia', 'forma_pagamento', 'cliente'], name='venda_diaria_chave_idx')],
+            },
+        ),
+        migrations.RunPython(popular_vendas_diarias, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 6.0 on 2026-10-19 13:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def popular_vendas_produtos(apps, schema_editor):
+    """Backfill a partir de NotaFiscalItem (mesma regra de core.vendas_diarias)."""
+    NotaFiscalItem = apps.get_model('core', 'NotaFiscalItem')
+    VendaProdutoDiaria = apps.get_model('core', 'VendaProdutoDiaria')
+
+    linhas = (
+        NotaFiscalItem.objects.exclude(nota__status__istartswith='cancel')
+        .order_by()
+        .annotate(dia=TruncDate('nota__data_emissao', tzinfo=timezone.get_current_timezone()))
+        .values('nota__empresa_id', 'nota__ambiente', 'dia', 'codigo', 'produto_id')
+        .annotate(
+            soma_quantidade=Sum('quantidade'),
+            soma_valor=Sum(F('valor_total') - F('desconto')),
+            notas=Count('nota_id', distinct=True),
+            ultima_descricao=Max('descricao'),
+        )
+    )
+    VendaProdutoDiaria.objects.bulk_create(
+        [
+            VendaProdutoDiaria(
+                empresa_id=linha['nota__empresa_id'], ambiente=linha['nota__ambiente'], dia=linha['dia'],
+                codigo=linha['codigo'], produto_id=linha['produto_id'], descricao=linha['ultima_descricao'] or '',
+                quantidade=linha['soma_quantidade'] or 0, valor_total=linha['soma_valor'] or 0,
+                quantidade_notas=linha['notas'],
+            )
+            for linha in linhas
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_vendadiaria'),
+        ('estoque', '0003_produto_empresa_alter_produto_codigo_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendaProdutoDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ambiente', models.CharField(choices=[('homologacao', 'Homologação (Testes)'), ('producao', 'Produção (Real)')], max_length=20, verbose_name='Ambiente')),
+                ('dia', models.DateField(verbose_name='Dia')),
+                ('codigo', models.CharField(max_length=60, verbose_name='Código (cProd)')),
+                ('descricao', models.CharField(max_length=120, verbose_name='Descrição (xProd)')),
+                ('quantidade', models.DecimalField(decimal_places=4, default=0, max_digits=15, verbose_name='Quantidade')),
+                ('valor_total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Valor Total (R$)')),
+                ('quantidade_notas', models.IntegerField(default=0, verbose_name='Qtd. de Notas')),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.empresa', verbose_name='Empresa')),
+                ('produto', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='vendas_diarias', to='estoque.produto', verbose_name='Produto')),
+            ],
+            options={
+                'verbose_name': 'Venda Diária por Produto',
+                'verbose_name_plural': 'Vendas Diárias por Produto',
+                'ordering': ['-dia'],
+                'indexes': [models.Index(fields=['empresa', 'ambiente', 'dia', 'codigo'], name='venda_produto_chave_idx')],
+            },
+        ),
+        migrations.RunPython(popular_vendas_produtos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-19 14:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_vendaprodutodiaria'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notafiscalitem',
+            name='nota',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='itens', to='core.notafiscal', verbose_name='Nota Fiscal'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-19 14:40
+
+import core.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_notafiscalitem_sem_fk_no_banco'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notafiscal',
+            name='xml_assinado_arquivo',
+            field=models.CharField(blank=True, max_length=64, null=True, verbose_name='XML Arquivado (hash)'),
+        ),
+        migrations.AlterField(
+            model_name='notafiscal',
+            name='xml_assinado',
+            field=core.fields.XMLComprimidoField(arquivo='xml_assinado_arquivo', blank=True, null=True, verbose_name='XML + Protocolo'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-19 20:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_notafiscal_xml_arquivado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersaoVendas',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ambiente', models.CharField(choices=[('homologacao', 'Homologação (Testes)'), ('producao', 'Produção (Real)')], max_length=20, verbose_name='Ambiente')),
+                ('versao', models.PositiveBigIntegerField(default=0, verbose_name='Versão')),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.empresa', verbose_name='Empresa')),
+            ],
+            options={
+                'verbose_name': 'Versão das Vendas',
+                'verbose_name_plural': 'Versões das Vendas',
+                'constraints': [models.UniqueConstraint(fields=('empresa', 'ambiente'), name='versao_vendas_unica')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 6.0 on 2026-10-19 21:10
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def unificar_vendas_diarias(apps, schema_editor):
+    """Junta numa linha só as chaves duplicadas por vendas simultâneas, somando os totais."""
+    VendaDiaria = apps.get_model('core', 'VendaDiaria')
+    chave = ('empresa_id', 'ambiente', 'dia', 'forma_pagamento', 'cliente_id')
+
+    duplicadas = (
+        VendaDiaria.objects.order_by()
+        .values(*chave)
+        .annotate(linhas=Count('id'), primeira=Min('id'), notas=Sum('quantidade_notas'), soma=Sum('valor_total'))
+        .filter(linhas__gt=1)
+    )
+    for grupo in duplicadas:
+        linhas = VendaDiaria.objects.filter(**{campo: grupo[campo] for campo in chave})
+        linhas.exclude(id=grupo['primeira']).delete()
+        linhas.update(quantidade_notas=grupo['notas'], valor_total=grupo['soma'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_versao_vendas'),
+    ]
+
+    operations = [
+        migrations.RunPython(unificar_vendas_diarias, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='vendadiaria',
+            name='venda_diaria_chave_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='vendadiaria',
+            constraint=models.UniqueConstraint(models.F('empresa'), models.F('ambiente'), models.F('dia'), models.F('forma_pagamento'), django.db.models.functions.comparison.Coalesce('cliente', 0), name='venda_diaria_unica'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 6.0 on 2026-10-19 21:25
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def unificar_vendas_produtos(apps, schema_editor):
+    """Junta numa linha só as chaves duplicadas por vendas simultâneas, somando os totais."""
+    VendaProdutoDiaria = apps.get_model('core', 'VendaProdutoDiaria')
+    chave = ('empresa_id', 'ambiente', 'dia', 'codigo', 'produto_id')
+
+    duplicadas = (
+        VendaProdutoDiaria.objects.order_by()
+        .values(*chave)
+        .annotate(
+            linhas=Count('id'), primeira=Min('id'),
+            soma_quantidade=Sum('quantidade'), soma_valor=Sum('valor_total'), notas=Sum('quantidade_notas'),
+        )
+        .filter(linhas__gt=1)
+    )
+    for grupo in duplicadas:
+        linhas = VendaProdutoDiaria.objects.filter(**{campo: grupo[campo] for campo in chave})
+        linhas.exclude(id=grupo['primeira']).delete()
+        linhas.update(
+            quantidade=grupo['soma_quantidade'], valor_total=grupo['soma_valor'], quantidade_notas=grupo['notas'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_venda_diaria_unica'),
+    ]
+
+    operations = [
+        migrations.RunPython(unificar_vendas_produtos, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='vendaprodutodiaria',
+            name='venda_produto_chave_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='vendaprodutodiaria',
+            constraint=models.UniqueConstraint(models.F('empresa'), models.F('ambiente'), models.F('dia'), models.F('codigo'), django.db.models.functions.comparison.Coalesce('produto', 0), name='venda_produto_unica'),
+        ),
+    ]
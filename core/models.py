@@ -1,6 +1,9 @@
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 
+from .fields import XMLComprimidoField
+
 
 # ==================================================
 # 1. CADASTRO DE EMPRESAS (MULTI-TENANT)
@@ -211,6 +214,22 @@ class Cliente(models.Model):
         unique_together = ("empresa", "cpf_cnpj")
 
 
+class NotaFiscalQuerySet(models.QuerySet):
+    def com_xml(self):
+        """Carrega também xml_assinado/xml_cancelamento (adiados por padrão)."""
+        return self.defer(None)
+
+
+class NotaFiscalManager(models.Manager.from_queryset(NotaFiscalQuerySet)):
+    """
+    Adia os XMLs (5–50 KB cada) em toda consulta: listagens, admin e relatórios
+    não os leem. Quem precisa do XML usa NotaFiscal.objects.com_xml().
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().defer("xml_assinado", "xml_cancelamento")
+
+
 class NotaFiscal(models.Model):
     """
     Representa uma Nota Fiscal emitida ou pendente no sistema.
@@ -292,13 +311,17 @@ class NotaFiscal(models.Model):
     # ==================================================
     # 5. CAMPOS EXCLUSIVOS DO EMISSOR SEFAZ DIRETO
     # ==================================================
-    xml_assinado = models.TextField(blank=True, null=True, verbose_name="XML + Protocolo")
+    xml_assinado = XMLComprimidoField(verbose_name="XML + Protocolo", arquivo="xml_assinado_arquivo")
+    # Hash do XML movido para o arquivo de XMLs antigos (core.arquivo_xml); NULL = XML no banco
+    xml_assinado_arquivo = models.CharField(max_length=64, blank=True, null=True, verbose_name="XML Arquivado (hash)")
     protocolo_autorizacao = models.CharField(max_length=20, blank=True, null=True, verbose_name="Protocolo de Autorização")
     qrcode_url = models.URLField(max_length=700, blank=True, null=True, verbose_name="URL QR Code")
-    xml_cancelamento = models.TextField(blank=True, null=True, verbose_name="XML Cancelamento")
+    xml_cancelamento = XMLComprimidoField(verbose_name="XML Cancelamento")
     protocolo_cancelamento = models.CharField(max_length=20, blank=True, null=True, verbose_name="Protocolo Cancelamento")
     data_cancelamento = models.DateTimeField(blank=True, null=True, verbose_name="Data Cancelamento")
 
+    objects = NotaFiscalManager()
+
     # ==================================================
     # 4. MÉTODOS E CONFIGURAÇÕES
     # ==================================================
@@ -312,7 +335,156 @@ class NotaFiscal(models.Model):
         ordering = ["-data_emissao"]
         verbose_name = "Nota Fiscal"
         verbose_name_plural = "Notas Fiscais"
+        indexes = [
+            # Próximo número: filter(empresa, ambiente, serie).order_by('-numero')
+            models.Index(fields=["empresa", "ambiente", "serie", "-numero"], name="nota_numeracao_idx"),
+            # Histórico (listar_notas): filter(empresa, ambiente).order_by('-numero', '-serie')
+            models.Index(fields=["empresa", "ambiente", "-numero", "-serie"], name="nota_listagem_idx"),
+            # Filtros de período: data_emissao >= início AND < fim
+            models.Index(fields=["empresa", "ambiente", "data_emissao"], name="nota_periodo_idx"),
+            # Consulta por chave de acesso
+            models.Index(fields=["chave"], name="nota_chave_idx"),
+        ]
+
+
+class NotaFiscalItem(models.Model):
+    """
+    Item (det/prod) de uma Nota Fiscal, gravado na emissão junto com a nota.
+    Evita reler o XML para imprimir o DANFE ou saber o que foi vendido.
+    """
+
+    # Sem FK no banco: no Postgres a tabela de notas pode ser particionada por mês
+    # (core.particionamento), e FKs exigiriam a data na chave. O CASCADE é feito pelo ORM.
+    nota = models.ForeignKey(
+        NotaFiscal, on_delete=models.CASCADE, related_name="itens", verbose_name="Nota Fiscal",
+        db_constraint=False,
+    )
+    produto = models.ForeignKey(
+        "estoque.Produto",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="itens_vendidos",
+        verbose_name="Produto",
+    )
+    numero_item = models.PositiveIntegerField(default=1, verbose_name="Nº do Item (nItem)")
+    codigo = models.CharField(max_length=60, verbose_name="Código (cProd)")
+    descricao = models.CharField(max_length=120, verbose_name="Descrição (xProd)")
+    ncm = models.CharField(max_length=8, blank=True, default="", verbose_name="NCM")
+    unidade = models.CharField(max_length=6, default="UN", verbose_name="Unidade (uCom)")
+    quantidade = models.DecimalField(max_digits=15, decimal_places=4, verbose_name="Quantidade (qCom)")
+    valor_unitario = models.DecimalField(max_digits=15, decimal_places=4, verbose_name="Valor Unitário (vUnCom)")
+    valor_total = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Valor Total (vProd)")
+    desconto = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Desconto (vDesc)")
+
+    def __str__(self):
+        return f"{self.numero_item} - {self.descricao}"
+
+    class Meta:
+        ordering = ["nota", "numero_item"]
+        verbose_name = "Item da Nota Fiscal"
+        verbose_name_plural = "Itens da Nota Fiscal"
+
+
+
+class VendaDiaria(models.Model):
+    """
+    Resumo de vendas por dia (no fuso da loja), forma de pagamento e cliente.
+
+    Mantido junto com a emissão e o cancelamento das notas (core.vendas_diarias),
+    para que os totais do histórico somem poucas linhas por dia em vez de todas
+    as notas. Notas canceladas não entram no resumo.
+    """
 
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, verbose_name="Empresa")
+    ambiente = models.CharField(max_length=20, choices=NotaFiscal.AMBIENTE_CHOICES, verbose_name="Ambiente")
+    dia = models.DateField(verbose_name="Dia")
+    forma_pagamento = models.CharField(
+        max_length=2, choices=NotaFiscal.PAGAMENTO_CHOICES, verbose_name="Forma de Pagamento"
+    )
+    cliente = models.ForeignKey(
+        Cliente, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Cliente"
+    )
+    quantidade_notas = models.IntegerField(default=0, verbose_name="Qtd. de Notas")
+    valor_total = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Valor Total (R$)")
+
+    def __str__(self):
+        return f"{self.dia} {self.get_forma_pagamento_display()} - R$ {self.valor_total}"
+
+    class Meta:
+        ordering = ["-dia"]
+        verbose_name = "Venda Diária"
+        verbose_name_plural = "Vendas Diárias"
+        constraints = [
+            # Uma linha por chave; venda sem cliente (NULL) também conta como um valor só
+            models.UniqueConstraint(
+                "empresa", "ambiente", "dia", "forma_pagamento", Coalesce("cliente", 0),
+                name="venda_diaria_unica",
+            ),
+        ]
+
+
+class VendaProdutoDiaria(models.Model):
+    """
+    Resumo de vendas por dia e produto: quantidade vendida, faturamento e
+    número de notas. Mantido junto com VendaDiaria a partir dos itens de cada
+    nota (core.vendas_diarias) e usado no ranking/curva ABC de produtos.
+    """
+
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, verbose_name="Empresa")
+    ambiente = models.CharField(max_length=20, choices=NotaFiscal.AMBIENTE_CHOICES, verbose_name="Ambiente")
+    dia = models.DateField(verbose_name="Dia")
+    produto = models.ForeignKey(
+        "estoque.Produto",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="vendas_diarias",
+        verbose_name="Produto",
+    )
+    codigo = models.CharField(max_length=60, verbose_name="Código (cProd)")
+    descricao = models.CharField(max_length=120, verbose_name="Descrição (xProd)")
+    quantidade = models.DecimalField(max_digits=15, decimal_places=4, default=0, verbose_name="Quantidade")
+    valor_total = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Valor Total (R$)")
+    quantidade_notas = models.IntegerField(default=0, verbose_name="Qtd. de Notas")
+
+    def __str__(self):
+        return f"{self.dia} {self.descricao} - {self.quantidade}"
+
+    class Meta:
+        ordering = ["-dia"]
+        verbose_name = "Venda Diária por Produto"
+        verbose_name_plural = "Vendas Diárias por Produto"
+        constraints = [
+            # Uma linha por chave; item sem produto cadastrado (NULL) também conta como um valor só
+            models.UniqueConstraint(
+                "empresa", "ambiente", "dia", "codigo", Coalesce("produto", 0),
+                name="venda_produto_unica",
+            ),
+        ]
+
+
+class VersaoVendas(models.Model):
+    """
+    Versão dos resumos de vendas de cada empresa/ambiente, incrementada na
+    mesma transação que soma ou estorna uma nota (core.vendas_diarias). As
+    séries do dashboard ficam em cache sob esta versão, então uma venda em
+    qualquer processo desatualiza o cache de todos.
+    """
+
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, verbose_name="Empresa")
+    ambiente = models.CharField(max_length=20, choices=NotaFiscal.AMBIENTE_CHOICES, verbose_name="Ambiente")
+    versao = models.PositiveBigIntegerField(default=0, verbose_name="Versão")
+
+    def __str__(self):
+        return f"Vendas da empresa {self.empresa_id} ({self.ambiente}): versão {self.versao}"
+
+    class Meta:
+        verbose_name = "Versão das Vendas"
+        verbose_name_plural = "Versões das Vendas"
+        constraints = [
+            models.UniqueConstraint(fields=["empresa", "ambiente"], name="versao_vendas_unica"),
+        ]
 
 # ==================================================
 # 3. PERFIL DO USUÁRIO (VÍNCULO COM A EMPRESA)
@@ -0,0 +1,246 @@
+"""
+Particionamento mensal de core_notafiscal por data_emissao (somente PostgreSQL).
+
+As notas precisam ser guardadas por cinco anos e toda consulta filtra por
+empresa + período ou numeração. Com a tabela particionada por mês (RANGE em
+data_emissao), os filtros de período de filtrar_notas descartam os meses fora
+do intervalo (partition pruning), e meses antigos podem ser desanexados e
+arquivados (pg_dump + DROP) sem VACUUM da tabela inteira.
+
+É opcional e feito pelo comando particionar_notas:
+    --converter   troca a tabela comum pela particionada (uma vez, com a loja parada)
+    --meses N     cria as partições dos próximos N meses (rodar mensalmente no cron)
+    --desanexar   solta a partição de um mês, que vira uma tabela comum
+
+No SQLite (desenvolvimento e testes) a tabela continua comum.
+
+Observações do esquema particionado:
+    - A chave primária passa a ser (id, data_emissao), exigência do Postgres;
+      o id continua vindo de uma sequência, então segue único na prática.
+    - Nenhuma tabela tem FK de banco para core_notafiscal (NotaFiscalItem usa
+      db_constraint=False); o CASCADE dos itens é feito pelo ORM.
+    - Notas fora de qualquer mês criado caem na partição padrão (_padrao);
+      quando o mês ganha partição, elas são movidas para ela.
+    - Restrições/índices únicos só valem numa tabela particionada se incluírem
+      data_emissao; os que incluem são recriados, os demais impedem a
+      conversão (ValueError), em vez de sumirem em silêncio.
+"""
+
+from datetime import date
+
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from core.models import NotaFiscal
+from core.utils import inicio_do_dia
+
+TABELA = NotaFiscal._meta.db_table
+PARTICAO_PADRAO = f"{TABELA}_padrao"
+MESES_A_FRENTE = 3
+
+
+def _nome_particao(ano, mes):
+    return f"{TABELA}_p{ano:04d}{mes:02d}"
+
+
+def _proximo_mes(ano, mes):
+    return (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+
+
+def _meses(inicio, fim):
+    """(ano, mes) de `inicio` até `fim`, inclusive; ambos são tuplas (ano, mes)."""
+    atual = inicio
+    while atual <= fim:
+        yield atual
+        atual = _proximo_mes(*atual)
+
+
+def _avancar(ano, mes, meses):
+    total = ano * 12 + (mes - 1) + meses
+    return total // 12, total % 12 + 1
+
+
+def _limites(ano, mes):
+    """[dia 1 00:00, dia 1 do mês seguinte 00:00) no fuso da loja."""
+    return inicio_do_dia(date(ano, mes, 1)), inicio_do_dia(date(*_proximo_mes(ano, mes), 1))
+
+
+def sql_criar_particao(ano, mes):
+    """CREATE TABLE da partição do mês."""
+    inicio, fim = _limites(ano, mes)
+    return (
+        f'CREATE TABLE IF NOT EXISTS "{_nome_particao(ano, mes)}" PARTITION OF "{TABELA}" '
+        f"FOR VALUES FROM ('{inicio.isoformat()}') TO ('{fim.isoformat()}')"
+    )
+
+
+def suportado():
+    return connection.vendor == 'postgresql'
+
+
+def tabela_particionada():
+    if not suportado():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [TABELA]
+        )
+        return cursor.fetchone() is not None
+
+
+def _particoes_existentes(cursor):
+    cursor.execute(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = %s::regclass",
+        [TABELA],
+    )
+    return {nome for (nome,) in cursor.fetchall()}
+
+
+def _criar_particao(cursor, ano, mes, com_padrao):
+    """
+    Cria a partição do mês. Notas do mês que já caíram na partição padrão (cron
+    atrasado, data futura) impediriam o CREATE: a padrão é desanexada, as notas
+    passam para a partição nova e ela volta a ser anexada. Retorna quantas
+    notas foram movidas.
+    """
+    nome = _nome_particao(ano, mes)
+    inicio, fim = _limites(ano, mes)
+    periodo = "data_emissao >= %s AND data_emissao < %s"
+    if com_padrao:
+        cursor.execute(f'SELECT EXISTS (SELECT 1 FROM "{PARTICAO_PADRAO}" WHERE {periodo})', [inicio, fim])
+        com_padrao = cursor.fetchone()[0]
+    if not com_padrao:
+        cursor.execute(sql_criar_particao(ano, mes))
+        return 0
+
+    cursor.execute(f'ALTER TABLE "{TABELA}" DETACH PARTITION "{PARTICAO_PADRAO}"')
+    cursor.execute(sql_criar_particao(ano, mes))
+    cursor.execute(f'INSERT INTO "{nome}" SELECT * FROM "{PARTICAO_PADRAO}" WHERE {periodo}', [inicio, fim])
+    movidas = cursor.rowcount
+    cursor.execute(f'DELETE FROM "{PARTICAO_PADRAO}" WHERE {periodo}', [inicio, fim])
+    cursor.execute(f'ALTER TABLE "{TABELA}" ATTACH PARTITION "{PARTICAO_PADRAO}" DEFAULT')
+    return movidas
+
+
+def criar_particoes(meses_a_frente=MESES_A_FRENTE, hoje=None):
+    """
+    Cria as partições do mês atual até `meses_a_frente` meses adiante.
+
+    Returns:
+        list[tuple]: (nome da partição criada, notas movidas da partição padrão)
+
+    Raises:
+        ValueError: o banco recusou a partição de um mês (nenhuma é criada)
+    """
+    hoje = hoje or timezone.localdate()
+    inicio = (hoje.year, hoje.month)
+    criadas = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        existentes = _particoes_existentes(cursor)
+        for ano, mes in _meses(inicio, _avancar(*inicio, meses_a_frente)):
+            nome = _nome_particao(ano, mes)
+            if nome in existentes:
+                continue
+            try:
+                with transaction.atomic():
+                    movidas = _criar_particao(cursor, ano, mes, PARTICAO_PADRAO in existentes)
+            except DatabaseError as e:
+                raise ValueError(f"Falha ao criar a partição de {mes:02d}/{ano}: {e}") from e
+            criadas.append((nome, movidas))
+    return criadas
+
+
+def converter_tabela(meses_a_frente=MESES_A_FRENTE):
+    """
+    Recria core_notafiscal como tabela particionada por mês, copiando as notas.
+
+    Tudo roda numa transação com a tabela bloqueada: índices, restrições
+    únicas e FKs da tabela original são lidos do catálogo e recriados na nova
+    (índices criados na tabela-mãe valem para todas as partições).
+
+    Returns:
+        date: primeiro dia do mês da partição mais antiga
+
+    Raises:
+        ValueError: restrição ou índice único sem data_emissao, que o
+            Postgres não consegue garantir entre partições.
+    """
+    novo = f"{TABELA}_novo"
+    sequencia = f"{TABELA}_id_seq"
+    hoje = timezone.localdate()
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE "{TABELA}" IN ACCESS EXCLUSIVE MODE')
+
+        # Índices que não pertencem a uma restrição (as restrições vêm abaixo)
+        cursor.execute(
+            "SELECT c.relname, pg_get_indexdef(i.indexrelid), i.indisunique, "
+            "ARRAY(SELECT a.attname FROM pg_attribute a WHERE a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)) "
+            "FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE i.indrelid = %s::regclass AND NOT EXISTS ("
+            "SELECT 1 FROM pg_constraint r WHERE r.conrelid = i.indrelid AND r.conindid = i.indexrelid)",
+            [TABELA],
+        )
+        indices = cursor.fetchall()
+        cursor.execute(
+            "SELECT r.conname, pg_get_constraintdef(r.oid), r.contype, "
+            "ARRAY(SELECT a.attname FROM pg_attribute a WHERE a.attrelid = r.conrelid AND a.attnum = ANY(r.conkey)) "
+            "FROM pg_constraint r WHERE r.conrelid = %s::regclass AND r.contype IN ('f', 'u')",
+            [TABELA],
+        )
+        restricoes = cursor.fetchall()
+
+        sem_data = [nome for nome, _, unico, colunas in indices if unico and 'data_emissao' not in colunas]
+        sem_data += [nome for nome, _, tipo, colunas in restricoes if tipo == 'u' and 'data_emissao' not in colunas]
+        if sem_data:
+            raise ValueError(
+                f"Únicos sem data_emissao não valem entre partições: {', '.join(sorted(sem_data))}. "
+                f"Inclua data_emissao ou remova-os antes de converter."
+            )
+
+        cursor.execute(f'SELECT MIN(data_emissao), MAX(id) FROM "{TABELA}"')
+        primeira, ultimo_id = cursor.fetchone()
+
+        # Sem INCLUDING IDENTITY: partições não aceitam coluna identity antes do Postgres 17
+        cursor.execute(
+            f'CREATE TABLE "{novo}" (LIKE "{TABELA}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f"PARTITION BY RANGE (data_emissao)"
+        )
+        cursor.execute(f'ALTER TABLE "{novo}" ADD PRIMARY KEY (id, data_emissao)')
+        cursor.execute(f'CREATE SEQUENCE "{novo}_id_seq"')
+        cursor.execute(f"SELECT setval('\"{novo}_id_seq\"', %s, false)", [(ultimo_id or 0) + 1])
+        cursor.execute(f'ALTER TABLE "{novo}" ALTER COLUMN id SET DEFAULT nextval(\'"{novo}_id_seq"\')')
+
+        inicio = timezone.localtime(primeira).date() if primeira else hoje
+        for ano, mes in _meses((inicio.year, inicio.month),
+                               _avancar(hoje.year, hoje.month, meses_a_frente)):
+            cursor.execute(sql_criar_particao(ano, mes).replace(f'OF "{TABELA}"', f'OF "{novo}"'))
+        cursor.execute(f'CREATE TABLE "{PARTICAO_PADRAO}" PARTITION OF "{novo}" DEFAULT')
+
+        cursor.execute(f'INSERT INTO "{novo}" SELECT * FROM "{TABELA}"')
+        cursor.execute(f'DROP TABLE "{TABELA}"')
+        cursor.execute(f'ALTER TABLE "{novo}" RENAME TO "{TABELA}"')
+        cursor.execute(f'ALTER SEQUENCE "{novo}_id_seq" RENAME TO "{sequencia}"')
+        cursor.execute(f'ALTER SEQUENCE "{sequencia}" OWNED BY "{TABELA}".id')
+
+        for _, indexdef, _, _ in indices:
+            cursor.execute(indexdef)
+        for nome, definicao, _, _ in restricoes:
+            cursor.execute(f'ALTER TABLE "{TABELA}" ADD CONSTRAINT "{nome}" {definicao}')
+
+    return date(inicio.year, inicio.month, 1)
+
+
+def desanexar_particao(ano, mes):
+    """
+    Solta a partição do mês: as notas saem das consultas e a tabela
+    core_notafiscal_pAAAAMM fica pronta para pg_dump e DROP. Os resumos de
+    vendas (VendaDiaria) do mês continuam no banco.
+    """
+    nome = _nome_particao(ano, mes)
+    with transaction.atomic(), connection.cursor() as cursor:
+        if nome not in _particoes_existentes(cursor):
+            raise ValueError(f"Partição {nome} não existe.")
+        cursor.execute(f'ALTER TABLE "{TABELA}" DETACH PARTITION "{nome}"')
+    return nome
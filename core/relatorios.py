@@ -0,0 +1,317 @@
+"""
+Consultas de relatório sobre NotaFiscal compartilhadas entre views e comandos.
+
+Os mesmos filtros da tela de histórico (listar_notas) são reaproveitados
+pelas exportações, para que "o que aparece na tela" e "o que é exportado"
+nunca divirjam.
+"""
+
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Max, Q, Sum
+from django.db.models.functions import TruncDay, TruncHour, TruncMonth
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import NotaFiscal, VendaDiaria, VendaProdutoDiaria, VersaoVendas
+from .utils import inicio_do_dia
+
+
+# Ordem da listagem: segue nota_listagem_idx; o id desempata notas de mesma numeração/série.
+ORDEM_LISTAGEM = ('-numero', '-serie', '-id')
+NOTAS_POR_PAGINA = 50
+
+
+def filtros_da_request(request):
+    """Extrai da querystring os filtros usados em listar_notas."""
+    return {
+        'data_inicio': request.GET.get('data_inicio'),
+        'data_fim': request.GET.get('data_fim'),
+        'clientes': request.GET.getlist('clientes'),
+        'pagamentos': request.GET.getlist('pagamento'),
+    }
+
+
+def filtrar_notas(empresa, data_inicio=None, data_fim=None, clientes=None, pagamentos=None, ambiente=None):
+    """
+    QuerySet das notas da empresa no ambiente ativo (ou no informado),
+    com os filtros de período, clientes e forma de pagamento.
+    """
+    notas = NotaFiscal.objects.filter(
+        empresa=empresa,
+        ambiente=ambiente or empresa.ambiente,
+    )
+
+    # Intervalo semiaberto [início 00:00, dia seguinte ao fim 00:00) no fuso da loja:
+    # compara a coluna diretamente (sem __date), então o índice de período é usado.
+    inicio = inicio_do_dia(data_inicio)
+    if inicio:
+        notas = notas.filter(data_emissao__gte=inicio)
+    fim = inicio_do_dia(data_fim, dias=1)
+    if fim:
+        notas = notas.filter(data_emissao__lt=fim)
+
+    if clientes:
+        notas = notas.filter(cliente__id__in=clientes)
+
+    if pagamentos:
+        notas = notas.filter(forma_pagamento__in=pagamentos)
+
+    return notas
+
+
+def _dia(data):
+    """'AAAA-MM-DD' -> date; vazio ou inválido -> None."""
+    if not data or not isinstance(data, str):
+        return data or None
+    try:
+        return parse_date(data)
+    except ValueError:
+        return None
+
+
+def totais_vendas(empresa, data_inicio=None, data_fim=None, clientes=None, pagamentos=None, ambiente=None):
+    """
+    Totais por forma de pagamento das notas que filtrar_notas selecionaria
+    (exceto canceladas), lidos do resumo VendaDiaria: soma linhas por dia,
+    não notas.
+    """
+    vendas = VendaDiaria.objects.filter(
+        empresa=empresa,
+        ambiente=ambiente or empresa.ambiente,
+    )
+
+    inicio = _dia(data_inicio)
+    if inicio:
+        vendas = vendas.filter(dia__gte=inicio)
+    fim = _dia(data_fim)
+    if fim:
+        vendas = vendas.filter(dia__lte=fim)
+
+    if clientes:
+        vendas = vendas.filter(cliente__id__in=clientes)
+
+    if pagamentos:
+        vendas = vendas.filter(forma_pagamento__in=pagamentos)
+
+    return vendas.aggregate(
+        total_dinheiro=Sum('valor_total', filter=Q(forma_pagamento='01')),
+        total_pix=Sum('valor_total', filter=Q(forma_pagamento='17')),
+        total_debito=Sum('valor_total', filter=Q(forma_pagamento='04')),
+        total_credito=Sum('valor_total', filter=Q(forma_pagamento='03')),
+        total_geral=Sum('valor_total'),
+    )
+
+
+def _ler_cursor(cursor):
+    """'numero.serie.id' -> (numero, serie, id); cursor ausente ou inválido -> None."""
+    try:
+        numero, serie, nota_id = (int(parte) for parte in str(cursor).split('.'))
+    except (TypeError, ValueError):
+        return None
+    return numero, serie, nota_id
+
+
+def paginar_notas(notas, cursor=None, tamanho=None):
+    """
+    Página de notas por keyset (numero, serie, id), em ORDEM_LISTAGEM.
+
+    Em vez de OFFSET, a próxima página começa logo após a última nota da
+    anterior, então o custo não cresce com o número da página e notas
+    emitidas durante a navegação não duplicam nem pulam linhas.
+
+    Returns:
+        Tuple: (notas da página: list, proximo_cursor: str | None)
+    """
+    tamanho = tamanho or NOTAS_POR_PAGINA
+    posicao = _ler_cursor(cursor) if cursor else None
+    if posicao:
+        numero, serie, nota_id = posicao
+        notas = notas.filter(
+            Q(numero__lt=numero)
+            | Q(numero=numero, serie__lt=serie)
+            | Q(numero=numero, serie=serie, id__lt=nota_id)
+        )
+
+    # Busca uma nota a mais só para saber se existe próxima página
+    pagina = list(notas.order_by(*ORDEM_LISTAGEM)[:tamanho + 1])
+    if len(pagina) <= tamanho:
+        return pagina, None
+    pagina = pagina[:tamanho]
+    ultima = pagina[-1]
+    return pagina, f'{ultima.numero}.{ultima.serie}.{ultima.id}'
+
+
+# ─────────────────────────────────────────────
+# Séries de vendas do dashboard (home)
+# ─────────────────────────────────────────────
+
+GRANULARIDADES = ('hora', 'dia', 'mes')
+
+# Período padrão (em dias) e período máximo aceito por granularidade.
+# 'mes' sem data inicial: os 12 meses-calendário até o mês de data_fim.
+_PERIODO_PADRAO = {'hora': 1, 'dia': 30}
+_PERIODO_MAXIMO = {'hora': 31, 'dia': 366, 'mes': 366 * 5}
+_MESES_PADRAO = 12
+
+
+def invalidar_series_vendas(empresa_id, ambiente):
+    """
+    Incrementa a versão das séries da empresa/ambiente, descartando o cache
+    de todos os processos. Chamar dentro da transação que altera o resumo.
+    """
+    if not VersaoVendas.objects.filter(empresa_id=empresa_id, ambiente=ambiente).update(versao=F('versao') + 1):
+        VersaoVendas.objects.bulk_create(
+            [VersaoVendas(empresa_id=empresa_id, ambiente=ambiente, versao=1)], ignore_conflicts=True,
+        )
+
+
+def _series_versao(empresa_id, ambiente):
+    # Do mesmo banco que as séries (réplica nas views de relatório): versão e resumo atrasam juntos
+    versao = (
+        VersaoVendas.objects.filter(empresa_id=empresa_id, ambiente=ambiente)
+        .values_list('versao', flat=True)
+        .first()
+    )
+    return versao or 0
+
+
+def _inicio_dos_meses(fim, meses):
+    """Primeiro dia do mês `meses - 1` meses antes do mês de `fim`."""
+    indice = fim.year * 12 + fim.month - meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def serie_vendas(empresa, granularidade='dia', data_inicio=None, data_fim=None, ambiente=None):
+    """
+    Quantidade e valor de vendas por hora, dia ou mês no período [data_inicio, data_fim].
+
+    O agrupamento é feito no banco: 'hora' usa TruncHour sobre data_emissao
+    (nota_periodo_idx); 'dia' e 'mes' somam o resumo VendaDiaria. Notas
+    canceladas não entram. O resultado fica em cache por empresa/ambiente/
+    granularidade sob a versão VersaoVendas, até a próxima nota emitida ou
+    cancelada em qualquer processo. Sem data_inicio, 'mes' cobre os 12 meses
+    até o mês de data_fim, a partir do dia 1.
+
+    Returns:
+        List[dict]: {'periodo': ISO 8601, 'quantidade': int, 'valor': float}
+
+    Raises:
+        ValueError: granularidade desconhecida ou período inválido/longo demais.
+    """
+    if granularidade not in GRANULARIDADES:
+        raise ValueError(f"Granularidade inválida: {granularidade}")
+
+    ambiente = ambiente or empresa.ambiente
+    fim = _dia(data_fim) or timezone.localdate()
+    inicio = _dia(data_inicio)
+    if inicio is None:
+        if granularidade == 'mes':
+            inicio = _inicio_dos_meses(fim, _MESES_PADRAO)
+        else:
+            inicio = fim - timedelta(days=_PERIODO_PADRAO[granularidade] - 1)
+    if inicio > fim:
+        raise ValueError("Data inicial maior que a final.")
+    if (fim - inicio).days >= _PERIODO_MAXIMO[granularidade]:
+        raise ValueError(f"Período longo demais para a granularidade '{granularidade}'.")
+
+    chave = (
+        f'vendas:serie:{empresa.id}:{ambiente}:{granularidade}:'
+        f'{_series_versao(empresa.id, ambiente)}:{inicio}:{fim}'
+    )
+    serie = cache.get(chave)
+    if serie is not None:
+        return serie
+
+    if granularidade == 'hora':
+        linhas = (
+            NotaFiscal.objects.filter(
+                empresa=empresa, ambiente=ambiente,
+                data_emissao__gte=inicio_do_dia(inicio),
+                data_emissao__lt=inicio_do_dia(fim, dias=1),
+            )
+            .exclude(status__istartswith='cancel')
+            .order_by()
+            .annotate(periodo=TruncHour('data_emissao', tzinfo=timezone.get_current_timezone()))
+            .values('periodo')
+            .annotate(quantidade=Count('id'), valor=Sum('valor_total'))
+        )
+    else:
+        truncar = TruncDay if granularidade == 'dia' else TruncMonth
+        linhas = (
+            VendaDiaria.objects.filter(empresa=empresa, ambiente=ambiente, dia__gte=inicio, dia__lte=fim)
+            .order_by()
+            .annotate(periodo=truncar('dia'))
+            .values('periodo')
+            .annotate(quantidade=Sum('quantidade_notas'), valor=Sum('valor_total'))
+        )
+
+    serie = [
+        {
+            'periodo': linha['periodo'].isoformat(),
+            'quantidade': linha['quantidade'] or 0,
+            'valor': float(linha['valor'] or 0),
+        }
+        for linha in linhas.order_by('periodo')
+    ]
+    cache.set(chave, serie, getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 60 * 60))
+    return serie
+
+
+# ─────────────────────────────────────────────
+# Ranking de produtos e curva ABC
+# ─────────────────────────────────────────────
+
+# Faixas da curva ABC pelo faturamento acumulado (%)
+CURVA_ABC = (('A', 80), ('B', 95), ('C', 100))
+
+
+def ranking_produtos(empresa, data_inicio=None, data_fim=None, ambiente=None):
+    """
+    Produtos vendidos no período, do maior para o menor faturamento, com a
+    classe da curva ABC. Soma o resumo VendaProdutoDiaria (linhas por
+    dia/produto), não os itens das notas.
+
+    Returns:
+        List[dict]: codigo, descricao, produto_id, quantidade, valor, notas,
+        participacao (%), acumulado (%) e classe ('A', 'B' ou 'C').
+    """
+    vendas = VendaProdutoDiaria.objects.filter(
+        empresa=empresa,
+        ambiente=ambiente or empresa.ambiente,
+    )
+    inicio = _dia(data_inicio)
+    if inicio:
+        vendas = vendas.filter(dia__gte=inicio)
+    fim = _dia(data_fim)
+    if fim:
+        vendas = vendas.filter(dia__lte=fim)
+
+    linhas = list(
+        vendas.order_by()
+        .values('codigo', 'produto_id')
+        .annotate(
+            ultima_descricao=Max('descricao'),
+            nome_produto=Max('produto__nome'),
+            total_quantidade=Sum('quantidade'),
+            valor=Sum('valor_total'),
+            notas=Sum('quantidade_notas'),
+        )
+        .order_by('-valor', 'codigo')
+    )
+
+    total = sum(linha['valor'] or 0 for linha in linhas)
+    acumulado = 0
+    for linha in linhas:
+        participacao = (linha['valor'] or 0) / total * 100 if total else 0
+        # A classe vem do acumulado ANTES do produto: o item que cruza 80% ainda é A
+        linha['classe'] = next(classe for classe, limite in CURVA_ABC if acumulado < limite or limite == 100)
+        acumulado += participacao
+        linha['participacao'] = participacao
+        linha['acumulado'] = acumulado
+        ultima_descricao = linha.pop('ultima_descricao')
+        linha['descricao'] = linha.pop('nome_produto') or ultima_descricao
+        linha['quantidade'] = linha.pop('total_quantidade')
+    return linhas
@@ -40,6 +40,7 @@ from types import SimpleNamespace
 
 logger = logging.getLogger(__name__)
 
+from django.db import transaction
 from django.utils import timezone
 
 from erpbrasil.assinatura.certificado import Certificado
@@ -52,6 +53,8 @@ from xsdata.formats.dataclass.serializers.config import SerializerConfig
 
 from core.crypto import decrypt_bytes, decrypt_str
 from core.sefaz_payload import montar_nfce
+from core.vendas_diarias import estornar_venda, nota_cancelada
+from estoque.movimentos import estornar_estoque_venda
 
 # --- Monkey-patch: erpbrasil.edoc ESTADO_WS para MA ---
 # Bug upstream: MA não tem entradas mod-specific ("55"/"65") no mapeamento de
@@ -440,11 +443,22 @@ class SefazService:
             except Exception:
                 xml_canc = ""
 
+        ja_cancelada = nota_cancelada(nota_fiscal)
         nota_fiscal.status = "cancelado"
         nota_fiscal.xml_cancelamento = xml_canc or ""
         nota_fiscal.protocolo_cancelamento = n_prot_canc
         nota_fiscal.data_cancelamento = timezone.now()
+        # A SEFAZ já cancelou: o status é gravado sozinho, antes dos estornos
         nota_fiscal.save()
+        if not ja_cancelada:
+            # Uma falha aqui vai para o log e não desfaz o cancelamento; os resumos
+            # são refeitos por reconstruir_vendas_diarias
+            try:
+                with transaction.atomic():
+                    estornar_venda(nota_fiscal)
+                    estornar_estoque_venda(nota_fiscal)
+            except Exception:
+                logger.exception("Nota %s cancelada, mas falhou o estorno de resumos/estoque", nota_fiscal.id)
 
         return True, f"Nota cancelada com sucesso. Protocolo: {n_prot_canc}"
 
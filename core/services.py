@@ -1,6 +1,15 @@
+import os
+import re
+import threading
+import time
+import uuid
 import requests
 import json
 from datetime import datetime
+from functools import partial
+from django.conf import settings
+from django.db import transaction
+from lxml import etree
 from .models import NotaFiscal, PerfilUsuario
 
 def get_empresa_usuario(request):
@@ -18,6 +27,174 @@ def get_empresa_usuario(request):
         # Se o usuário não tiver perfil criado, retorna None
         return None
 
+# ==================================================
+# CACHE LOCAL DOS PDFs DA NUVEM FISCAL
+# ==================================================
+# PDFs vencidos (NUVEM_PDF_CACHE_DIAS) são baixados de novo; passando de
+# NUVEM_PDF_CACHE_MAX_MB, os mais antigos são apagados a cada novo download.
+# O PDF de uma nota cancelada é descartado (o DANFE muda).
+_TAMANHO_PEDACO = 64 * 1024
+
+_travas_pdf = {}
+_travas_pdf_guarda = threading.Lock()
+
+
+def _caminho_pdf_cache(id_nota_nuvem):
+    nome = re.sub(r"[^A-Za-z0-9_-]", "_", str(id_nota_nuvem))
+    return os.path.join(settings.NUVEM_PDF_CACHE_DIR, f"{nome}.pdf")
+
+
+def _remover(caminho):
+    try:
+        os.remove(caminho)
+    except FileNotFoundError:
+        pass
+
+
+def _pdf_em_cache(caminho):
+    """O PDF está no cache e ainda não venceu; um vencido é apagado."""
+    try:
+        gravado = os.path.getmtime(caminho)
+    except OSError:
+        return False
+    if time.time() - gravado > settings.NUVEM_PDF_CACHE_DIAS * 24 * 60 * 60:
+        _remover(caminho)
+        return False
+    return True
+
+
+def _podar_cache_pdf():
+    """Apaga os PDFs vencidos e, acima do tamanho máximo, os mais antigos."""
+    vencimento = time.time() - settings.NUVEM_PDF_CACHE_DIAS * 24 * 60 * 60
+    arquivos = []
+    with os.scandir(settings.NUVEM_PDF_CACHE_DIR) as entradas:
+        for entrada in entradas:
+            if not entrada.name.endswith(".pdf"):
+                continue
+            try:
+                info = entrada.stat()
+            except FileNotFoundError:
+                continue
+            if info.st_mtime < vencimento:
+                _remover(entrada.path)
+            else:
+                arquivos.append((info.st_mtime, info.st_size, entrada.path))
+
+    total = sum(tamanho for _, tamanho, _ in arquivos)
+    maximo = settings.NUVEM_PDF_CACHE_MAX_MB * 1024 * 1024
+    for _, tamanho, caminho in sorted(arquivos):
+        if total <= maximo:
+            break
+        _remover(caminho)
+        total -= tamanho
+
+
+def descartar_pdf_cache(id_nota_nuvem):
+    """Apaga o PDF em cache da nota."""
+    _remover(_caminho_pdf_cache(id_nota_nuvem))
+
+
+def nota_fiscal_salva(sender, instance, **kwargs):
+    """post_save de NotaFiscal: nota cancelada não reimprime o DANFE autorizado dos caches."""
+    from .danfe_cache import descartar_danfe_pdf
+    from .vendas_diarias import nota_cancelada
+
+    if not nota_cancelada(instance):
+        return
+    transaction.on_commit(partial(descartar_danfe_pdf, instance.id))
+    if instance.id_nota:
+        transaction.on_commit(partial(descartar_pdf_cache, instance.id_nota))
+
+
+def _trava_pdf(id_nota_nuvem):
+    with _travas_pdf_guarda:
+        return _travas_pdf.setdefault(id_nota_nuvem, threading.Lock())
+
+
+def _liberar_trava_pdf(id_nota_nuvem, trava):
+    if trava is None:
+        return
+    with _travas_pdf_guarda:
+        if _travas_pdf.get(id_nota_nuvem) is trava:
+            del _travas_pdf[id_nota_nuvem]
+    trava.release()
+
+
+class _ArquivoPdf:
+    """Lê um PDF do cache em pedaços."""
+
+    def __init__(self, caminho):
+        self._arquivo = open(caminho, "rb")
+
+    def __iter__(self):
+        return iter(lambda: self._arquivo.read(_TAMANHO_PEDACO), b"")
+
+    def close(self):
+        self._arquivo.close()
+
+
+def _abrir_cache(caminho):
+    """
+    PDF do cache aberto para leitura, ou None se não estiver lá: a poda de
+    outra requisição pode apagá-lo entre a verificação e o open (quem chama
+    baixa de novo). Depois de aberto, apagar o arquivo não afeta a leitura.
+    """
+    try:
+        return _ArquivoPdf(caminho)
+    except OSError:
+        return None
+
+
+class _DownloadPdf:
+    """
+    Repassa o corpo da resposta em pedaços enquanto grava o cache.
+    O arquivo só é publicado (os.replace) se o download terminar inteiro;
+    close() sempre libera a trava, mesmo que o cliente desista no meio.
+    Sem trava (caminho None), só repassa, sem gravar.
+    """
+
+    def __init__(self, response, caminho, id_nota_nuvem, trava):
+        self._response = response
+        self._caminho = caminho
+        self._id = id_nota_nuvem
+        self._trava = trava
+        self._fechado = False
+
+    def __iter__(self):
+        if self._caminho is None:
+            try:
+                for pedaco in self._response.iter_content(chunk_size=_TAMANHO_PEDACO):
+                    if pedaco:
+                        yield pedaco
+            finally:
+                self.close()
+            return
+
+        os.makedirs(os.path.dirname(self._caminho), exist_ok=True)
+        parcial = f"{self._caminho}.{uuid.uuid4().hex}.part"
+        completo = False
+        try:
+            with open(parcial, "wb") as destino:
+                for pedaco in self._response.iter_content(chunk_size=_TAMANHO_PEDACO):
+                    if pedaco:
+                        destino.write(pedaco)
+                        yield pedaco
+            os.replace(parcial, self._caminho)
+            completo = True
+            _podar_cache_pdf()
+        finally:
+            if not completo and os.path.exists(parcial):
+                os.remove(parcial)
+            self.close()
+
+    def close(self):
+        if self._fechado:
+            return
+        self._fechado = True
+        self._response.close()
+        _liberar_trava_pdf(self._id, self._trava)
+
+
 class NuvemFiscalService:
     """
     Serviço central responsável por toda a comunicação com a API da Nuvem Fiscal.
@@ -37,23 +214,24 @@ class NuvemFiscalService:
     AUTH_URL = "https://auth.nuvemfiscal.com.br/oauth/token"
 
     @classmethod
-    def get_base_url(cls, empresa):
+    def get_base_url(cls, empresa, ambiente=None):
         """
         Define a URL raiz da API com base no ambiente configurado na empresa.
         
         Args:
             empresa (Empresa): Objeto do banco contendo a configuração 'ambiente'.
+            ambiente (str): Força 'producao' ou 'homologacao' (ex: ambiente da nota).
             
         Returns:
             str: URL base (sem o endpoint específico).
         """
-        if empresa.ambiente == 'producao':
+        if (ambiente or empresa.ambiente) == 'producao':
             return "https://api.nuvemfiscal.com.br"
         else:
             return "https://api.sandbox.nuvemfiscal.com.br"
 
     @classmethod
-    def pegar_token(cls, empresa):
+    def pegar_token(cls, empresa, ambiente=None):
         """
         Realiza a autenticação OAuth2 (Client Credentials).
         
@@ -61,10 +239,12 @@ class NuvemFiscalService:
         que o sistema realize ações em nome da empresa.
         
         OBS: O escopo 'nfce cnpj' é obrigatório para emitir notas.
+        Se 'ambiente' for informado, usa as credenciais dele em vez das do ambiente ativo.
         """
-        
+        ambiente = ambiente or empresa.ambiente
+
         # 1. Seleciona as chaves corretas baseadas no ambiente
-        if empresa.ambiente == 'producao':
+        if ambiente == 'producao':
             client_id = empresa.nuvem_client_id_producao
             client_secret = empresa.nuvem_client_secret_producao
         else:
@@ -73,7 +253,7 @@ class NuvemFiscalService:
             
         # 2. Validação básica de segurança
         if not client_id or not client_secret:
-            print(f"ERRO CRÍTICO: Sem credenciais configuradas para {empresa.nome} no ambiente {empresa.ambiente}")
+            print(f"ERRO CRÍTICO: Sem credenciais configuradas para {empresa.nome} no ambiente {ambiente}")
             return None
         
         # 3. Payload de Autenticação
@@ -337,40 +517,150 @@ class NuvemFiscalService:
             return False, f"Erro Interno no Serviço: {str(e)}", 0.0
 
     @classmethod
-    def baixar_pdf(cls, empresa, id_nota_nuvem, ambiente=None):
+    def abrir_pdf(cls, empresa, id_nota_nuvem, ambiente=None):
         """
-        Recupera o binário do PDF (DANFE) da API.
+        Abre o PDF (DANFE) como um fluxo de bytes, usando o cache local.
+
+        - Cache hit: lê o arquivo salvo no primeiro download.
+        - Cache miss: baixa com `stream=True` e repassa pedaço a pedaço,
+          gravando o cache ao mesmo tempo (nunca carrega o PDF inteiro na memória).
+        - Requisições simultâneas da mesma nota no mesmo processo esperam o
+          primeiro download terminar e então leem do cache (single-flight),
+          por até NUVEM_PDF_TRAVA_TIMEOUT segundos; depois disso baixam sem
+          gravar o cache.
 
         Args:
             id_nota_nuvem: O ID único gerado pela Nuvem Fiscal (ex: 'nfe_12345...')
             ambiente: 'producao' ou 'homologacao'. Se omitido, usa empresa.ambiente.
+
+        Returns:
+            Tuple: (Fluxo: iterável de bytes ou None, Erro: str ou None)
         """
+        caminho = _caminho_pdf_cache(id_nota_nuvem)
+        if _pdf_em_cache(caminho):
+            fluxo = _abrir_cache(caminho)
+            if fluxo is not None:
+                return fluxo, None
+
+        trava = _trava_pdf(id_nota_nuvem)
+        if not trava.acquire(timeout=settings.NUVEM_PDF_TRAVA_TIMEOUT):
+            # O outro download está demorando: este segue sem cache
+            trava = caminho = None
         try:
-            # Usa o ambiente da nota, não o atual da empresa, para autenticar corretamente.
-            ambiente_original = empresa.ambiente
-            if ambiente and ambiente != empresa.ambiente:
-                empresa.ambiente = ambiente
-
-            token = cls.pegar_token(empresa)
-            empresa.ambiente = ambiente_original  # restaura sem salvar
+            # Outro download da mesma nota pode ter terminado enquanto esperávamos
+            fluxo = _abrir_cache(caminho) if caminho is not None else None
+            if fluxo is not None:
+                _liberar_trava_pdf(id_nota_nuvem, trava)
+                return fluxo, None
 
+            # Usa o ambiente da nota, não o atual da empresa, para autenticar corretamente.
+            token = cls.pegar_token(empresa, ambiente=ambiente)
             if not token:
+                _liberar_trava_pdf(id_nota_nuvem, trava)
                 return None, "Falha na autenticação (Token)"
 
-            base_url = cls.get_base_url(empresa)
+            base_url = cls.get_base_url(empresa, ambiente=ambiente)
             url = f"{base_url}/nfce/{id_nota_nuvem}/pdf"
             headers = {"Authorization": f"Bearer {token}"}
 
-            response = requests.get(url, headers=headers, timeout=30)
+            response = requests.get(url, headers=headers, timeout=30, stream=True)
 
-            if response.status_code == 200:
-                return response.content, None
-            else:
+            if response.status_code != 200:
                 erro_msg = f"Erro API ({response.status_code}): {response.text}"
+                response.close()
+                _liberar_trava_pdf(id_nota_nuvem, trava)
                 return None, erro_msg
+        except Exception as e:
+            _liberar_trava_pdf(id_nota_nuvem, trava)
+            return None, f"Erro interno ao baixar: {str(e)}"
+
+        return _DownloadPdf(response, caminho, id_nota_nuvem, trava), None
+
+    @classmethod
+    def baixar_pdf(cls, empresa, id_nota_nuvem, ambiente=None):
+        """
+        Recupera o binário do PDF (DANFE) inteiro, passando pelo cache local.
+        Para devolver ao navegador prefira abrir_pdf, que não bufferiza.
+        """
+        fluxo, erro = cls.abrir_pdf(empresa, id_nota_nuvem, ambiente=ambiente)
+        if fluxo is None:
+            return None, erro
+        try:
+            return b"".join(fluxo), None
         except Exception as e:
             return None, f"Erro interno ao baixar: {str(e)}"
+        finally:
+            fluxo.close()
         
+    @classmethod
+    def baixar_xml(cls, empresa, id_nota_nuvem, ambiente=None):
+        """
+        Recupera o XML autorizado (nfeProc) da NFC-e na API.
+
+        Returns:
+            Tuple: (XML: str ou None, Erro: str ou None)
+        """
+        try:
+            token = cls.pegar_token(empresa, ambiente=ambiente)
+            if not token:
+                return None, "Falha na autenticação (Token)"
+
+            base_url = cls.get_base_url(empresa, ambiente=ambiente)
+            url = f"{base_url}/nfce/{id_nota_nuvem}/xml"
+            headers = {"Authorization": f"Bearer {token}"}
+
+            response = requests.get(url, headers=headers, timeout=30)
+
+            if response.status_code == 200:
+                return response.content.decode("utf-8"), None
+            return None, f"Erro API ({response.status_code}): {response.text}"
+        except Exception as e:
+            return None, f"Erro interno ao baixar XML: {str(e)}"
+
+    @classmethod
+    def sincronizar_xml(cls, nota):
+        """
+        Busca uma única vez o XML autorizado de uma nota NuvemFiscal e grava na
+        NotaFiscal, junto com QR Code e protocolo extraídos dele. A partir daí a
+        nota é impressa localmente por core.danfe, igual às notas SEFAZ direto.
+
+        Returns:
+            bool: True se a nota tem XML local ao final.
+        """
+        if nota.xml_assinado:
+            return True
+        if not nota.id_nota:
+            return False
+
+        xml, erro = cls.baixar_xml(nota.empresa, nota.id_nota, ambiente=nota.ambiente)
+        if not xml:
+            print(f"Erro ao sincronizar XML da nota {nota.id}: {erro}")
+            return False
+        return cls.gravar_xml(nota, xml)
+
+    @classmethod
+    def gravar_xml(cls, nota, xml):
+        """
+        Grava na NotaFiscal o XML autorizado já baixado (ver sincronizar_xml).
+
+        Returns:
+            bool: False se o XML for inválido.
+        """
+        try:
+            raiz = etree.fromstring(xml.encode("utf-8"))
+        except (etree.XMLSyntaxError, ValueError):
+            print(f"XML inválido recebido para a nota {nota.id}")
+            return False
+
+        ns = {"nfe": "http://www.portalfiscal.inf.br/nfe"}
+        nota.xml_assinado = xml
+        nota.qrcode_url = nota.qrcode_url or raiz.findtext(".//nfe:infNFeSupl/nfe:qrCode", None, ns)
+        nota.protocolo_autorizacao = (
+            nota.protocolo_autorizacao or raiz.findtext(".//nfe:protNFe/nfe:infProt/nfe:nProt", None, ns)
+        )
+        nota.save(update_fields=["xml_assinado", "qrcode_url", "protocolo_autorizacao"])
+        return True
+
     @classmethod
     def consultar_nota_por_numero(cls, empresa, numero, serie):
         """
@@ -7,15 +7,41 @@ Coberturas:
 3. EmpresaConfigForm rejeita PFX inválido
 4. Numeração de NFC-e é isolada por ambiente (homologação não interfere na produção)
 5. View /configuracoes/ restrita a is_staff
-6. View /emitir-nota/ persiste campos SEFAZ direto corretamente
+6. View /emitir-nota/ persiste campos SEFAZ direto e itens estruturados
+7. DANFE NFC-e local (QR Code vetorial, ESC/POS)
+8. Exportação em lote de DANFEs (ZIP em streaming)
+9. PDF da Nuvem Fiscal: cache local e streaming
+10. Notas Nuvem Fiscal: XML persistido e DANFE local
+11. Índices de NotaFiscal e filtros de data sargáveis
+12. Paginação por cursor do histórico de notas
+13. Resumo diário de vendas (VendaDiaria)
+14. Séries de vendas do dashboard
+15. Ranking de produtos e curva ABC
+16. Exportação de notas em CSV/XLSX
+17. Pacote mensal de XMLs para o contador
+18. Roteamento de leituras para a réplica
+19. Particionamento mensal de notas (PostgreSQL)
+20. Arquivo de XMLs antigos
+
+Produtos, catálogo e estoque: estoque/tests.py
 """
 
-from unittest.mock import patch
+import io
+import json
+import os
+from decimal import Decimal
+import tempfile
+import zipfile
+from unittest import skipUnless
+from unittest.mock import MagicMock, patch
 
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 
 from django.contrib.auth.models import User
-from django.test import Client, TestCase
+from django.http import HttpResponse
+from django.test import Client, TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
 
 from .models import Empresa, NotaFiscal, PerfilUsuario
@@ -271,6 +297,25 @@ class EmitirNotaViewTest(TestCase):
         self.assertEqual(nota.qrcode_url, 'http://qrcode.example.com/abc')
         self.assertIsNone(nota.id_nota)  # SEFAZ direto não usa id_nota da NuvemFiscal
 
+    def test_emissao_grava_itens_estruturados_com_produto(self):
+        resposta_mock = {'id': 'nfc_1', 'numero': 1, 'serie': 2, 'chave': 'a' * 44}
+        self.empresa.emissor_fiscal = 'nuvem'
+        self.empresa.save()
+        with patch('core.fiscal_router.FiscalRouter.emitir_nfce', return_value=(True, resposta_mock, 10.0)):
+            self.client.post(
+                reverse('emitir_nota'),
+                data='{"itens":[{"id":' + str(self.produto.id) + ',"nome":"Arroz","quantidade":2,'
+                     '"preco_unitario":5.0,"valor_total":10.0,"ncm":"10063021"}],'
+                     '"forma_pagamento":"01"}',
+                content_type='application/json',
+            )
+
+        item = NotaFiscal.objects.get(empresa=self.empresa).itens.get()
+        self.assertEqual(item.produto, self.produto)
+        self.assertEqual((item.codigo, item.descricao, item.ncm), (str(self.produto.id), 'Arroz', '10063021'))
+        self.assertEqual(item.quantidade, 2)
+        self.assertEqual(item.valor_total, Decimal('10.00'))
+
     def test_emissao_sem_itens_retorna_400(self):
         resp = self.client.post(
             reverse('emitir_nota'),
@@ -278,3 +323,1200 @@ class EmitirNotaViewTest(TestCase):
             content_type='application/json',
         )
         self.assertEqual(resp.status_code, 400)
+
+    def test_falha_nos_resumos_nao_desfaz_nota_autorizada(self):
+        resposta_mock = {'numero': 7, 'serie': 2, 'chave': 'b' * 44, 'xml_protocolo': '<nfeProc/>'}
+        with patch('core.fiscal_router.FiscalRouter.emitir_nfce', return_value=(True, resposta_mock, 5.0)), \
+             patch('core.views.registrar_venda', side_effect=RuntimeError('resumo falhou')), \
+             self.assertLogs('core.views', level='ERROR'):
+            resp = self.client.post(
+                reverse('emitir_nota'),
+                data='{"itens":[{"id":' + str(self.produto.id) + ',"nome":"Arroz","quantidade":1,'
+                     '"preco_unitario":5.0,"valor_total":5.0,"ncm":"10063021"}],"forma_pagamento":"01"}',
+                content_type='application/json',
+            )
+
+        self.assertEqual(resp.status_code, 200)
+        nota = NotaFiscal.objects.get(id=resp.json()['id_nota'])
+        self.assertEqual((nota.numero, nota.chave), (7, 'b' * 44))
+        # Itens e estoque da mesma transação dos resumos foram desfeitos juntos
+        self.assertFalse(nota.itens.exists())
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.estoque_atual, 100)
+
+
+# ─────────────────────────────────────────────
+# 7. DANFE NFC-e local
+# ─────────────────────────────────────────────
+
+_XML_NFCE = (
+    '<nfeProc xmlns="http://www.portalfiscal.inf.br/nfe"><NFe><infNFe>'
+    '<det nItem="1"><prod><cProd>1</cProd><xProd>Arroz</xProd><uCom>UN</uCom>'
+    '<qCom>2.0000</qCom><vUnCom>5.00</vUnCom><vProd>10.00</vProd><NCM>10063021</NCM></prod></det>'
+    '<pag><detPag><tPag>01</tPag><vPag>10.00</vPag></detPag></pag>'
+    '</infNFe></NFe></nfeProc>'
+)
+
+
+class DanfeTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.empresa = _empresa(emissor='direto')
+        self.nota = NotaFiscal.objects.create(
+            empresa=self.empresa, numero=7, serie=2, valor_total='10.00',
+            status='AUTORIZADA', ambiente='homologacao', forma_pagamento='01',
+            chave='2' * 44, protocolo_autorizacao='135000000000001',
+            qrcode_url='http://www.hom.nfce.sefaz.ma.gov.br/portal/consultarNFCe.jsp?p=abc',
+            xml_assinado=_XML_NFCE,
+        )
+
+    def test_qrcode_vetorial_sem_imagem_embutida(self):
+        from core.danfe import gerar_danfe_nfce
+        pdf = gerar_danfe_nfce(self.nota)
+        self.assertTrue(pdf.startswith(b'%PDF'))
+        self.assertNotIn(b'/Subtype /Image', pdf)
+
+    def test_escpos_tem_qrcode_nativo_e_corte(self):
+        _usuario('operador', self.empresa)
+        self.client.login(username='operador', password='senha123')
+        resp = self.client.get(reverse('imprimir_nota_escpos', args=[self.nota.id]))
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.content.startswith(b'\x1b@'))
+        self.assertIn(b'\x1d(k', resp.content)
+        self.assertIn('Arroz'.encode('cp860'), resp.content)
+        self.assertTrue(resp.content.endswith(b'\x1dVB\x00'))
+
+    def test_reimpressao_usa_danfe_em_cache(self):
+        from core.danfe import gerar_danfe_nfce
+        _usuario('caixa', self.empresa)
+        self.client.login(username='caixa', password='senha123')
+        with patch('core.danfe_cache.gerar_danfe_nfce', wraps=gerar_danfe_nfce) as mock_gerar:
+            primeira = self.client.get(reverse('imprimir_nota', args=[self.nota.id]))
+            segunda = self.client.get(reverse('imprimir_nota', args=[self.nota.id]))
+        self.assertTrue(primeira.content.startswith(b'%PDF'))
+        self.assertEqual(segunda.content, primeira.content)
+        self.assertEqual(mock_gerar.call_count, 1)
+
+    def test_emissao_pre_renderiza_e_cancelamento_descarta(self):
+        from core.danfe_cache import _chave
+        _usuario('caixa', self.empresa)
+        self.client.login(username='caixa', password='senha123')
+        resultado = {'numero': 8, 'serie': 2, 'chave': '3' * 44, 'xml_protocolo': _XML_NFCE,
+                     'protocolo_autorizacao': '135000000000002'}
+        with patch('core.fiscal_router.FiscalRouter.emitir_nfce', return_value=(True, resultado, 10.0)):
+            resp = self.client.post(
+                reverse('emitir_nota'),
+                data='{"itens":[{"id":1,"nome":"Arroz","quantidade":2,"preco_unitario":5,"valor_total":10}]}',
+                content_type='application/json',
+            )
+        nota = NotaFiscal.objects.get(id=resp.json()['id_nota'])
+        self.assertIsNotNone(cache.get(_chave(nota.id)))
+
+        # A primeira impressão já sai do cache
+        with patch('core.danfe_cache.gerar_danfe_nfce') as mock_gerar:
+            impressao = self.client.get(reverse('imprimir_nota', args=[nota.id]))
+        self.assertTrue(impressao.content.startswith(b'%PDF'))
+        mock_gerar.assert_not_called()
+
+        nota.status = 'cancelado'
+        with self.captureOnCommitCallbacks(execute=True):
+            nota.save()
+        self.assertIsNone(cache.get(_chave(nota.id)))
+
+    def test_popular_itens_notas_le_xml_das_notas_antigas(self):
+        from django.core.management import call_command
+        call_command('popular_itens_notas', lote=1, stdout=io.StringIO())
+        item = self.nota.itens.get()
+        self.assertEqual((item.codigo, item.descricao, item.unidade), ('1', 'Arroz', 'UN'))
+        self.assertEqual(item.quantidade, 2)
+
+    def test_danfe_usa_itens_estruturados_sem_reler_xml(self):
+        from core.danfe import gerar_danfe_nfce
+        from django.core.management import call_command
+        call_command('popular_itens_notas', stdout=io.StringIO())
+        with patch('core.danfe._parse_xml') as mock_parse:
+            gerar_danfe_nfce(self.nota)
+        mock_parse.assert_not_called()
+
+    def test_escpos_linha_com_valor_maior_que_a_bobina(self):
+        from core.danfe_escpos import _lr
+        self.assertEqual(_lr('Valor', '1,00').decode('cp860'), 'Valor' + ' ' * 39 + '1,00\n')
+        direita = '1234,000 KG x 99999,99 = 123399987,65 (promoção)'
+        self.assertEqual(_lr('Arroz', direita).decode('cp860'), f' {direita}\n')
+
+    def test_itens_estruturados_mantem_pagamentos_e_troco_do_xml(self):
+        from django.core.management import call_command
+        from core.danfe_escpos import gerar_escpos_nfce
+        self.nota.xml_assinado = _XML_NFCE.replace(
+            '<pag><detPag><tPag>01</tPag><vPag>10.00</vPag></detPag></pag>',
+            '<pag><detPag><tPag>17</tPag><vPag>4.00</vPag></detPag>'
+            '<detPag><tPag>01</tPag><vPag>10.00</vPag></detPag></pag>',
+        )
+        self.nota.save()
+        call_command('popular_itens_notas', stdout=io.StringIO())
+
+        texto = gerar_escpos_nfce(NotaFiscal.objects.com_xml().get(id=self.nota.id)).decode('cp860')
+        self.assertRegex(texto, r'PIX +4,00')
+        self.assertRegex(texto, r'Dinheiro +10,00')
+        self.assertRegex(texto, r'Troco R\$ +4,00')
+
+    def test_xml_gravado_comprimido_e_adiado_nas_consultas(self):
+        from django.db import connection
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT xml_assinado FROM core_notafiscal WHERE id = %s', [self.nota.id])
+            bruto = bytes(cursor.fetchone()[0])
+        self.assertLess(len(bruto), len(_XML_NFCE))
+        self.assertNotIn(b'<nfeProc', bruto)
+
+        nota = NotaFiscal.objects.get(id=self.nota.id)
+        self.assertEqual(nota.get_deferred_fields(), {'xml_assinado', 'xml_cancelamento'})
+        self.assertEqual(NotaFiscal.objects.com_xml().get(id=self.nota.id).xml_assinado, _XML_NFCE)
+
+    def test_matriz_qrcode_memoizada_por_url(self):
+        from core.danfe import _qr_modulos
+        _qr_modulos.cache_clear()
+        _qr_modulos(self.nota.qrcode_url)
+        _qr_modulos(self.nota.qrcode_url)
+        self.assertEqual(_qr_modulos.cache_info().hits, 1)
+
+
+# ─────────────────────────────────────────────
+# 8. Exportação em lote de DANFEs
+# ─────────────────────────────────────────────
+
+@override_settings(DANFE_LOTE_WORKERS=1)
+class ExportarDanfesTest(TestCase):
+
+    def setUp(self):
+        self.empresa = _empresa(emissor='direto')
+        _usuario('operador', self.empresa)
+        for numero, pagamento in ((1, '01'), (2, '17')):
+            NotaFiscal.objects.create(
+                empresa=self.empresa, numero=numero, serie=2, valor_total='10.00',
+                status='AUTORIZADA', ambiente='homologacao', forma_pagamento=pagamento,
+                chave='2' * 44, xml_assinado=_XML_NFCE,
+            )
+        self.client = Client()
+        self.client.login(username='operador', password='senha123')
+
+    def _zip(self, resp):
+        return zipfile.ZipFile(io.BytesIO(b''.join(resp.streaming_content)))
+
+    def test_zip_contem_um_pdf_por_nota(self):
+        resp = self.client.get(reverse('exportar_danfes'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['Content-Type'], 'application/zip')
+        self.assertEqual(sorted(self._zip(resp).namelist()), ['danfe_2_1.pdf', 'danfe_2_2.pdf'])
+
+    def test_zip_respeita_filtros_de_listar_notas(self):
+        resp = self.client.get(reverse('exportar_danfes'), {'pagamento': '17'})
+        self.assertEqual(self._zip(resp).namelist(), ['danfe_2_2.pdf'])
+
+
+# ─────────────────────────────────────────────
+# 9. PDF da Nuvem Fiscal: cache local e streaming
+# ─────────────────────────────────────────────
+
+class NuvemPdfCacheTest(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.override = override_settings(NUVEM_PDF_CACHE_DIR=self.tmp.name)
+        self.override.enable()
+        self.empresa = _empresa(emissor='nuvem')
+        _usuario('operador', self.empresa)
+        self.nota = NotaFiscal.objects.create(
+            empresa=self.empresa, numero=1, serie=2, valor_total='10.00', id_nota='nfc_123',
+            status='AUTORIZADA', ambiente='producao', forma_pagamento='01',
+        )
+        self.client = Client()
+        self.client.login(username='operador', password='senha123')
+
+    def tearDown(self):
+        self.override.disable()
+        self.tmp.cleanup()
+
+    def _resposta_api(self):
+        resp = MagicMock(status_code=200)
+        resp.iter_content.return_value = [b'%PDF-1.4 ', b'conteudo']
+        return resp
+
+    def test_primeira_impressao_faz_streaming_e_segunda_usa_cache(self):
+        url = reverse('imprimir_nota', args=[self.nota.id])
+        with patch('core.services.NuvemFiscalService.baixar_xml', return_value=(None, 'indisponível')), \
+             patch('core.services.NuvemFiscalService.pegar_token', return_value='tk') as mock_token, \
+             patch('core.services.requests.get', return_value=self._resposta_api()) as mock_get:
+            resp1 = self.client.get(url)
+            self.assertEqual(b''.join(resp1.streaming_content), b'%PDF-1.4 conteudo')
+            resp2 = self.client.get(url)
+            self.assertEqual(b''.join(resp2.streaming_content), b'%PDF-1.4 conteudo')
+
+        mock_get.assert_called_once()
+        self.assertTrue(mock_get.call_args.kwargs['stream'])
+        self.assertIn('api.nuvemfiscal.com.br', mock_get.call_args.args[0])
+        # Autentica no ambiente da nota sem alterar o ambiente da empresa
+        self.assertEqual(mock_token.call_args.kwargs['ambiente'], 'producao')
+        self.empresa.refresh_from_db()
+        self.assertEqual(self.empresa.ambiente, 'homologacao')
+
+    def test_download_interrompido_nao_grava_cache(self):
+        from core.services import NuvemFiscalService, _caminho_pdf_cache
+        with patch('core.services.NuvemFiscalService.pegar_token', return_value='tk'), \
+             patch('core.services.requests.get', return_value=self._resposta_api()):
+            fluxo, erro = NuvemFiscalService.abrir_pdf(self.empresa, 'nfc_123', ambiente='producao')
+            next(iter(fluxo))
+            fluxo.close()
+            # A trava foi liberada: uma nova abertura não fica bloqueada
+            fluxo2, _ = NuvemFiscalService.abrir_pdf(self.empresa, 'nfc_123', ambiente='producao')
+            fluxo2.close()
+        self.assertIsNone(erro)
+        self.assertFalse(os.path.exists(_caminho_pdf_cache('nfc_123')))
+
+    def _abrir(self):
+        from core.services import NuvemFiscalService
+        with patch('core.services.NuvemFiscalService.pegar_token', return_value='tk'), \
+             patch('core.services.requests.get', return_value=self._resposta_api()) as mock_get:
+            fluxo, _ = NuvemFiscalService.abrir_pdf(self.empresa, 'nfc_123', ambiente='producao')
+            try:
+                conteudo = b''.join(fluxo)
+            finally:
+                fluxo.close()
+        return conteudo, mock_get.called
+
+    def test_cancelamento_descarta_pdf_em_cache(self):
+        from core.services import _caminho_pdf_cache
+        self._abrir()
+        self.assertTrue(os.path.exists(_caminho_pdf_cache('nfc_123')))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.nota.status = 'CANCELADA'
+            self.nota.save()
+        self.assertFalse(os.path.exists(_caminho_pdf_cache('nfc_123')))
+
+    def test_pdf_podado_depois_da_verificacao_e_baixado_de_novo(self):
+        # A poda de outra requisição apaga o arquivo entre _pdf_em_cache e o open
+        with patch('core.services._pdf_em_cache', return_value=True):
+            self.assertEqual(self._abrir(), (b'%PDF-1.4 conteudo', True))
+
+    def test_pdf_vencido_e_baixado_de_novo(self):
+        import time
+        from core.services import _caminho_pdf_cache
+        self._abrir()
+        self.assertFalse(self._abrir()[1])
+        antigo = time.time() - 31 * 24 * 60 * 60
+        os.utime(_caminho_pdf_cache('nfc_123'), (antigo, antigo))
+        self.assertTrue(self._abrir()[1])
+
+    def test_cache_acima_do_maximo_apaga_os_mais_antigos(self):
+        import time
+        from core.services import _caminho_pdf_cache
+        antigo = os.path.join(self.tmp.name, 'nfc_antigo.pdf')
+        with open(antigo, 'wb') as arquivo:
+            arquivo.write(b'%PDF-1.4 conteudo')
+        os.utime(antigo, (time.time() - 60, time.time() - 60))
+        with override_settings(NUVEM_PDF_CACHE_MAX_MB=20 / (1024 * 1024)):  # cabe um PDF de 17 bytes
+            self._abrir()
+        self.assertFalse(os.path.exists(antigo))
+        self.assertTrue(os.path.exists(_caminho_pdf_cache('nfc_123')))
+
+    @override_settings(NUVEM_PDF_TRAVA_TIMEOUT=0.01)
+    def test_download_preso_nao_bloqueia_outro_para_sempre(self):
+        from core.services import _caminho_pdf_cache, _trava_pdf
+        trava = _trava_pdf('nfc_123')
+        trava.acquire()
+        try:
+            conteudo, baixou = self._abrir()
+        finally:
+            trava.release()
+        self.assertEqual(conteudo, b'%PDF-1.4 conteudo')
+        self.assertTrue(baixou)
+        self.assertFalse(os.path.exists(_caminho_pdf_cache('nfc_123')))
+
+
+# ─────────────────────────────────────────────
+# 10. Notas Nuvem Fiscal: XML persistido e DANFE local
+# ─────────────────────────────────────────────
+
+class NuvemXmlLocalTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.empresa = _empresa(emissor='nuvem')
+        _usuario('operador', self.empresa)
+        self.nota = NotaFiscal.objects.create(
+            empresa=self.empresa, numero=3, serie=2, valor_total='10.00', id_nota='nfc_456',
+            status='AUTORIZADA', ambiente='homologacao', forma_pagamento='01', chave='2' * 44,
+        )
+        self.xml = _XML_NFCE.replace(
+            '</NFe>',
+            '<infNFeSupl><qrCode>http://qr.example/p=1</qrCode></infNFeSupl></NFe>'
+            '<protNFe><infProt><nProt>221000000000009</nProt></infProt></protNFe>',
+        )
+        self.client = Client()
+        self.client.login(username='operador', password='senha123')
+
+    def test_primeira_impressao_grava_xml_e_renderiza_localmente(self):
+        url = reverse('imprimir_nota', args=[self.nota.id])
+        with patch('core.services.NuvemFiscalService.baixar_xml', return_value=(self.xml, None)) as mock_xml, \
+             patch('core.services.NuvemFiscalService.abrir_pdf') as mock_pdf:
+            resp1 = self.client.get(url)
+            resp2 = self.client.get(url)
+
+        self.assertTrue(resp1.content.startswith(b'%PDF'))
+        self.assertTrue(resp2.content.startswith(b'%PDF'))
+        mock_xml.assert_called_once()
+        mock_pdf.assert_not_called()
+        self.nota.refresh_from_db()
+        self.assertEqual(self.nota.qrcode_url, 'http://qr.example/p=1')
+        self.assertEqual(self.nota.protocolo_autorizacao, '221000000000009')
+
+
+# ─────────────────────────────────────────────
+# 11. Índices de NotaFiscal e filtros de data sargáveis
+# ─────────────────────────────────────────────
+
+class NotaFiscalIndicesTest(TestCase):
+
+    def setUp(self):
+        self.empresa = _empresa()
+
+    def _plano(self, queryset):
+        from django.db import connection
+        if connection.vendor == 'postgresql':
+            # Tabela de teste é minúscula: força o planejador a considerar os índices
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+        return queryset.explain()
+
+    def test_numeracao_usa_indice(self):
+        qs = NotaFiscal.objects.filter(empresa=self.empresa, serie=2, ambiente='homologacao').order_by('-numero')
+        self.assertIn('nota_numeracao_idx', self._plano(qs))
+
+    def test_listagem_usa_indice_sem_ordenar_em_memoria(self):
+        from core.relatorios import filtrar_notas
+        qs = filtrar_notas(self.empresa).order_by('-numero', '-serie')
+        plano = self._plano(qs)
+        self.assertIn('nota_listagem_idx', plano)
+        self.assertNotIn('TEMP B-TREE', plano)
+
+    def test_filtro_de_periodo_e_intervalo_semiaberto_no_fuso_da_loja(self):
+        from core.relatorios import filtrar_notas
+        qs = filtrar_notas(self.empresa, data_inicio='2024-06-01', data_fim='2024-06-30')
+        sql = str(qs.query)
+        self.assertNotIn('django_datetime_cast_date', sql)
+        self.assertNotIn('AT TIME ZONE', sql)
+        self.assertIn('nota_periodo_idx', self._plano(qs))
+
+    def test_filtro_de_periodo_inclui_o_dia_final_inteiro(self):
+        from datetime import datetime
+        from django.utils import timezone
+        from core.relatorios import filtrar_notas
+        tz = timezone.get_current_timezone()
+        for numero, quando in ((1, datetime(2024, 6, 30, 23, 59)), (2, datetime(2024, 7, 1, 0, 0))):
+            nota = NotaFiscal.objects.create(
+                empresa=self.empresa, numero=numero, serie=2, valor_total='1.00',
+                ambiente='homologacao', forma_pagamento='01',
+            )
+            NotaFiscal.objects.filter(id=nota.id).update(data_emissao=timezone.make_aware(quando, tz))
+
+        numeros = filtrar_notas(self.empresa, data_inicio='2024-06-30', data_fim='2024-06-30').values_list('numero', flat=True)
+        self.assertEqual(list(numeros), [1])
+
+    def test_busca_por_chave_usa_indice(self):
+        self.assertIn('nota_chave_idx', self._plano(NotaFiscal.objects.filter(chave='1' * 44)))
+
+
+# ─────────────────────────────────────────────
+# 12. Paginação por cursor do histórico de notas
+# ─────────────────────────────────────────────
+
+class ListarNotasPaginacaoTest(TestCase):
+
+    def setUp(self):
+        self.empresa = _empresa()
+        self.client.force_login(_usuario('caixa', self.empresa))
+        for numero in range(1, 6):
+            NotaFiscal.objects.create(
+                empresa=self.empresa, numero=numero, serie=2, valor_total='10.00',
+                ambiente='homologacao', forma_pagamento='01' if numero % 2 else '17',
+            )
+        from core.vendas_diarias import reconstruir_vendas_diarias
+        reconstruir_vendas_diarias()
+
+    def _json(self, **params):
+        resp = self.client.get(reverse('listar_notas'), {'formato': 'json', **params})
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()
+
+    @patch('core.relatorios.NOTAS_POR_PAGINA', 2)
+    def test_cursor_percorre_todas_as_notas_sem_repetir(self):
+        numeros, cursor = [], None
+        while True:
+            dados = self._json(**({'cursor': cursor} if cursor else {}))
+            numeros += [n['numero'] for n in dados['notas']]
+            cursor = dados['proximo_cursor']
+            if not cursor:
+                break
+        self.assertEqual(numeros, [5, 4, 3, 2, 1])
+
+    def test_cursor_mantem_filtros(self):
+        dados = self._json(pagamento='17', cursor='5.2.999999')
+        self.assertEqual([n['numero'] for n in dados['notas']], [4, 2])
+        self.assertIsNone(dados['proximo_cursor'])
+        self.assertIn('<tr>', dados['html'])
+
+    @patch('core.relatorios.NOTAS_POR_PAGINA', 2)
+    def test_totais_consideram_todas_as_notas_filtradas(self):
+        resp = self.client.get(reverse('listar_notas'))
+        self.assertEqual(len(resp.context['notas']), 2)
+        self.assertEqual(resp.context['totais']['total_geral'], Decimal('50.00'))
+        self.assertContains(resp, 'btn-carregar-mais')
+
+    def test_cursor_invalido_volta_para_primeira_pagina(self):
+        dados = self._json(cursor='abc')
+        self.assertEqual(dados['notas'][0]['numero'], 5)
+
+
+# ─────────────────────────────────────────────
+# 13. Resumo diário de vendas (VendaDiaria)
+# ─────────────────────────────────────────────
+
+class VendaDiariaTest(TestCase):
+
+    def setUp(self):
+        self.empresa = _empresa(emissor='direto')
+        self.client.force_login(_usuario('operador', self.empresa))
+
+    def _nota(self, numero, valor, forma='01', quando=None):
+        from django.utils import timezone
+        nota = NotaFiscal.objects.create(
+            empresa=self.empresa, numero=numero, serie=2, valor_total=valor,
+            ambiente='homologacao', forma_pagamento=forma, status='AUTORIZADA',
+        )
+        if quando:
+            nota.data_emissao = timezone.make_aware(quando)
+            NotaFiscal.objects.filter(id=nota.id).update(data_emissao=nota.data_emissao)
+        return nota
+
+    def test_emissao_soma_no_resumo_do_dia(self):
+        from core.models import VendaDiaria
+        with patch('core.fiscal_router.FiscalRouter.emitir_nfce',
+                   return_value=(True, {'numero': 1, 'serie': 2, 'chave': 'a' * 44}, 7.5)):
+            for _ in range(2):
+                self.client.post(
+                    reverse('emitir_nota'),
+                    data='{"itens":[{"id":1,"nome":"Arroz","quantidade":1,"preco_unitario":7.5,'
+                         '"valor_total":7.5}],"forma_pagamento":"17"}',
+                    content_type='application/json',
+                )
+
+        venda = VendaDiaria.objects.get(empresa=self.empresa)
+        self.assertEqual((venda.quantidade_notas, venda.valor_total, venda.forma_pagamento), (2, Decimal('15.00'), '17'))
+
+    def test_cancelamento_estorna_e_reconstrucao_confere(self):
+        from datetime import datetime
+        from core.models import VendaDiaria
+        from core.relatorios import totais_vendas
+        from core.vendas_diarias import estornar_venda, reconstruir_vendas_diarias, registrar_venda
+
+        notas = [
+            self._nota(1, '10.00', '01', datetime(2024, 6, 1, 9, 0)),
+            self._nota(2, '20.00', '17', datetime(2024, 6, 1, 23, 30)),
+            self._nota(3, '5.00', '01', datetime(2024, 6, 2, 8, 0)),
+        ]
+        for nota in notas:
+            registrar_venda(nota)
+        notas[0].status = 'cancelado'
+        notas[0].save()
+        estornar_venda(notas[0])
+
+        incremental = totais_vendas(self.empresa, data_inicio='2024-06-01', data_fim='2024-06-01')
+        self.assertEqual(incremental['total_geral'], Decimal('20.00'))
+        self.assertIsNone(incremental['total_dinheiro'])
+
+        self.assertEqual(VendaDiaria.objects.filter(empresa=self.empresa).count(), 2)
+        reconstruir_vendas_diarias(self.empresa)
+        self.assertEqual(totais_vendas(self.empresa, data_inicio='2024-06-01', data_fim='2024-06-01'), incremental)
+        self.assertEqual(VendaDiaria.objects.filter(empresa=self.empresa).count(), 2)
+
+    def test_primeira_venda_simultanea_soma_na_mesma_linha(self):
+        from django.db import IntegrityError, transaction
+        from django.db.models import QuerySet
+        from core.models import VendaDiaria
+        from core.relatorios import totais_vendas
+        from core.vendas_diarias import registrar_venda
+
+        registrar_venda(self._nota(1, '10.00'))
+        # A outra transação criou a linha entre o UPDATE (0 linhas) e o INSERT desta
+        update = QuerySet.update
+        chamadas = []
+
+        def update_atrasado(queryset, **campos):
+            chamadas.append(queryset.model)
+            return 0 if len(chamadas) == 1 else update(queryset, **campos)
+
+        with patch.object(QuerySet, 'update', update_atrasado):
+            registrar_venda(self._nota(2, '20.00'))
+
+        venda = VendaDiaria.objects.get(empresa=self.empresa)
+        self.assertEqual((venda.quantidade_notas, venda.valor_total), (2, Decimal('30.00')))
+        self.assertEqual(totais_vendas(self.empresa)['total_geral'], Decimal('30.00'))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            VendaDiaria.objects.create(empresa=self.empresa, ambiente=venda.ambiente, dia=venda.dia,
+                                       forma_pagamento='01', cliente=None)
+
+    def test_comando_reconstruir(self):
+        from django.core.management import call_command
+        from core.relatorios import totais_vendas
+        self._nota(1, '12.34')
+        call_command('reconstruir_vendas_diarias', empresa=self.empresa.id, stdout=io.StringIO())
+        self.assertEqual(totais_vendas(self.empresa)['total_geral'], Decimal('12.34'))
+
+
+# ─────────────────────────────────────────────
+# 14. Séries de vendas do dashboard
+# ─────────────────────────────────────────────
+
+class SerieVendasTest(TestCase):
+
+    def setUp(self):
+        from datetime import datetime
+        from django.utils import timezone
+        from core.vendas_diarias import registrar_venda
+        cache.clear()
+        self.empresa = _empresa()
+        self.client.force_login(_usuario('gerente', self.empresa))
+        horarios = [datetime(2024, 6, 1, 9, 10), datetime(2024, 6, 1, 9, 50), datetime(2024, 6, 1, 22, 0),
+                    datetime(2024, 6, 2, 8, 0), datetime(2024, 7, 3, 12, 0)]
+        for numero, quando in enumerate(horarios, start=1):
+            nota = NotaFiscal.objects.create(
+                empresa=self.empresa, numero=numero, serie=2, valor_total='10.00',
+                ambiente='homologacao', status='AUTORIZADA',
+            )
+            nota.data_emissao = timezone.make_aware(quando)
+            NotaFiscal.objects.filter(id=nota.id).update(data_emissao=nota.data_emissao)
+            registrar_venda(nota)
+
+    def _serie(self, **params):
+        resp = self.client.get(reverse('api_serie_vendas'), params)
+        self.assertEqual(resp.status_code, 200)
+        return [(p['periodo'], p['quantidade'], p['valor']) for p in resp.json()['serie']]
+
+    def test_agrupa_por_hora_no_fuso_da_loja(self):
+        serie = self._serie(granularidade='hora', data_inicio='2024-06-01', data_fim='2024-06-01')
+        self.assertEqual(serie, [
+            ('2024-06-01T09:00:00-03:00', 2, 20.0),
+            ('2024-06-01T22:00:00-03:00', 1, 10.0),
+        ])
+
+    def test_agrupa_por_dia_e_mes(self):
+        self.assertEqual(
+            self._serie(granularidade='dia', data_inicio='2024-06-01', data_fim='2024-06-30'),
+            [('2024-06-01', 3, 30.0), ('2024-06-02', 1, 10.0)],
+        )
+        self.assertEqual(
+            self._serie(granularidade='mes', data_inicio='2024-01-01', data_fim='2024-12-31'),
+            [('2024-06-01', 4, 40.0), ('2024-07-01', 1, 10.0)],
+        )
+
+    def test_cache_invalidado_por_nova_venda(self):
+        from core.vendas_diarias import registrar_venda
+        params = {'granularidade': 'dia', 'data_inicio': '2024-07-01', 'data_fim': '2024-07-31'}
+        self.assertEqual(self._serie(**params), [('2024-07-03', 1, 10.0)])
+
+        with self.assertNumQueries(5):  # sessão, usuário, perfil, empresa e versão; a série vem do cache
+            self.client.get(reverse('api_serie_vendas'), params)
+
+        # A versão fica no banco: a venda não precisa alcançar o cache de cada processo
+        nota = NotaFiscal.objects.filter(empresa=self.empresa, numero=5).get()
+        with patch('core.relatorios.cache.set') as mock_set, patch('core.relatorios.cache.incr') as mock_incr:
+            registrar_venda(nota)
+        mock_set.assert_not_called()
+        mock_incr.assert_not_called()
+        self.assertEqual(self._serie(**params), [('2024-07-03', 2, 20.0)])
+
+    def test_doze_meses_comecam_no_dia_1(self):
+        from datetime import datetime
+        from django.utils import timezone
+        from core.vendas_diarias import registrar_venda
+        for numero, quando in ((10, datetime(2023, 7, 31, 12, 0)), (11, datetime(2023, 8, 1, 12, 0))):
+            nota = NotaFiscal.objects.create(
+                empresa=self.empresa, numero=numero, serie=2, valor_total='10.00',
+                ambiente='homologacao', status='AUTORIZADA',
+            )
+            nota.data_emissao = timezone.make_aware(quando)
+            NotaFiscal.objects.filter(id=nota.id).update(data_emissao=nota.data_emissao)
+            registrar_venda(nota)
+
+        self.assertEqual(self._serie(granularidade='mes', data_fim='2024-07-15'), [
+            ('2023-08-01', 1, 10.0), ('2024-06-01', 4, 40.0), ('2024-07-01', 1, 10.0),
+        ])
+
+    def test_granularidade_invalida(self):
+        resp = self.client.get(reverse('api_serie_vendas'), {'granularidade': 'semana'})
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn('error', resp.json())
+
+
+# ─────────────────────────────────────────────
+# 15. Ranking de produtos e curva ABC
+# ─────────────────────────────────────────────
+
+class RankingProdutosTest(TestCase):
+
+    def setUp(self):
+        from estoque.models import Produto
+        self.empresa = _empresa()
+        self.client.force_login(_usuario('gerente', self.empresa))
+        self.produtos = [
+            Produto.objects.create(empresa=self.empresa, nome=nome, codigo=str(i), preco='1.00', ncm='00000000')
+            for i, nome in enumerate(['Cimento', 'Areia', 'Prego', 'Arame'], start=1)
+        ]
+
+    def _emitir(self, *vendas):
+        """vendas: (indice do produto, quantidade, valor_total)."""
+        itens = [
+            {'id': self.produtos[i].id, 'nome': self.produtos[i].nome, 'quantidade': qtd,
+             'preco_unitario': valor / qtd, 'valor_total': valor}
+            for i, qtd, valor in vendas
+        ]
+        total = sum(v for _, _, v in vendas)
+        with patch('core.fiscal_router.FiscalRouter.emitir_nfce',
+                   return_value=(True, {'id': 'nfc', 'numero': 1, 'serie': 2, 'chave': 'a' * 44}, total)):
+            self.client.post(reverse('emitir_nota'), data=json.dumps({'itens': itens, 'forma_pagamento': '01'}),
+                             content_type='application/json')
+        return NotaFiscal.objects.order_by('-id').first()
+
+    def test_emissao_alimenta_ranking_e_curva_abc(self):
+        from core.relatorios import ranking_produtos
+        self._emitir((0, 10, 700.0), (1, 2, 150.0))
+        self._emitir((0, 1, 70.0), (2, 5, 50.0), (3, 1, 30.0))
+
+        ranking = ranking_produtos(self.empresa)
+        self.assertEqual(
+            [(l['descricao'], l['quantidade'], l['valor'], l['notas'], l['classe']) for l in ranking],
+            # acumulado antes de cada produto: 0%, 77%, 92%, 97%
+            [('Cimento', Decimal('11'), Decimal('770.00'), 2, 'A'),
+             ('Areia', Decimal('2'), Decimal('150.00'), 1, 'A'),
+             ('Prego', Decimal('5'), Decimal('50.00'), 1, 'B'),
+             ('Arame', Decimal('1'), Decimal('30.00'), 1, 'C')],
+        )
+
+    def test_cancelamento_retira_itens_e_reconstrucao_confere(self):
+        from core.relatorios import ranking_produtos
+        from core.vendas_diarias import estornar_venda, reconstruir_vendas_produtos
+        self._emitir((0, 1, 10.0))
+        nota = self._emitir((0, 2, 20.0), (1, 1, 5.0))
+        nota.status = 'cancelado'
+        nota.save()
+        estornar_venda(nota)
+
+        incremental = ranking_produtos(self.empresa)
+        self.assertEqual([(l['descricao'], l['valor']) for l in incremental], [('Cimento', Decimal('10.00'))])
+        reconstruir_vendas_produtos(self.empresa)
+        self.assertEqual(ranking_produtos(self.empresa), incremental)
+
+    def test_primeira_venda_simultanea_nao_duplica_o_produto(self):
+        from django.db.models import QuerySet
+        from core.models import VendaProdutoDiaria
+        from core.relatorios import ranking_produtos
+
+        self._emitir((0, 1, 10.0))
+        # A outra transação criou a linha do produto entre o UPDATE (0 linhas) e o INSERT desta
+        update = QuerySet.update
+
+        def update_atrasado(queryset, **campos):
+            if queryset.model is VendaProdutoDiaria and not getattr(update_atrasado, 'atrasou', False):
+                update_atrasado.atrasou = True
+                return 0
+            return update(queryset, **campos)
+
+        with patch.object(QuerySet, 'update', update_atrasado):
+            self._emitir((0, 2, 20.0))
+
+        self.assertEqual(VendaProdutoDiaria.objects.filter(empresa=self.empresa).count(), 1)
+        self.assertEqual([(l['quantidade'], l['valor'], l['notas']) for l in ranking_produtos(self.empresa)],
+                         [(Decimal('3'), Decimal('30.00'), 2)])
+
+    def test_pagina_limita_ao_top_n(self):
+        self._emitir((0, 1, 30.0), (1, 1, 20.0), (2, 1, 10.0))
+        resp = self.client.get(reverse('relatorio_produtos'), {'top': 2})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([l['descricao'] for l in resp.context['ranking']], ['Cimento', 'Areia'])
+        self.assertEqual(resp.context['total_produtos'], 3)
+
+
+# ─────────────────────────────────────────────
+# 16. Exportação de notas em CSV/XLSX
+# ─────────────────────────────────────────────
+
+class ExportarNotasTest(TestCase):
+
+    def setUp(self):
+        from core.models import Cliente
+        self.empresa = _empresa()
+        self.client.force_login(_usuario('contador', self.empresa))
+        cliente = Cliente.objects.create(empresa=self.empresa, nome='Ana & Filhos', cpf_cnpj='12345678909')
+        NotaFiscal.objects.create(
+            empresa=self.empresa, numero=1, serie=2, valor_total='10.50', chave='1' * 44,
+            ambiente='homologacao', forma_pagamento='01', status='AUTORIZADA',
+        )
+        NotaFiscal.objects.create(
+            empresa=self.empresa, numero=2, serie=2, valor_total='99.90', cliente=cliente,
+            ambiente='homologacao', forma_pagamento='17', status='AUTORIZADA',
+        )
+
+    def _baixar(self, **params):
+        resp = self.client.get(reverse('exportar_notas'), params)
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        return resp, b''.join(resp.streaming_content)
+
+    def test_csv_com_filtros_de_listar_notas(self):
+        resp, conteudo = self._baixar(pagamento='17')
+        self.assertIn('text/csv', resp['Content-Type'])
+        linhas = conteudo.decode('utf-8-sig').splitlines()
+        self.assertEqual(linhas[0], 'Número;Série;Chave;Data;Cliente;Forma de Pagamento;Valor;Status')
+        self.assertEqual(len(linhas), 2)
+        self.assertTrue(linhas[1].startswith('2;2;;'))
+        self.assertTrue(linhas[1].endswith(';Ana & Filhos;PIX;99,90;AUTORIZADA'))
+
+    def test_xlsx_valido_e_em_ordem_da_listagem(self):
+        from lxml import etree
+        _, conteudo = self._baixar(formato='xlsx')
+        with zipfile.ZipFile(io.BytesIO(conteudo)) as zf:
+            self.assertIn('xl/workbook.xml', zf.namelist())
+            planilha = etree.fromstring(zf.read('xl/worksheets/sheet1.xml'))
+
+        ns = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        linhas = [
+            [''.join(c.itertext()) for c in row.findall('s:c', ns)]
+            for row in planilha.iterfind('.//s:row', ns)
+        ]
+        self.assertEqual(len(linhas), 3)
+        self.assertEqual(linhas[1][:2], ['2', '2'])
+        self.assertEqual(linhas[1][4], 'Ana & Filhos')
+        self.assertEqual(linhas[2][6], '10.50')
+
+
+# ─────────────────────────────────────────────
+# 17. Pacote mensal de XMLs para o contador
+# ─────────────────────────────────────────────
+
+class XmlContadorTest(TestCase):
+
+    def setUp(self):
+        from datetime import datetime
+        from django.utils import timezone
+        self.empresa = _empresa()
+        self.user = _usuario('contador', self.empresa, is_staff=True)
+        self.client.force_login(self.user)
+
+        def nota(numero, status, quando, **campos):
+            n = NotaFiscal.objects.create(
+                empresa=self.empresa, numero=numero, serie=2, valor_total='10.00',
+                chave=str(numero) * 44, ambiente='homologacao', status=status, **campos,
+            )
+            NotaFiscal.objects.filter(id=n.id).update(data_emissao=timezone.make_aware(quando))
+            return n
+
+        nota(1, 'AUTORIZADA', datetime(2024, 6, 1, 8, 0), xml_assinado='<nfeProc>1</nfeProc>')
+        nota(2, 'cancelado', datetime(2024, 6, 30, 23, 59), xml_assinado='<nfeProc>2</nfeProc>',
+             xml_cancelamento='<procEventoNFe>2</procEventoNFe>')
+        nota(3, 'AUTORIZADA', datetime(2024, 6, 15, 12, 0), id_nota='nfc_3')
+        nota(4, 'AUTORIZADA', datetime(2024, 7, 1, 0, 0), xml_assinado='<nfeProc>4</nfeProc>')
+
+    def _zip(self, resp):
+        self.assertEqual(resp.status_code, 200)
+        return zipfile.ZipFile(io.BytesIO(b''.join(resp.streaming_content)))
+
+    @patch('core.services.NuvemFiscalService.baixar_xml', return_value=('<nfeProc>3</nfeProc>', None))
+    def test_zip_do_mes_com_cancelamento_nuvem_e_manifesto(self, mock_baixar):
+        zf = self._zip(self.client.get(reverse('exportar_xmls_mes'), {'mes': '2024-06'}))
+        self.assertEqual(sorted(zf.namelist()), [
+            'autorizadas/' + '1' * 44 + '-nfce.xml',
+            'autorizadas/' + '2' * 44 + '-nfce.xml',
+            'autorizadas/' + '3' * 44 + '-nfce.xml',
+            'canceladas/' + '2' * 44 + '-procEventoNFe.xml',
+            'manifesto.txt',
+        ])
+        manifesto = zf.read('manifesto.txt').decode()
+        self.assertRegex(manifesto, r'AUTORIZADA\s+2\s+20.00')
+        self.assertRegex(manifesto, r'TOTAL\s+3\s+30.00')
+
+        # XML baixado fica gravado: o próximo pacote não chama a API de novo
+        self.assertTrue(NotaFiscal.objects.filter(numero=3, xml_assinado__isnull=False).exists())
+        self._zip(self.client.get(reverse('exportar_xmls_mes'), {'mes': '2024-06'}))
+        self.assertEqual(mock_baixar.call_count, 1)
+
+    @patch('core.services.NuvemFiscalService.baixar_xml', return_value=(None, 'Erro API (404)'))
+    def test_nota_sem_xml_aparece_no_manifesto(self, _):
+        zf = self._zip(self.client.get(reverse('exportar_xmls_mes'), {'mes': '2024-06'}))
+        self.assertIn('Notas sem XML (1)', zf.read('manifesto.txt').decode())
+
+    @override_settings(XML_CONTADOR_DOWNLOADS_NA_REQUISICAO=0)
+    @patch('core.services.NuvemFiscalService.baixar_xml')
+    def test_view_limita_downloads_antes_do_zip(self, mock_baixar):
+        zf = self._zip(self.client.get(reverse('exportar_xmls_mes'), {'mes': '2024-06'}))
+        mock_baixar.assert_not_called()
+        self.assertIn('Notas sem XML (1)', zf.read('manifesto.txt').decode())
+
+    @patch('core.db_router._em_transacao', return_value=False)
+    @patch('core.db_router.replica_configurada', return_value=True)
+    @patch('core.services.NuvemFiscalService.baixar_xml', return_value=('<nfeProc>3</nfeProc>', None))
+    def test_xml_baixado_e_lido_no_principal(self, *_):
+        from core.db_router import _ler_da_replica
+        from core.xml_contador import gerar_zip_xmls_mes
+        # Com as leituras na réplica (que nem existe aqui), o pacote ainda lê do principal
+        token = _ler_da_replica.set(True)
+        try:
+            dados = b''.join(gerar_zip_xmls_mes(self.empresa, 2024, 6))
+        finally:
+            _ler_da_replica.reset(token)
+        zf = zipfile.ZipFile(io.BytesIO(dados))
+        self.assertEqual(zf.read('autorizadas/' + '3' * 44 + '-nfce.xml'), b'<nfeProc>3</nfeProc>')
+
+    def test_restrito_a_staff_e_mes_valido(self):
+        self.assertEqual(self.client.get(reverse('exportar_xmls_mes'), {'mes': '2024-13'}).status_code, 400)
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('exportar_xmls_mes'), {'mes': '2024-06'}).status_code, 403)
+
+
+# ─────────────────────────────────────────────
+# 18. Roteamento de leituras para a réplica
+# ─────────────────────────────────────────────
+
+@patch('core.db_router._em_transacao', return_value=False)
+@patch('core.db_router.replica_configurada', return_value=True)
+class ReplicaRouterTest(TestCase):
+
+    def setUp(self):
+        from django.contrib.sessions.backends.db import SessionStore
+        from django.test import RequestFactory
+        self.request = RequestFactory().get('/')
+        self.request.session = SessionStore()
+        self.empresa = _empresa()
+
+    def _banco_na_view(self, resposta=None):
+        from django.db import router
+        from core.db_router import leitura_em_replica
+        visto = {}
+
+        @leitura_em_replica
+        def view(request):
+            visto['db'] = router.db_for_read(NotaFiscal)
+            return resposta or HttpResponse()
+
+        return view(self.request), visto
+
+    def test_view_de_relatorio_le_da_replica_e_escreve_no_principal(self, *_):
+        from django.db import router
+        _, visto = self._banco_na_view()
+        self.assertEqual(visto['db'], 'replica')
+        self.assertEqual(router.db_for_read(NotaFiscal), 'default')  # fora da view: principal
+
+        nota = NotaFiscal(empresa=self.empresa, valor_total='1.00')
+        nota._state.db = 'replica'
+        self.assertEqual(router.db_for_write(NotaFiscal, instance=nota), 'default')
+
+    def test_leitura_fica_no_principal_logo_apos_escrita_da_sessao(self, *_):
+        from core.db_router import ReplicaMiddleware
+
+        def grava(request):
+            NotaFiscal.objects.create(empresa=self.empresa, valor_total='1.00')
+            return HttpResponse()
+
+        ReplicaMiddleware(grava)(self.request)
+        _, visto = self._banco_na_view()
+        self.assertEqual(visto['db'], 'default')
+
+        with override_settings(REPLICA_LAG_TOLERANCE=0):
+            _, visto = self._banco_na_view()
+        self.assertEqual(visto['db'], 'replica')
+
+    def test_streaming_continua_na_replica(self, *_):
+        from django.db import router
+        from django.http import StreamingHttpResponse
+
+        def conteudo():
+            yield router.db_for_read(NotaFiscal).encode()
+
+        resp, _ = self._banco_na_view(StreamingHttpResponse(conteudo()))
+        self.assertEqual(b''.join(resp.streaming_content), b'replica')
+
+
+class ReplicaSqliteTest(TransactionTestCase):
+    """
+    Réplica de verdade: um segundo SQLite com a cópia do principal tirada no
+    setUp. O que é gravado depois só existe no principal, como numa réplica
+    atrasada, então o banco que respondeu aparece no resultado.
+    TransactionTestCase: dentro do atomic() do TestCase o roteador nunca usaria a réplica.
+    """
+    @classmethod
+    def setUpClass(cls):
+        from django.conf import settings
+        from django.db import connections
+        super().setUpClass()
+        # Só depois do super(): o test runner e as travas de bancos do TestCase não conhecem o alias
+        arquivo = tempfile.NamedTemporaryFile(suffix='.sqlite3', delete=False)
+        arquivo.close()
+        cls.arquivo_replica = arquivo.name
+        config = {**connections['default'].settings_dict, 'NAME': arquivo.name}
+        cls.bancos_patchers = [patch.dict(bancos, {'replica': config}) for bancos in (settings.DATABASES, connections.settings)]
+        for patcher in cls.bancos_patchers:
+            patcher.start()
+        cls.databases = {*cls.databases, 'replica'}
+
+    @classmethod
+    def tearDownClass(cls):
+        from django.db import connections
+        connections['replica'].close()
+        del connections['replica']
+        for patcher in reversed(cls.bancos_patchers):
+            patcher.stop()
+        os.remove(cls.arquivo_replica)
+        cls.databases = cls.databases - {'replica'}
+        super().tearDownClass()
+
+    def setUp(self):
+        from django.db import connections
+        self.empresa = _empresa()
+        self.client.force_login(_usuario('gerente', self.empresa))
+        NotaFiscal.objects.create(empresa=self.empresa, numero=1, serie=2, valor_total='10.00', status='AUTORIZADA')
+
+        # "Replicação": cópia do principal neste instante
+        for alias in ('default', 'replica'):
+            connections[alias].ensure_connection()
+        connections['default'].connection.backup(connections['replica'].connection)
+
+        # Ainda não replicada
+        NotaFiscal.objects.create(empresa=self.empresa, numero=2, serie=2, valor_total='20.00', status='AUTORIZADA')
+
+    def _numeros(self):
+        return sorted(NotaFiscal.objects.values_list('numero', flat=True))
+
+    def _view(self, funcao):
+        from core.db_router import leitura_em_replica
+        return leitura_em_replica(lambda request: funcao())(self.client.request().wsgi_request)
+
+    def test_view_marcada_le_da_replica_fora_de_transacao(self):
+        from django.db import transaction
+        self.assertEqual(self._numeros(), [1, 2])
+        self.assertEqual(self._view(self._numeros), [1])
+
+        def em_transacao():
+            with transaction.atomic():
+                return self._numeros()
+
+        self.assertEqual(self._view(em_transacao), [1, 2])
+
+    def test_escrita_na_view_marcada_vai_para_o_principal(self):
+        def grava():
+            NotaFiscal.objects.create(empresa=self.empresa, numero=3, serie=2, valor_total='1.00')
+            return self._numeros()
+
+        self.assertEqual(self._view(grava), [1])
+        self.assertEqual(self._numeros(), [1, 2, 3])
+
+    def test_exportacao_em_streaming_le_da_replica(self):
+        resp = self.client.get(reverse('exportar_notas'))
+        linhas = b''.join(resp.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual([linha.split(';')[0] for linha in linhas[1:]], ['1'])
+
+    def test_listagem_le_da_replica_e_volta_ao_principal_apos_escrita(self):
+        import time
+        from core.db_router import _CHAVE_SESSAO
+        resp = self.client.get(reverse('listar_notas'))
+        self.assertEqual([n.numero for n in resp.context['notas']], [1])
+
+        # Sessão que acabou de gravar lê do principal
+        sessao = self.client.session
+        sessao[_CHAVE_SESSAO] = time.time()
+        sessao.save()
+        resp = self.client.get(reverse('listar_notas'))
+        self.assertEqual(sorted(n.numero for n in resp.context['notas']), [1, 2])
+
+
+# ─────────────────────────────────────────────
+# 19. Particionamento mensal de notas (PostgreSQL)
+# ─────────────────────────────────────────────
+
+class ParticionamentoNotasTest(TestCase):
+
+    def test_particao_cobre_o_mes_no_fuso_da_loja(self):
+        from core.particionamento import sql_criar_particao
+        sql = sql_criar_particao(2025, 12)
+        self.assertIn('"core_notafiscal_p202512" PARTITION OF "core_notafiscal"', sql)
+        self.assertIn("FROM ('2025-12-01T00:00:00-03:00') TO ('2026-01-01T00:00:00-03:00')", sql)
+
+    def test_sqlite_segue_sem_particionar(self):
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        with self.assertRaisesMessage(CommandError, 'apenas no PostgreSQL'):
+            call_command('particionar_notas', stdout=io.StringIO())
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Particionamento só existe no PostgreSQL')
+class ParticionamentoPostgresTest(TestCase):
+    """Conversão de verdade; o DDL do Postgres é transacional e é desfeito no fim de cada teste."""
+
+    def setUp(self):
+        from datetime import datetime
+        from django.utils import timezone
+        self.empresa = _empresa()
+        self.notas = {}
+        for numero, quando in ((1, datetime(2024, 5, 31, 23, 30)), (2, datetime(2024, 6, 1, 0, 30))):
+            nota = NotaFiscal.objects.create(empresa=self.empresa, numero=numero, serie=2, valor_total='10.00')
+            NotaFiscal.objects.filter(id=nota.id).update(data_emissao=timezone.make_aware(quando))
+            self.notas[numero] = nota.id
+
+    def test_converte_copia_notas_e_recria_indices(self):
+        from django.core.management import call_command
+        from core import particionamento
+        saida = io.StringIO()
+        call_command('particionar_notas', converter=True, meses=1, stdout=saida)
+        self.assertIn('a partir de 05/2024', saida.getvalue())
+        self.assertTrue(particionamento.tabela_particionada())
+
+        with connection.cursor() as cursor:
+            self.assertTrue({'core_notafiscal_p202405', 'core_notafiscal_p202406'}
+                            <= particionamento._particoes_existentes(cursor))
+            cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = 'core_notafiscal'")
+            self.assertIn('nota_periodo_idx', {nome for (nome,) in cursor.fetchall()})
+
+        self.assertEqual(
+            sorted(NotaFiscal.objects.values_list('id', flat=True)), sorted(self.notas.values()),
+        )
+        nova = NotaFiscal.objects.create(empresa=self.empresa, numero=3, serie=2, valor_total='1.00')
+        self.assertGreater(nova.id, max(self.notas.values()))
+
+        # Mês desanexado sai das consultas
+        particionamento.desanexar_particao(2024, 5)
+        self.assertFalse(NotaFiscal.objects.filter(id=self.notas[1]).exists())
+        self.assertTrue(NotaFiscal.objects.filter(id=self.notas[2]).exists())
+
+    def test_mes_com_notas_na_particao_padrao(self):
+        from datetime import date, datetime
+        from django.core.management import call_command
+        from django.utils import timezone
+        from core import particionamento
+        particionamento.converter_tabela(meses_a_frente=1)
+
+        # Cron atrasado: nota de um mês ainda sem partição cai na padrão
+        hoje = timezone.localdate()
+        ano, mes = particionamento._avancar(hoje.year, hoje.month, 3)
+        nota = NotaFiscal.objects.create(empresa=self.empresa, numero=9, serie=2, valor_total='1.00')
+        NotaFiscal.objects.filter(id=nota.id).update(data_emissao=timezone.make_aware(datetime(ano, mes, 10)))
+
+        saida = io.StringIO()
+        call_command('particionar_notas', meses=3, stdout=saida)
+        self.assertIn(f'{particionamento._nome_particao(ano, mes)} (1 nota(s) movida(s)', saida.getvalue())
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT tableoid::regclass::text FROM core_notafiscal WHERE id = %s', [nota.id])
+            self.assertEqual(cursor.fetchone()[0], particionamento._nome_particao(ano, mes))
+            self.assertIn(particionamento.PARTICAO_PADRAO, particionamento._particoes_existentes(cursor))
+        self.assertEqual(NotaFiscal.objects.get(id=nota.id).data_emissao.date(), date(ano, mes, 10))
+
+    def test_unico_com_data_emissao_e_recriado(self):
+        from core import particionamento
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'ALTER TABLE core_notafiscal ADD CONSTRAINT nota_chave_data_unica UNIQUE (chave, data_emissao)'
+            )
+        particionamento.converter_tabela(meses_a_frente=1)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM pg_constraint WHERE conname = 'nota_chave_data_unica' "
+                "AND conrelid = 'core_notafiscal'::regclass"
+            )
+            self.assertIsNotNone(cursor.fetchone())
+
+    def test_unico_sem_data_emissao_impede_conversao(self):
+        from core import particionamento
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE UNIQUE INDEX nota_chave_unica ON core_notafiscal (chave)')
+        with self.assertRaisesMessage(ValueError, 'nota_chave_unica'):
+            particionamento.converter_tabela(meses_a_frente=1)
+        self.assertFalse(particionamento.tabela_particionada())
+
+
+# ─────────────────────────────────────────────
+# 20. Arquivo de XMLs antigos
+# ─────────────────────────────────────────────
+
+class ArquivoXmlTest(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        storages = {
+            'arquivo_xml': {
+                'BACKEND': 'django.core.files.storage.FileSystemStorage',
+                'OPTIONS': {'location': self.dir.name},
+            },
+        }
+        self.settings_override = override_settings(STORAGES=storages, XML_ARQUIVO_DIR=self.dir.name)
+        self.settings_override.enable()
+        self.empresa = _empresa()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.dir.cleanup()
+
+    def _nota(self, numero, dias_atras):
+        from datetime import timedelta
+        from django.utils import timezone
+        nota = NotaFiscal.objects.create(
+            empresa=self.empresa, numero=numero, serie=2, valor_total='10.00',
+            status='AUTORIZADA', ambiente='homologacao', xml_assinado=_XML_NFCE,
+        )
+        NotaFiscal.objects.filter(id=nota.id).update(data_emissao=timezone.now() - timedelta(days=dias_atras))
+        return nota
+
+    def test_arquiva_notas_antigas_e_le_de_forma_transparente(self):
+        from django.core.management import call_command
+        antiga, outra_antiga, recente = self._nota(1, 400), self._nota(2, 365), self._nota(3, 5)
+
+        call_command('arquivar_xmls', dias=180, stdout=io.StringIO())
+
+        colunas = dict(NotaFiscal.objects.com_xml().values_list('id', 'xml_assinado'))
+        self.assertIsNone(colunas[antiga.id])
+        self.assertIsNone(colunas[outra_antiga.id])
+        self.assertEqual(colunas[recente.id], _XML_NFCE)
+
+        nota = NotaFiscal.objects.get(id=antiga.id)
+        self.assertEqual(len(nota.xml_assinado_arquivo), 64)
+        self.assertEqual(nota.xml_assinado, _XML_NFCE)
+        # Mesmo conteúdo, um único arquivo
+        self.assertEqual(nota.xml_assinado_arquivo, NotaFiscal.objects.get(id=outra_antiga.id).xml_assinado_arquivo)
+        self.assertEqual(sum(len(arquivos) for _, _, arquivos in os.walk(self.dir.name)), 1)
+
+        # Salvar a nota depois de ler o XML não o devolve ao banco
+        nota.status = 'CANCELADA'
+        nota.save()
+        self.assertIsNone(NotaFiscal.objects.com_xml().values_list('xml_assinado', flat=True).get(id=antiga.id))
+
+    def test_danfe_de_nota_arquivada(self):
+        from core.arquivo_xml import arquivar_xmls
+        from core.danfe import gerar_danfe_nfce
+        nota = self._nota(1, 400)
+        self.assertEqual(arquivar_xmls(dias=180), 1)
+        self.assertTrue(gerar_danfe_nfce(NotaFiscal.objects.get(id=nota.id)).startswith(b'%PDF'))
+
+    def test_recusa_arquivar_sem_destino_configurado(self):
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        self._nota(1, 400)
+        with override_settings(XML_ARQUIVO_DIR=''), self.assertRaises(CommandError):
+            call_command('arquivar_xmls', dias=180, stdout=io.StringIO())
+        self.assertEqual(NotaFiscal.objects.filter(xml_assinado_arquivo__isnull=False).count(), 0)
+
+    def test_arquivo_ausente_vira_nota_sem_xml(self):
+        import shutil
+        from core.arquivo_xml import arquivar_xmls
+        nota = self._nota(1, 400)
+        arquivar_xmls(dias=180)
+        shutil.rmtree(self.dir.name)
+
+        with self.assertLogs('core.fields', level='ERROR'):
+            self.assertIsNone(NotaFiscal.objects.get(id=nota.id).xml_assinado)
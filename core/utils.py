@@ -1,6 +1,48 @@
 import random
+from datetime import datetime, time, timedelta
 from typing import List, Tuple, Dict, Any
 
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+
+def inicio_do_dia(data, dias=0):
+    """
+    Converte 'AAAA-MM-DD' (ou date) no datetime aware de 00:00 daquele dia
+    (+ `dias`) no fuso atual. Datas vazias ou inválidas são ignoradas (None).
+    """
+    if not data:
+        return None
+    if isinstance(data, str):
+        try:
+            data = parse_date(data)
+        except ValueError:
+            return None
+        if data is None:
+            return None
+    dia = datetime.combine(data + timedelta(days=dias), time.min)
+    return timezone.make_aware(dia, timezone.get_current_timezone())
+
+
+class BufferZip:
+    """Destino não-posicionável para o zipfile: acumula bytes até serem drenados."""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def drenar(self):
+        dados = b"".join(self._partes)
+        self._partes.clear()
+        return dados
+
+
 def simular_carrinho_inteligente(valor_alvo: float, produtos_disponiveis: List[Any]) -> Tuple[List[Dict[str, Any]], float]:
     """
     Gera uma lista aleatória de produtos cujo valor total se aproxima de um valor alvo.
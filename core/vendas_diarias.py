@@ -0,0 +1,191 @@
+"""
+Manutenção dos resumos diários de vendas (VendaDiaria e VendaProdutoDiaria).
+
+Cada nota autorizada soma 1 nota e o seu valor na linha
+(empresa, ambiente, dia, forma_pagamento, cliente) e, para cada produto dos
+seus itens, quantidade e faturamento em (empresa, ambiente, dia, produto);
+o cancelamento desfaz as somas. As funções devem ser chamadas dentro da mesma transação que grava a
+nota, para que o resumo nunca diverja das notas.
+
+Funções principais:
+    registrar_venda(nota_fiscal)
+    estornar_venda(nota_fiscal)
+    reconstruir_vendas_diarias(empresa=None) -> int
+    reconstruir_vendas_produtos(empresa=None) -> int
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import NotaFiscal, NotaFiscalItem, VendaDiaria, VendaProdutoDiaria
+from .relatorios import invalidar_series_vendas
+
+
+def nota_cancelada(nota_fiscal):
+    """O status de cancelamento varia entre emissores ('cancelado', 'CANCELADA')."""
+    return (nota_fiscal.status or "").lower().startswith("cancel")
+
+
+def _acumular(modelo, chave, sinal, extras=None, **somas):
+    """
+    Soma (sinal=1) ou subtrai (sinal=-1) `somas` na linha `chave` do resumo.
+
+    UPDATE com F() é atômico. Se a linha ainda não existe, cria zerada com
+    INSERT ... ON CONFLICT DO NOTHING e soma nela: a restrição única do
+    modelo faz a transação concorrente que perder o INSERT esperar e somar
+    na mesma linha, então cada chave tem uma linha só.
+    """
+    somas = {campo: valor * sinal for campo, valor in somas.items()}
+    incrementos = {campo: F(campo) + valor for campo, valor in somas.items()}
+    linhas = modelo.objects.filter(**chave)
+    if not linhas.update(**incrementos):
+        modelo.objects.bulk_create([modelo(**chave, **(extras or {}))], ignore_conflicts=True)
+        linhas.update(**incrementos)
+    if sinal < 0:
+        # Linha zerada pelo estorno: remove, como se a venda nunca tivesse entrado
+        linhas.filter(**{campo: 0 for campo in somas}).delete()
+
+
+def _somar(nota_fiscal, sinal, itens=None):
+    data = nota_fiscal.data_emissao or timezone.now()
+    base = {
+        "empresa_id": nota_fiscal.empresa_id,
+        "ambiente": nota_fiscal.ambiente,
+        "dia": timezone.localdate(data),
+    }
+
+    # valor_total pode ainda ser float na instância recém-criada pela view
+    _acumular(
+        VendaDiaria,
+        {**base, "forma_pagamento": nota_fiscal.forma_pagamento, "cliente_id": nota_fiscal.cliente_id},
+        sinal,
+        quantidade_notas=1,
+        valor_total=Decimal(str(nota_fiscal.valor_total)),
+    )
+
+    # Itens da nota agrupados por produto (o mesmo produto pode vir em mais de uma linha)
+    produtos = {}
+    for item in (nota_fiscal.itens.all() if itens is None else itens):
+        chave = (item.codigo, item.produto_id)
+        atual = produtos.setdefault(chave, {"descricao": item.descricao, "quantidade": 0, "valor_total": 0})
+        atual["quantidade"] += Decimal(str(item.quantidade))
+        atual["valor_total"] += Decimal(str(item.valor_total)) - Decimal(str(item.desconto or 0))
+
+    for (codigo, produto_id), soma in produtos.items():
+        _acumular(
+            VendaProdutoDiaria,
+            {**base, "codigo": codigo, "produto_id": produto_id},
+            sinal,
+            extras={"descricao": soma["descricao"]},
+            quantidade=soma["quantidade"],
+            valor_total=soma["valor_total"],
+            quantidade_notas=1,
+        )
+
+    # Nova versão das séries do dashboard, confirmada junto com o resumo
+    invalidar_series_vendas(nota_fiscal.empresa_id, nota_fiscal.ambiente)
+
+
+def registrar_venda(nota_fiscal, itens=None):
+    """
+    Soma uma nota autorizada (e seus itens) aos resumos do dia.
+    `itens` evita reler os NotaFiscalItem recém-criados; padrão nota.itens.
+    """
+    _somar(nota_fiscal, 1, itens)
+
+
+def estornar_venda(nota_fiscal):
+    """Retira uma nota cancelada (e seus itens) dos resumos do dia."""
+    _somar(nota_fiscal, -1)
+
+
+def reconstruir_vendas_diarias(empresa=None):
+    """
+    Apaga e recalcula o resumo a partir das notas (backfill/correção).
+    Faz um único GROUP BY no banco. Retorna a quantidade de linhas criadas.
+    """
+    notas = NotaFiscal.objects.exclude(status__istartswith="cancel")
+    resumo = VendaDiaria.objects.all()
+    if empresa is not None:
+        notas = notas.filter(empresa=empresa)
+        resumo = resumo.filter(empresa=empresa)
+
+    linhas = (
+        notas.order_by()
+        .annotate(dia=TruncDate("data_emissao", tzinfo=timezone.get_current_timezone()))
+        .values("empresa_id", "ambiente", "dia", "forma_pagamento", "cliente_id")
+        .annotate(quantidade_notas=Count("id"), soma=Sum("valor_total"))
+    )
+
+    with transaction.atomic():
+        afetados = set(resumo.values_list("empresa_id", "ambiente").distinct().order_by())
+        resumo.delete()
+        criadas = VendaDiaria.objects.bulk_create(
+            [
+                VendaDiaria(
+                    empresa_id=linha["empresa_id"],
+                    ambiente=linha["ambiente"],
+                    dia=linha["dia"],
+                    forma_pagamento=linha["forma_pagamento"],
+                    cliente_id=linha["cliente_id"],
+                    quantidade_notas=linha["quantidade_notas"],
+                    valor_total=linha["soma"] or 0,
+                )
+                for linha in linhas
+            ],
+            batch_size=1000,
+        )
+        afetados.update((venda.empresa_id, venda.ambiente) for venda in criadas)
+        for empresa_id, ambiente in afetados:
+            invalidar_series_vendas(empresa_id, ambiente)
+    return len(criadas)
+
+
+def reconstruir_vendas_produtos(empresa=None):
+    """
+    Apaga e recalcula o resumo por produto a partir de NotaFiscalItem.
+    Notas sem itens gravados (NuvemFiscal antigas) ficam de fora.
+    Retorna a quantidade de linhas criadas.
+    """
+    itens = NotaFiscalItem.objects.exclude(nota__status__istartswith="cancel")
+    resumo = VendaProdutoDiaria.objects.all()
+    if empresa is not None:
+        itens = itens.filter(nota__empresa=empresa)
+        resumo = resumo.filter(empresa=empresa)
+
+    linhas = (
+        itens.order_by()
+        .annotate(dia=TruncDate("nota__data_emissao", tzinfo=timezone.get_current_timezone()))
+        .values("nota__empresa_id", "nota__ambiente", "dia", "codigo", "produto_id")
+        .annotate(
+            soma_quantidade=Sum("quantidade"),
+            soma_valor=Sum(F("valor_total") - F("desconto")),
+            notas=Count("nota_id", distinct=True),
+            ultima_descricao=Max("descricao"),
+        )
+    )
+
+    with transaction.atomic():
+        resumo.delete()
+        criadas = VendaProdutoDiaria.objects.bulk_create(
+            [
+                VendaProdutoDiaria(
+                    empresa_id=linha["nota__empresa_id"],
+                    ambiente=linha["nota__ambiente"],
+                    dia=linha["dia"],
+                    codigo=linha["codigo"],
+                    produto_id=linha["produto_id"],
+                    descricao=linha["ultima_descricao"] or "",
+                    quantidade=linha["soma_quantidade"] or 0,
+                    valor_total=linha["soma_valor"] or 0,
+                    quantidade_notas=linha["notas"],
+                )
+                for linha in linhas
+            ],
+            batch_size=1000,
+        )
+    return len(criadas)
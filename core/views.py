@@ -1,18 +1,33 @@
 import json
+import logging
+from datetime import timedelta
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse, HttpResponse
+from django.template.loader import render_to_string
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Sum, Q
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 
 # Importações locais do projeto
-from .models import NotaFiscal, Empresa, Cliente
+from .models import NotaFiscal, NotaFiscalItem, Empresa, Cliente
 from .forms import ClienteForm, EmpresaConfigForm
 from estoque.models import Produto
+from estoque.busca import buscar
+from estoque.movimentos import baixar_estoque_venda
 from .utils import simular_carrinho_inteligente
 from .services import NuvemFiscalService
 from .fiscal_router import FiscalRouter
+from .relatorios import (
+    filtros_da_request, filtrar_notas, paginar_notas, ranking_produtos, serie_vendas, totais_vendas,
+)
+from .itens_nota import itens_do_carrinho, itens_do_xml, montar_itens_nota
+from .vendas_diarias import registrar_venda
+from .db_router import leitura_em_replica
+
+logger = logging.getLogger(__name__)
 
 
 # ==================================================
@@ -57,43 +72,48 @@ def emitir_nota_automatica(request):
     return render(request, 'emitir_auto.html')
 
 @login_required
+@leitura_em_replica
 def listar_notas(request):
     empresa = get_empresa_usuario(request)
     
     # Busca clientes para o filtro
     todos_clientes = Cliente.objects.filter(empresa=empresa).values('id', 'nome', 'apelido', 'cpf_cnpj').order_by('nome')
     
-    # --- AQUI ESTAVA O ERRO: Adicionamos o filtro de ambiente ---
-    notas = NotaFiscal.objects.filter(
-        empresa=empresa, 
-        ambiente=empresa.ambiente  # Garante que só apareçam notas do ambiente ativo
-    ).select_related('cliente').order_by('-numero', '-serie')
-
-    # --- LÓGICA DE FILTROS (Mantida igual) ---
-    data_inicio = request.GET.get('data_inicio')
-    data_fim = request.GET.get('data_fim')
-    filtro_clientes_ids = request.GET.getlist('clientes') 
-    filtro_pagamentos = request.GET.getlist('pagamento')
-
-    if data_inicio:
-        notas = notas.filter(data_emissao__date__gte=data_inicio)
-    if data_fim:
-        notas = notas.filter(data_emissao__date__lte=data_fim)
-
-    if filtro_clientes_ids:
-        notas = notas.filter(cliente__id__in=filtro_clientes_ids)
-
-    if filtro_pagamentos:
-        notas = notas.filter(forma_pagamento__in=filtro_pagamentos)
-        
-    # ... código anterior ...
-    totais = notas.aggregate(
-        total_dinheiro=Sum('valor_total', filter=Q(forma_pagamento='01')),
-        total_pix=Sum('valor_total', filter=Q(forma_pagamento='17')),
-        total_debito=Sum('valor_total', filter=Q(forma_pagamento='04')),
-        total_credito=Sum('valor_total', filter=Q(forma_pagamento='03')),
-        total_geral=Sum('valor_total')
-    )
+    # Filtros da querystring (compartilhados com as exportações)
+    filtros = filtros_da_request(request)
+    data_inicio = filtros['data_inicio']
+    data_fim = filtros['data_fim']
+    filtro_clientes_ids = filtros['clientes']
+    filtro_pagamentos = filtros['pagamentos']
+
+    # Só aparecem notas do ambiente ativo da empresa
+    notas = filtrar_notas(empresa, **filtros)
+
+    # Página atual por keyset (?cursor=numero.serie.id)
+    pagina, proximo_cursor = paginar_notas(notas.select_related('cliente'), request.GET.get('cursor'))
+
+    # Variante JSON: o "Carregar mais" da página busca as próximas notas por aqui
+    if request.GET.get('formato') == 'json':
+        return JsonResponse({
+            'notas': [
+                {
+                    'id': nota.id,
+                    'numero': nota.numero,
+                    'serie': nota.serie,
+                    'data_emissao': nota.data_emissao.isoformat() if nota.data_emissao else None,
+                    'cliente': (nota.cliente.apelido or nota.cliente.nome) if nota.cliente else None,
+                    'valor_total': str(nota.valor_total),
+                    'forma_pagamento': nota.forma_pagamento,
+                    'status': nota.status,
+                }
+                for nota in pagina
+            ],
+            'html': render_to_string('notas_linhas.html', {'notas': pagina}, request=request),
+            'proximo_cursor': proximo_cursor,
+        })
+
+    # Totais sobre todas as notas filtradas (não só a página), lidos do resumo diário
+    totais = totais_vendas(empresa, **filtros)
 
     # --- NOVO: Cálculo seguro das percentagens ---
     total_geral = totais['total_geral'] or 0
@@ -105,7 +125,8 @@ def listar_notas(request):
     }
 
     context = {
-        'notas': notas,
+        'notas': pagina,
+        'proximo_cursor': proximo_cursor,
         'todos_clientes': todos_clientes,
         'filtros': {
             'data_inicio': data_inicio,
@@ -118,10 +139,67 @@ def listar_notas(request):
     }
     return render(request, 'notas.html', context)
 
+@login_required
+@leitura_em_replica
+def relatorio_produtos(request):
+    """Ranking de produtos vendidos (top-N) e curva ABC do período."""
+    empresa = get_empresa_usuario(request)
+    if not empresa:
+        return redirect('home')
+
+    # Padrão: últimos 30 dias
+    hoje = timezone.localdate()
+    data_inicio = request.GET.get('data_inicio') or (hoje - timedelta(days=29)).isoformat()
+    data_fim = request.GET.get('data_fim') or hoje.isoformat()
+    try:
+        top = max(1, int(request.GET.get('top', 20)))
+    except ValueError:
+        top = 20
+
+    ranking = ranking_produtos(empresa, data_inicio, data_fim)
+
+    # Resumo da curva: quantos produtos e quanto do faturamento em cada classe
+    curva = {classe: {'produtos': 0, 'participacao': 0} for classe in ('A', 'B', 'C')}
+    for linha in ranking:
+        curva[linha['classe']]['produtos'] += 1
+        curva[linha['classe']]['participacao'] += linha['participacao']
+
+    context = {
+        'ranking': ranking[:top],
+        'curva': curva,
+        'total_produtos': len(ranking),
+        'total_valor': sum(linha['valor'] or 0 for linha in ranking),
+        'filtros': {'data_inicio': data_inicio, 'data_fim': data_fim, 'top': top},
+    }
+    return render(request, 'relatorio_produtos.html', context)
+
 # ==================================================
 # 2. VIEWS DE API (SERVIÇOS PARA O FRONTEND)
 # ==================================================
 
+@login_required
+@leitura_em_replica
+def api_serie_vendas(request):
+    """
+    Série de vendas do dashboard (home): quantidade e valor por período.
+    Parâmetros: granularidade=hora|dia|mes, data_inicio, data_fim (AAAA-MM-DD).
+    """
+    empresa = get_empresa_usuario(request)
+    if not empresa:
+        return JsonResponse({'error': 'Usuário sem empresa configurada'}, status=403)
+
+    granularidade = request.GET.get('granularidade', 'dia')
+    try:
+        serie = serie_vendas(
+            empresa, granularidade,
+            data_inicio=request.GET.get('data_inicio'),
+            data_fim=request.GET.get('data_fim'),
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse({'granularidade': granularidade, 'serie': serie})
+
 @login_required 
 def buscar_produtos(request):
     empresa = get_empresa_usuario(request)
@@ -146,15 +224,16 @@ def buscar_produtos(request):
     # 2. Modo Busca Manual (Autocomplete)
     termo = request.GET.get('q', '')
     if termo:
-        # FILTRAGEM: Busca produtos da empresa com nome parecido
-        prods = Produto.objects.filter(empresa=empresa, nome__icontains=termo)[:10]
+        # Código de barras exato ou busca indexada (nome ou código, sem acentos)
+        prods, exato = buscar(empresa, termo, limite=10)
         
         return JsonResponse([
             {
                 'id': p.id, 
                 'nome': p.nome, 
                 'preco_unitario': float(p.preco), 
-                'ncm': p.ncm
+                'ncm': p.ncm,
+                'exato': exato,
             } for p in prods
         ], safe=False)
         
@@ -167,27 +246,152 @@ def buscar_produtos(request):
 @login_required
 def imprimir_nota(request, nota_id):
     empresa = get_empresa_usuario(request)
-    nota = get_object_or_404(NotaFiscal, id=nota_id, empresa=empresa)
+    nota = get_object_or_404(NotaFiscal.objects.com_xml(), id=nota_id, empresa=empresa)
+
+    # Nota NuvemFiscal sem XML local: baixa e grava uma única vez.
+    if nota.id_nota and not nota.xml_assinado:
+        NuvemFiscalService.sincronizar_xml(nota)
 
-    # Nota SEFAZ direto: gera DANFE local a partir do XML autorizado.
-    if not nota.id_nota:
+    # Nota com XML autorizado (SEFAZ direto ou NuvemFiscal já sincronizada): DANFE local.
+    if not nota.id_nota or nota.xml_assinado:
         try:
-            from core.danfe import gerar_danfe_nfce
-            pdf_bytes = gerar_danfe_nfce(nota)
+            from core.danfe_cache import obter_danfe_pdf
+            pdf_bytes = obter_danfe_pdf(nota)
             response = HttpResponse(pdf_bytes, content_type='application/pdf')
             response['Content-Disposition'] = f'inline; filename="danfe_{nota.numero}.pdf"'
             return response
         except Exception as e:
             return JsonResponse({'error': f'Erro ao gerar DANFE: {str(e)}'}, status=500)
 
-    pdf_content, erro_msg = NuvemFiscalService.baixar_pdf(empresa, nota.id_nota, ambiente=nota.ambiente)
-    if pdf_content:
-        response = HttpResponse(pdf_content, content_type='application/pdf')
+    # Sem XML (API fora do ar, por ex.): repassa o PDF da NuvemFiscal em streaming.
+    fluxo_pdf, erro_msg = NuvemFiscalService.abrir_pdf(empresa, nota.id_nota, ambiente=nota.ambiente)
+    if fluxo_pdf is not None:
+        response = StreamingHttpResponse(fluxo_pdf, content_type='application/pdf')
         response['Content-Disposition'] = f'inline; filename="nota_{nota.numero}.pdf"'
         return response
     return JsonResponse({'error': f'Falha ao baixar PDF: {erro_msg}'}, status=400)
 
 
+@login_required
+def imprimir_nota_escpos(request, nota_id):
+    """
+    Variante de imprimir_nota para impressora térmica: devolve o DANFE em
+    bytes ESC/POS, para o agente de impressão local (ou WebUSB) enviar direto.
+    """
+    empresa = get_empresa_usuario(request)
+    nota = get_object_or_404(NotaFiscal.objects.com_xml(), id=nota_id, empresa=empresa)
+
+    if not nota.xml_assinado:
+        return JsonResponse({'error': 'Nota sem XML autorizado local; use a impressão em PDF.'}, status=400)
+
+    try:
+        from core.danfe_escpos import gerar_escpos_nfce
+        response = HttpResponse(gerar_escpos_nfce(nota), content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="danfe_{nota.numero}.bin"'
+        return response
+    except Exception as e:
+        return JsonResponse({'error': f'Erro ao gerar ESC/POS: {str(e)}'}, status=500)
+
+
+@login_required
+@leitura_em_replica
+def exportar_danfes(request):
+    """
+    Baixa os DANFEs das notas filtradas (mesmos filtros de listar_notas)
+    em um único ZIP, gerado e enviado em streaming.
+    """
+    empresa = get_empresa_usuario(request)
+    if not empresa:
+        return JsonResponse({'error': 'Usuário sem empresa configurada'}, status=403)
+
+    from core.danfe_lote import gerar_zip_danfes
+    notas = (
+        filtrar_notas(empresa, **filtros_da_request(request))
+        .com_xml()
+        .select_related('empresa', 'cliente')
+        .prefetch_related('itens')
+        .order_by('-numero', '-serie')
+    )
+
+    response = StreamingHttpResponse(gerar_zip_danfes(notas), content_type='application/zip')
+    response['Content-Disposition'] = 'attachment; filename="danfes.zip"'
+    return response
+
+
+@login_required
+@leitura_em_replica
+def exportar_notas(request):
+    """
+    Exporta as notas filtradas (mesmos filtros de listar_notas) em CSV ou
+    XLSX (?formato=xlsx), em streaming e com memória constante.
+    """
+    empresa = get_empresa_usuario(request)
+    if not empresa:
+        return JsonResponse({'error': 'Usuário sem empresa configurada'}, status=403)
+
+    from core.exportacao_notas import gerar_csv_notas, gerar_xlsx_notas
+    notas = filtrar_notas(empresa, **filtros_da_request(request))
+
+    if request.GET.get('formato') == 'xlsx':
+        response = StreamingHttpResponse(
+            gerar_xlsx_notas(notas),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+        response['Content-Disposition'] = 'attachment; filename="notas.xlsx"'
+    else:
+        response = StreamingHttpResponse(gerar_csv_notas(notas), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="notas.csv"'
+    return response
+
+
+@login_required
+def exportar_xmls_mes(request):
+    """
+    Pacote do contador: XMLs autorizados e de cancelamento do mês
+    (?mes=AAAA-MM) em um ZIP gerado em streaming, com manifesto. Restrito a is_staff.
+    Sem @leitura_em_replica: grava os XMLs baixados da NuvemFiscal e os lê em seguida.
+    """
+    empresa = get_empresa_usuario(request)
+    if not empresa:
+        return JsonResponse({'error': 'Usuário sem empresa configurada'}, status=403)
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Acesso restrito à administração'}, status=403)
+
+    try:
+        ano, mes = (int(parte) for parte in request.GET.get('mes', '').split('-'))
+        if not 1 <= mes <= 12:
+            raise ValueError
+    except ValueError:
+        return JsonResponse({'error': 'Informe o mês como AAAA-MM'}, status=400)
+
+    from core.xml_contador import gerar_zip_xmls_mes
+    conteudo = gerar_zip_xmls_mes(empresa, ano, mes, limite_downloads=settings.XML_CONTADOR_DOWNLOADS_NA_REQUISICAO)
+    response = StreamingHttpResponse(conteudo, content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="xmls_{empresa.cnpj}_{ano}{mes:02d}.zip"'
+    return response
+
+
+def _registrar_itens_e_vendas(nota, itens_carrinho):
+    """
+    Itens estruturados, resumos diários e baixa de estoque da nota recém-gravada,
+    numa transação própria. Uma falha aqui é registrada no log e não afeta a nota:
+    itens e resumos são refeitos por popular_itens_notas e reconstruir_vendas_diarias.
+    """
+    try:
+        with transaction.atomic():
+            # XML autorizado ou, na NuvemFiscal, o carrinho
+            linhas = itens_do_xml(nota.xml_assinado) or itens_do_carrinho(itens_carrinho)
+            itens_nota = NotaFiscalItem.objects.bulk_create(montar_itens_nota(nota, linhas))
+
+            # Resumos diários (totais do histórico, dashboard e ranking de produtos)
+            registrar_venda(nota, itens_nota)
+
+            # Baixa do estoque: movimentos do razão + um único UPDATE para o carrinho
+            baixar_estoque_venda(nota, itens_nota)
+    except Exception:
+        logger.exception("Nota %s gravada, mas falhou o registro de itens/resumos/estoque", nota.id)
+
+
 @login_required
 @csrf_exempt
 def emitir_nota(request):
@@ -223,6 +427,8 @@ def emitir_nota(request):
         )
 
         if sucesso:
+            # A nota já está autorizada na SEFAZ/NuvemFiscal: o registro é gravado
+            # (autocommit) antes de qualquer controle interno, que não pode desfazê-lo
             nota = NotaFiscal.objects.create(
                 empresa=empresa,
                 cliente=cliente,
@@ -239,6 +445,13 @@ def emitir_nota(request):
                 xml_assinado=resultado.get('xml_protocolo') or None,
                 protocolo_autorizacao=resultado.get('protocolo_autorizacao') or None,
             )
+            _registrar_itens_e_vendas(nota, itens)
+
+            # DANFE pronto antes da resposta: a primeira impressão já sai do cache
+            if nota.xml_assinado:
+                from core.danfe_cache import pre_renderizar_danfe
+                pre_renderizar_danfe(nota)
+
             return JsonResponse({'status': 'sucesso', 'id_nota': nota.id})
         else:
             return JsonResponse({'mensagem': f"Erro na emissão: {resultado}"}, status=400)
@@ -316,6 +529,7 @@ def configuracoes(request):
 
 
 @login_required
+@leitura_em_replica
 def listar_clientes(request):
     try:
         empresa = request.user.perfil.empresa
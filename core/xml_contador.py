@@ -0,0 +1,137 @@
+"""
+Pacote mensal de XMLs para o contador, gerado como ZIP em streaming.
+
+Inclui o nfeProc autorizado de cada NFC-e do mês (xml_assinado) e o evento
+de cancelamento (xml_cancelamento) quando houver, mais um manifesto com
+quantidade e valor por status. Os XMLs vão do banco direto para o ZIP, nota
+a nota, sem montar o arquivo em memória.
+
+Notas NuvemFiscal ainda sem XML local têm o XML baixado antes (downloads
+simultâneos) e gravado na nota, então os meses seguintes não baixam de novo.
+Na view, no máximo settings.XML_CONTADOR_DOWNLOADS_NA_REQUISICAO downloads
+acontecem antes do primeiro byte (limite de tempo do serverless); o comando
+exportar_xmls_mes baixa todos.
+
+Tudo é lido do banco principal: os XMLs recém-baixados são gravados nele e a
+réplica ainda pode não tê-los.
+
+Função principal: gerar_zip_xmls_mes(empresa, ano, mes, ambiente=None, limite_downloads=None) -> iterator[bytes]
+"""
+
+import calendar
+import logging
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from django.db import DEFAULT_DB_ALIAS, connection
+
+from core.relatorios import filtrar_notas
+from core.utils import BufferZip
+
+logger = logging.getLogger(__name__)
+
+_DOWNLOADS_SIMULTANEOS = 4
+
+
+def notas_do_mes(empresa, ano, mes, ambiente=None):
+    """QuerySet das notas da empresa emitidas no mês (fuso da loja)."""
+    ultimo_dia = calendar.monthrange(ano, mes)[1]
+    return filtrar_notas(
+        empresa,
+        data_inicio=date(ano, mes, 1),
+        data_fim=date(ano, mes, ultimo_dia),
+        ambiente=ambiente,
+    )
+
+
+def _baixar_em_thread(nota):
+    from core.services import NuvemFiscalService
+    try:
+        return NuvemFiscalService.baixar_xml(nota.empresa, nota.id_nota, ambiente=nota.ambiente)
+    finally:
+        connection.close()
+
+
+def sincronizar_xmls_faltantes(notas, limite=None):
+    """
+    Baixa em paralelo o XML das notas NuvemFiscal sem XML local (no máximo
+    `limite`) e grava cada um na nota (no thread principal). Retorna quantas
+    notas foram atualizadas.
+    """
+    from core.services import NuvemFiscalService
+
+    pendentes = (
+        notas.filter(xml_assinado__isnull=True, xml_assinado_arquivo__isnull=True, id_nota__isnull=False)
+        .exclude(id_nota='')
+        .select_related('empresa')
+        .order_by('id')
+    )
+    pendentes = list(pendentes[:limite] if limite is not None else pendentes)
+    if not pendentes:
+        return 0
+
+    gravadas = 0
+    with ThreadPoolExecutor(max_workers=_DOWNLOADS_SIMULTANEOS) as executor:
+        for nota, (xml, erro) in zip(pendentes, executor.map(_baixar_em_thread, pendentes)):
+            if xml and NuvemFiscalService.gravar_xml(nota, xml):
+                gravadas += 1
+            else:
+                logger.warning("XML da nota %s indisponível: %s", nota.id, erro)
+    return gravadas
+
+
+def _nome_base(nota):
+    return nota.chave or f"nfce_{nota.serie}_{nota.numero}"
+
+
+def _manifesto(empresa, ano, mes, resumo, sem_xml):
+    linhas = [
+        f"Empresa: {empresa.nome} - CNPJ {empresa.cnpj}",
+        f"Competência: {mes:02d}/{ano}",
+        "",
+        f"{'Status':<20}{'Notas':>8}{'Valor (R$)':>16}",
+    ]
+    for status, (quantidade, valor) in sorted(resumo.items()):
+        linhas.append(f"{status:<20}{quantidade:>8}{valor:>16.2f}")
+    linhas.append(f"{'TOTAL':<20}{sum(q for q, _ in resumo.values()):>8}"
+                  f"{sum(v for _, v in resumo.values()):>16.2f}")
+
+    if sem_xml:
+        linhas += ["", f"Notas sem XML ({len(sem_xml)}):"]
+        linhas += [f"  Nº {nota.numero} série {nota.serie} - {nota.status}" for nota in sem_xml]
+        linhas += ["", "Os XMLs da NuvemFiscal que a tela não baixou vêm no pacote do comando exportar_xmls_mes."]
+    return "\n".join(linhas) + "\n"
+
+
+def gerar_zip_xmls_mes(empresa, ano, mes, ambiente=None, limite_downloads=None):
+    """
+    ZIP com autorizadas/<chave>-nfce.xml, canceladas/<chave>-procEventoNFe.xml
+    e manifesto.txt, entregue em pedaços de bytes. `limite_downloads` limita
+    os XMLs baixados da NuvemFiscal antes de começar (None: todos).
+    """
+    # Principal, mesmo numa view de relatório: os XMLs baixados agora são gravados nele
+    notas = notas_do_mes(empresa, ano, mes, ambiente).using(DEFAULT_DB_ALIAS)
+    sincronizar_xmls_faltantes(notas, limite_downloads)
+
+    buf = BufferZip()
+    resumo = {}
+    sem_xml = []
+    with zipfile.ZipFile(buf, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for nota in notas.com_xml().order_by('serie', 'numero').iterator(chunk_size=200):
+            quantidade, valor = resumo.get(nota.status, (0, 0))
+            resumo[nota.status] = (quantidade + 1, valor + nota.valor_total)
+
+            if nota.xml_assinado:
+                zf.writestr(f"autorizadas/{_nome_base(nota)}-nfce.xml", nota.xml_assinado)
+            else:
+                sem_xml.append(nota)
+            if nota.xml_cancelamento:
+                zf.writestr(f"canceladas/{_nome_base(nota)}-procEventoNFe.xml", nota.xml_cancelamento)
+
+            dados = buf.drenar()
+            if dados:
+                yield dados
+
+        zf.writestr("manifesto.txt", _manifesto(empresa, ano, mes, resumo, sem_xml))
+    yield buf.drenar()
@@ -16,4 +16,20 @@ class EstoqueConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     
     # Define o nome amigável que aparecerá no cabeçalho do Painel Administrativo
-    verbose_name = 'Gestão de Inventário e Produtos'
\ No newline at end of file
+    verbose_name = 'Gestão de Inventário e Produtos'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_migrate
+        from .sincronizacao import registrar_remocao
+        post_migrate.connect(_garantir_indice_busca, sender=self)
+        # Tombstone para o PDV remover o produto da cópia local do catálogo
+        post_delete.connect(registrar_remocao, sender='estoque.Produto')
+
+
+def _garantir_indice_busca(using, **kwargs):
+    """No SQLite, migrations que recriam estoque_produto apagam os triggers do FTS5."""
+    from django.db import connections
+    from .busca import criar_indice_busca
+    connection = connections[using]
+    if "estoque_produto" in connection.introspection.table_names():
+        criar_indice_busca(connection)
@@ -0,0 +1,215 @@
+"""
+Busca indexada de produtos para o autocomplete (api/produtos/?q=).
+
+Cada produto guarda em `texto_busca` o nome + código sem acentos e em
+minúsculas ("Cimento Votoran 50kg" -> "cimento votoran 50kg 789..."), e a
+busca compara a forma normalizada do termo. Assim "acucar", "AÇÚCAR" e
+"açúcar" encontram o mesmo produto.
+
+Índice por banco:
+    PostgreSQL: GIN com pg_trgm sobre texto_busca; LIKE '%termo%' usa o
+                índice e o resultado é ordenado por similarity().
+    SQLite:     tabela FTS5 (tokenizer trigram) estoque_produto_fts, mantida
+                por triggers; textos mais curtos (mais próximos do termo)
+                primeiro — o bm25 do FTS5 custa caro em termos muito comuns.
+
+Em ambos, produtos cujo texto começa pelo termo vêm primeiro. Palavras com
+menos de 3 letras não usam o índice de trigramas e viram só um filtro. Um
+termo só com palavras assim (as primeiras teclas) busca apenas os produtos
+que começam por ele, em ordem alfabética: "ci" acha "Cimento", não
+"Vacina". No SQLite isso é um intervalo no índice (empresa, texto_busca) em
+vez de varrer o catálogo.
+
+Leituras de código de barras (só dígitos, no tamanho de um GTIN) vão antes
+para produto_por_codigo_de_barras: uma consulta exata no índice único
+(empresa, codigo), sem passar pela busca textual.
+
+Funções principais:
+    buscar(empresa, termo, limite=20) -> (produtos, exato)
+    produto_por_codigo_de_barras(empresa, termo) -> Produto | None
+    pesquisar_produtos(empresa, termo, limite=20) -> list[Produto]
+"""
+
+import unicodedata
+
+from django.db import connections
+from django.db.models import Case, F, FloatField, Func, Value, When
+
+LIMITE_PADRAO = 20
+TAMANHOS_GTIN = (8, 12, 13, 14)
+TABELA_FTS = "estoque_produto_fts"
+_TRIGGERS_FTS = ("estoque_produto_fts_ai", "estoque_produto_fts_ad", "estoque_produto_fts_au")
+
+
+def normalizar_busca(texto):
+    """Minúsculas, sem acentos e com espaços simples."""
+    texto = unicodedata.normalize("NFKD", texto or "")
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(texto.lower().split())
+
+
+def texto_busca(nome, codigo):
+    return normalizar_busca(f"{nome} {codigo}")
+
+
+def _escapar_like(palavra):
+    return palavra.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def e_codigo_de_barras(termo):
+    """EAN-8, UPC-A (12), EAN-13 ou GTIN-14: só dígitos, num desses tamanhos."""
+    termo = (termo or "").strip()
+    return termo.isdigit() and len(termo) in TAMANHOS_GTIN
+
+
+def _variantes_gtin(codigo):
+    """
+    O mesmo GTIN com e sem zeros à esquerda (UPC-A lido como EAN-13,
+    GTIN-14 cadastrado com 13 dígitos...), o lido primeiro.
+    """
+    significativo = codigo.lstrip("0")
+    variantes = [codigo]
+    for tamanho in TAMANHOS_GTIN:
+        if len(significativo) <= tamanho:
+            variante = significativo.zfill(tamanho)
+            if variante not in variantes:
+                variantes.append(variante)
+    return variantes
+
+
+def produto_por_codigo_de_barras(empresa, termo):
+    """Produto com o código lido, numa única consulta pelo índice (empresa, codigo); None se não for GTIN ou não existir."""
+    from .models import Produto
+
+    if not e_codigo_de_barras(termo):
+        return None
+    variantes = _variantes_gtin(termo.strip())
+    encontrados = {p.codigo: p for p in Produto.objects.filter(empresa=empresa, codigo__in=variantes)}
+    return next((encontrados[v] for v in variantes if v in encontrados), None)
+
+
+def buscar(empresa, termo, limite=LIMITE_PADRAO):
+    """
+    Autocomplete: código de barras exato primeiro, senão busca textual.
+    Uma consulta ao banco em qualquer dos casos.
+
+    Returns:
+        Tuple: (produtos: list, exato: bool)
+    """
+    produto = produto_por_codigo_de_barras(empresa, termo)
+    return ([produto], True) if produto else (pesquisar_produtos(empresa, termo, limite), False)
+
+
+def pesquisar_produtos(empresa, termo, limite=LIMITE_PADRAO):
+    """Produtos da empresa que contêm todas as palavras do termo, dos mais relevantes aos menos."""
+    from .models import Produto
+
+    palavras = normalizar_busca(termo).split()
+    if not palavras:
+        return []
+
+    produtos = Produto.objects.filter(empresa=empresa)
+    vendor = connections[produtos.db].vendor
+    if all(len(p) < 3 for p in palavras):
+        return _pesquisar_prefixo(produtos, vendor, palavras, limite)
+    if vendor == "sqlite":
+        return _pesquisar_fts5(produtos, empresa, palavras, limite)
+
+    for palavra in palavras:
+        produtos = produtos.filter(texto_busca__contains=palavra)
+    ordem = [Case(When(texto_busca__startswith=palavras[0], then=0), default=1)]
+    if vendor == "postgresql":
+        similaridade = Func(F("texto_busca"), Value(" ".join(palavras)), function="similarity",
+                            output_field=FloatField())
+        ordem.append(similaridade.desc())
+    return list(produtos.order_by(*ordem, "nome")[:limite])
+
+
+def _pesquisar_prefixo(produtos, vendor, palavras, limite):
+    """Produtos cujo texto começa pela primeira palavra e contém as demais."""
+    primeira = palavras[0]
+    if vendor == "sqlite":
+        # texto_busca usa BINARY (compara bytes): [primeira, primeira + U+10FFFF) são
+        # exatamente os textos que começam por ela, lidos pelo índice
+        produtos = produtos.filter(texto_busca__gte=primeira, texto_busca__lt=primeira + "\U0010ffff")
+    else:
+        produtos = produtos.filter(texto_busca__startswith=primeira)
+    for palavra in palavras[1:]:
+        produtos = produtos.filter(texto_busca__contains=palavra)
+    # Na ordem do índice: os primeiros `limite` saem sem ordenar o intervalo inteiro
+    return list(produtos.order_by("texto_busca")[:limite])
+
+
+def _pesquisar_fts5(produtos, empresa, palavras, limite):
+    longas = [p for p in palavras if len(p) >= 3]
+    curtas = [p for p in palavras if len(p) < 3]
+
+    # Cada palavra entre aspas: o trigram do FTS5 casa a substring, todas obrigatórias
+    consulta = " ".join('"' + p.replace('"', '""') + '"' for p in longas)
+    sql = [
+        f"SELECT p.* FROM {TABELA_FTS} f JOIN estoque_produto p ON p.id = f.rowid",
+        f"WHERE {TABELA_FTS} MATCH %s AND p.empresa_id = %s",
+    ]
+    parametros = [consulta, empresa.id]
+    for palavra in curtas:
+        sql.append("AND p.texto_busca LIKE %s ESCAPE '\\'")
+        parametros.append(f"%{_escapar_like(palavra)}%")
+    sql.append("ORDER BY p.texto_busca LIKE %s ESCAPE '\\' DESC, LENGTH(p.texto_busca), p.nome LIMIT %s")
+    parametros += [f"{_escapar_like(palavras[0])}%", limite]
+
+    # Produtos inteiros na mesma consulta, já na ordem da busca
+    return list(produtos.model.objects.db_manager(produtos.db).raw(" ".join(sql), parametros))
+
+
+# ─────────────────────────────────────────────
+# Índices (chamados pela migration e no post_migrate)
+# ─────────────────────────────────────────────
+
+def criar_indice_busca(connection):
+    """Cria o índice de busca do banco, se ainda não existir. Idempotente."""
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS produto_busca_trgm_idx "
+                "ON estoque_produto USING gin (texto_busca gin_trgm_ops)"
+            )
+        elif connection.vendor == "sqlite":
+            cursor.execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name IN (%s, %s, %s)",
+                list(_TRIGGERS_FTS),
+            )
+            if cursor.fetchone()[0] == len(_TRIGGERS_FTS):
+                return
+            # Triggers somem quando o SQLite recria a tabela numa migration: refaz tudo
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_FTS} USING fts5("
+                "texto_busca, content='estoque_produto', content_rowid='id', tokenize='trigram')"
+            )
+            cursor.execute(
+                "CREATE TRIGGER IF NOT EXISTS estoque_produto_fts_ai AFTER INSERT ON estoque_produto BEGIN "
+                f"INSERT INTO {TABELA_FTS}(rowid, texto_busca) VALUES (new.id, new.texto_busca); END"
+            )
+            cursor.execute(
+                "CREATE TRIGGER IF NOT EXISTS estoque_produto_fts_ad AFTER DELETE ON estoque_produto BEGIN "
+                f"INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, texto_busca) "
+                "VALUES ('delete', old.id, old.texto_busca); END"
+            )
+            cursor.execute(
+                "CREATE TRIGGER IF NOT EXISTS estoque_produto_fts_au AFTER UPDATE OF texto_busca "
+                "ON estoque_produto BEGIN "
+                f"INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, texto_busca) "
+                "VALUES ('delete', old.id, old.texto_busca); "
+                f"INSERT INTO {TABELA_FTS}(rowid, texto_busca) VALUES (new.id, new.texto_busca); END"
+            )
+            cursor.execute(f"INSERT INTO {TABELA_FTS}({TABELA_FTS}) VALUES ('rebuild')")
+
+
+def remover_indice_busca(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("DROP INDEX IF EXISTS produto_busca_trgm_idx")
+        elif connection.vendor == "sqlite":
+            for trigger in _TRIGGERS_FTS:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            cursor.execute(f"DROP TABLE IF EXISTS {TABELA_FTS}")
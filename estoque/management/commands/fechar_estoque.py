@@ -0,0 +1,46 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from core.models import Empresa
+from estoque.saldos import fechar_meses
+
+class Command(BaseCommand):
+    """
+    Fechamento mensal do estoque: grava o saldo de fim de mês de cada produto
+    (SaldoEstoque) a partir do fechamento anterior e dos movimentos do mês.
+    Fecha em ordem todos os meses pendentes; rodar no início de cada mês (cron).
+
+    Uso:
+        python manage.py fechar_estoque [--empresa <id>] [--ate AAAA-MM]
+    """
+    help = 'Grava o saldo de fim de mês dos produtos (meses encerrados ainda sem fechamento).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresa', type=int, default=None, help='Restringe a uma empresa (ID)')
+        parser.add_argument('--ate', type=str, default=None,
+                            help='Último mês a fechar, AAAA-MM, já encerrado (Padrão: o mês passado)')
+
+    def handle(self, *args, **kwargs):
+        empresa = None
+        if kwargs['empresa']:
+            try:
+                empresa = Empresa.objects.get(id=kwargs['empresa'])
+            except Empresa.DoesNotExist:
+                raise CommandError(f"Empresa com ID {kwargs['empresa']} não encontrada.")
+
+        ate = None
+        if kwargs['ate']:
+            try:
+                ano, mes = (int(parte) for parte in kwargs['ate'].split('-'))
+                ate = date(ano, mes, 1)
+            except ValueError as e:
+                raise CommandError(f"Mês inválido ({kwargs['ate']}): {e}")
+
+        try:
+            fechados = fechar_meses(empresa=empresa, ate=ate)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for empresa_id, mes_fechado, produtos in fechados:
+            self.stdout.write(f'Empresa {empresa_id}: {mes_fechado:%m/%Y} fechado ({produtos} produtos com saldo).')
+        self.stdout.write(self.style.SUCCESS(f'Concluído! {len(fechados)} mês(es) fechado(s)'))
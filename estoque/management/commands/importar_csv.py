@@ -1,22 +1,37 @@
 import csv
 import os
+import time
+from decimal import Decimal, InvalidOperation
+
 from django.core.management.base import BaseCommand
-from estoque.models import Produto
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from estoque.busca import texto_busca
+from estoque.models import MovimentoEstoque, Produto
+from estoque.movimentos import registrar_movimentos
 from core.models import Empresa
 
+COLUNAS = ('Código de Barras', 'Descrição', 'NCM', 'Preço Venda Varejo', 'Quantidade em Estoque')
+
 class Command(BaseCommand):
     """
     Comando para importar produtos vinculando-os a uma Empresa específica.
-    
+
+    O CSV é lido em streaming e gravado em lotes: cada lote é validado e
+    gravado com um único INSERT ... ON CONFLICT (empresa, codigo) DO UPDATE
+    (bulk_create com update_conflicts), numa transação por lote que também
+    lança as entradas/ajustes no razão de estoque. Linhas rejeitadas vão para o arquivo
+    de erros, com o motivo.
+
     Uso:
-        python manage.py importar_csv <id_empresa> --arquivo <nome_arquivo.csv>
+        python manage.py importar_csv <id_empresa> --arquivo <nome_arquivo.csv> [--lote 1000] [--erros <arquivo>]
     """
     help = 'Importa produtos de um CSV para uma Empresa específica.'
 
     def add_arguments(self, parser):
         # Argumento obrigatório: ID da empresa no banco
         parser.add_argument('empresa_id', type=int, help='ID da empresa para vincular os produtos')
-        
+
         # Argumento opcional: Nome do arquivo (padrão: Produtos.csv)
         parser.add_argument(
             '--arquivo',
@@ -24,10 +39,19 @@ class Command(BaseCommand):
             default='Produtos.csv',
             help='Nome do arquivo CSV na raiz do projeto (Padrão: Produtos.csv)'
         )
+        parser.add_argument('--lote', type=int, default=1000, help='Linhas por lote/transação (Padrão: 1000)')
+        parser.add_argument(
+            '--erros',
+            type=str,
+            default=None,
+            help='CSV com as linhas rejeitadas (Padrão: <arquivo>.erros.csv)'
+        )
 
     def handle(self, *args, **kwargs):
         empresa_id = kwargs['empresa_id']
         caminho_arquivo = kwargs['arquivo']
+        caminho_erros = kwargs['erros'] or f'{os.path.splitext(caminho_arquivo)[0]}.erros.csv'
+        tamanho_lote = kwargs['lote']
 
         # 1. Verifica se a empresa existe
         try:
@@ -42,49 +66,140 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR(f'Arquivo "{caminho_arquivo}" não encontrado!'))
             return
 
-        # 3. Processamento
-        with open(caminho_arquivo, mode='r', encoding='utf-8-sig') as arquivo:
+        # 3. Processamento em lotes
+        with open(caminho_arquivo, mode='r', encoding='utf-8-sig', newline='') as arquivo:
             leitor = csv.DictReader(arquivo, delimiter=';')
-            
-            criados = 0
-            atualizados = 0
+            faltando = [coluna for coluna in COLUNAS if coluna not in (leitor.fieldnames or [])]
+            if faltando:
+                self.stdout.write(self.style.ERROR(f'Colunas ausentes no CSV: {", ".join(faltando)}'))
+                return
+
+            self.criados = self.atualizados = 0
+            self.rejeitadas = []
+            lidas = 0
+            inicio = time.monotonic()
 
             self.stdout.write('Iniciando processamento...')
 
+            lote = []
             for linha in leitor:
-                try:
-                    # Tratamento de dados
-                    codigo = linha['Código de Barras'].strip().replace('"', '')
-                    nome = linha['Descrição'].strip()
-                    ncm = linha['NCM'].strip().replace('.', '')
-                    
-                    preco_str = linha['Preço Venda Varejo'].replace(',', '.')
-                    preco = float(preco_str) if preco_str else 0.0
-                    
-                    estoque_str = linha['Quantidade em Estoque'].replace(',', '.')
-                    estoque = int(float(estoque_str)) if estoque_str else 0
-
-                    # UPSERT com filtro de Empresa
-                    # Agora usamos 'empresa' E 'codigo' para identificar o produto único
-                    obj, created = Produto.objects.update_or_create(
-                        empresa=empresa,  # <--- VÍNCULO OBRIGATÓRIO
-                        codigo=codigo,
-                        defaults={
-                            'nome': nome,
-                            'preco': preco,
-                            'ncm': ncm,
-                            'estoque_atual': estoque
-                        }
-                    )
-
-                    if created:
-                        criados += 1
-                    else:
-                        atualizados += 1
-
-                except Exception as e:
-                    self.stdout.write(self.style.WARNING(f'Erro no item {linha.get("Descrição", "?")}: {e}'))
-
-            self.stdout.write(self.style.SUCCESS(
-                f'Concluído! Importados para {empresa.nome}: {criados} novos | {atualizados} atualizados'
-            ))
\ No newline at end of file
+                lidas += 1
+                lote.append(linha)
+                if len(lote) == tamanho_lote:
+                    self._processar_lote(empresa, lote)
+                    lote = []
+                    self._progresso(lidas, inicio)
+            if lote:
+                self._processar_lote(empresa, lote)
+                self._progresso(lidas, inicio)
+
+            fieldnames = leitor.fieldnames
+
+        # 4. Linhas rejeitadas, com o motivo, no mesmo formato do CSV de entrada
+        if self.rejeitadas:
+            with open(caminho_erros, mode='w', encoding='utf-8-sig', newline='') as arquivo:
+                escritor = csv.DictWriter(arquivo, fieldnames=[*fieldnames, 'Motivo'], delimiter=';',
+                                          extrasaction='ignore')
+                escritor.writeheader()
+                escritor.writerows(self.rejeitadas)
+            self.stdout.write(self.style.WARNING(
+                f'{len(self.rejeitadas)} linhas rejeitadas gravadas em "{caminho_erros}"'
+            ))
+
+        segundos = max(time.monotonic() - inicio, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f'Concluído! Importados para {empresa.nome}: {self.criados} novos | {self.atualizados} atualizados | '
+            f'{len(self.rejeitadas)} rejeitados ({lidas / segundos:.0f} linhas/s)'
+        ))
+
+    def _progresso(self, lidas, inicio):
+        segundos = max(time.monotonic() - inicio, 1e-6)
+        self.stdout.write(f'{lidas} linhas processadas ({lidas / segundos:.0f} linhas/s)...')
+
+    # ─────────────────────────────────────────────
+    # Validação e gravação de um lote
+    # ─────────────────────────────────────────────
+
+    def _validar(self, linha):
+        """Normaliza a linha do CSV; levanta ValueError com o motivo se for inválida."""
+        codigo = (linha['Código de Barras'] or '').strip().replace('"', '')
+        nome = (linha['Descrição'] or '').strip()
+        ncm = (linha['NCM'] or '').strip().replace('.', '')
+        if not codigo:
+            raise ValueError('Código de barras vazio')
+        if len(codigo) > 20:
+            raise ValueError('Código de barras com mais de 20 caracteres')
+        if not nome:
+            raise ValueError('Descrição vazia')
+        if len(ncm) > 8 or (ncm and not ncm.isdigit()):
+            raise ValueError(f'NCM inválido: {ncm}')
+
+        preco_str = (linha['Preço Venda Varejo'] or '').strip().replace(',', '.')
+        estoque_str = (linha['Quantidade em Estoque'] or '').strip().replace(',', '.')
+        try:
+            preco = Decimal(preco_str or '0')
+            estoque = int(Decimal(estoque_str or '0'))
+        except (InvalidOperation, OverflowError, ValueError):
+            raise ValueError(f'Preço ou quantidade inválidos: {preco_str} / {estoque_str}')
+        if not preco.is_finite() or not 0 <= preco < Decimal('100000000'):
+            raise ValueError(f'Preço fora da faixa: {preco_str}')
+        preco = preco.quantize(Decimal('0.01'))
+
+        return {'codigo': codigo, 'nome': nome[:100], 'ncm': ncm, 'preco': preco, 'estoque_atual': estoque}
+
+    def _processar_lote(self, empresa, linhas):
+        # O mesmo código repetido no lote: vale a última linha (como no CSV lido em ordem)
+        validos = {}
+        for linha in linhas:
+            try:
+                dados = self._validar(linha)
+            except ValueError as e:
+                self.rejeitadas.append({**linha, 'Motivo': str(e)})
+                continue
+            validos[dados['codigo']] = dados
+        if not validos:
+            return
+
+        try:
+            self._gravar_lote(empresa, validos)
+        except DatabaseError as e:
+            # Lote recusado pelo banco (transação desfeita): todas as linhas válidas vão para o arquivo de erros
+            motivo = f'Lote recusado pelo banco: {e}'
+            codigos = set(validos)
+            for linha in linhas:
+                if (linha['Código de Barras'] or '').strip().replace('"', '') in codigos:
+                    self.rejeitadas.append({**linha, 'Motivo': motivo})
+
+    def _gravar_lote(self, empresa, validos):
+        agora = timezone.now()
+        with transaction.atomic():
+            # Estoque anterior (travado até o commit) para lançar a diferença no razão
+            anteriores = dict(
+                Produto.objects.select_for_update()
+                .filter(empresa=empresa, codigo__in=validos)
+                .values_list('codigo', 'estoque_atual')
+            )
+
+            Produto.objects.bulk_create(
+                [
+                    Produto(empresa=empresa, texto_busca=texto_busca(d['nome'], d['codigo']), atualizado_em=agora, **d)
+                    for d in validos.values()
+                ],
+                update_conflicts=True,
+                unique_fields=['empresa', 'codigo'],
+                update_fields=['nome', 'preco', 'ncm', 'estoque_atual', 'texto_busca', 'atualizado_em'],
+            )
+
+            # bulk_create não passa por Produto.save: entradas/ajustes do razão feitos aqui
+            ids = dict(Produto.objects.filter(empresa=empresa, codigo__in=validos).values_list('codigo', 'id'))
+            entradas, ajustes = {}, {}
+            for codigo, dados in validos.items():
+                if codigo in anteriores:
+                    ajustes[ids[codigo]] = dados['estoque_atual'] - anteriores[codigo]
+                else:
+                    entradas[ids[codigo]] = dados['estoque_atual']
+            registrar_movimentos(empresa.id, MovimentoEstoque.ENTRADA, entradas, aplicar=False)
+            registrar_movimentos(empresa.id, MovimentoEstoque.AJUSTE, ajustes, aplicar=False)
+
+        self.criados += len(validos) - len(anteriores)
+        self.atualizados += len(anteriores)
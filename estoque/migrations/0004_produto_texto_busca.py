@@ -0,0 +1,39 @@
+# Generated by Django 6.0 on 2026-10-19 15:05
+
+from django.db import migrations, models
+
+
+def preencher_texto_busca(apps, schema_editor):
+    from estoque.busca import texto_busca
+    Produto = apps.get_model('estoque', 'Produto')
+    produtos = list(Produto.objects.only('id', 'nome', 'codigo'))
+    for produto in produtos:
+        produto.texto_busca = texto_busca(produto.nome, produto.codigo)
+    Produto.objects.bulk_update(produtos, ['texto_busca'], batch_size=1000)
+
+
+def criar_indice(apps, schema_editor):
+    from estoque.busca import criar_indice_busca
+    criar_indice_busca(schema_editor.connection)
+
+
+def remover_indice(apps, schema_editor):
+    from estoque.busca import remover_indice_busca
+    remover_indice_busca(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0003_produto_empresa_alter_produto_codigo_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produto',
+            name='texto_busca',
+            field=models.CharField(default='', editable=False, max_length=130),
+        ),
+        migrations.RunPython(preencher_texto_busca, migrations.RunPython.noop),
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 6.0 on 2026-10-19 16:20
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_notafiscal_xml_arquivado'),
+        ('estoque', '0004_produto_texto_busca'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProdutoRemovido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('produto_id', models.BigIntegerField(verbose_name='ID do Produto')),
+                ('codigo', models.CharField(max_length=20, verbose_name='Código (EAN/Ref)')),
+                ('removido_em', models.DateTimeField(auto_now_add=True, verbose_name='Removido em')),
+            ],
+            options={
+                'verbose_name': 'Produto Removido',
+                'verbose_name_plural': 'Produtos Removidos',
+            },
+        ),
+        migrations.AddField(
+            model_name='produto',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Atualizado em'),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['empresa', 'atualizado_em'], name='produto_atualizado_idx'),
+        ),
+        migrations.AddField(
+            model_name='produtoremovido',
+            name='empresa',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.empresa', verbose_name='Loja/Empresa'),
+        ),
+        migrations.AddIndex(
+            model_name='produtoremovido',
+            index=models.Index(fields=['empresa', 'removido_em'], name='produto_removido_idx'),
+        ),
+    ]
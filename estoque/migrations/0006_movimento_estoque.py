@@ -0,0 +1,47 @@
+# Generated by Django 6.0 on 2026-10-19 17:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def saldo_inicial(apps, schema_editor):
+    """Abre o razão com o estoque atual de cada produto (uma entrada por produto)."""
+    Produto = apps.get_model('estoque', 'Produto')
+    MovimentoEstoque = apps.get_model('estoque', 'MovimentoEstoque')
+    produtos = Produto.objects.exclude(estoque_atual=0).values_list('id', 'empresa_id', 'estoque_atual')
+    MovimentoEstoque.objects.bulk_create(
+        (
+            MovimentoEstoque(produto_id=id_, empresa_id=empresa_id, tipo='entrada', quantidade=estoque)
+            for id_, empresa_id, estoque in produtos.iterator(chunk_size=5000)
+        ),
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_notafiscal_xml_arquivado'),
+        ('estoque', '0005_produto_sincronizacao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimentoEstoque',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('entrada', 'Entrada'), ('venda', 'Venda'), ('cancelamento', 'Cancelamento de venda'), ('ajuste', 'Ajuste manual')], max_length=12, verbose_name='Tipo')),
+                ('quantidade', models.IntegerField(verbose_name='Quantidade')),
+                ('criado_em', models.DateTimeField(auto_now_add=True, verbose_name='Data')),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.empresa', verbose_name='Loja/Empresa')),
+                ('nota', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimentos_estoque', to='core.notafiscal', verbose_name='Nota Fiscal')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimentos', to='estoque.produto', verbose_name='Produto')),
+            ],
+            options={
+                'verbose_name': 'Movimento de Estoque',
+                'verbose_name_plural': 'Movimentos de Estoque',
+                'indexes': [models.Index(fields=['produto', 'criado_em'], name='movimento_produto_idx'), models.Index(fields=['empresa', 'criado_em'], name='movimento_periodo_idx')],
+            },
+        ),
+        migrations.RunPython(saldo_inicial, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-19 17:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_notafiscal_xml_arquivado'),
+        ('estoque', '0006_movimento_estoque'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoEstoque',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(verbose_name='Mês (1º dia)')),
+                ('saldo', models.IntegerField(verbose_name='Saldo no fim do mês')),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.empresa', verbose_name='Loja/Empresa')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos', to='estoque.produto', verbose_name='Produto')),
+            ],
+            options={
+                'verbose_name': 'Saldo de Estoque',
+                'verbose_name_plural': 'Saldos de Estoque',
+                'constraints': [models.UniqueConstraint(fields=('empresa', 'mes', 'produto'), name='saldo_estoque_unico')],
+            },
+        ),
+    ]
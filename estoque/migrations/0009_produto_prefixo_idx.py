@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-19 20:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0008_versao_catalogo'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['empresa', 'texto_busca'], name='produto_prefixo_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-19 21:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0009_produto_prefixo_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='movimentoestoque',
+            name='produto',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.RESTRICT, related_name='movimentos', to='estoque.produto', verbose_name='Produto'),
+        ),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 6.0 on 2026-10-19 22:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0010_movimento_produto_restrict'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='VersaoCatalogo',
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from core.models import Empresa
 
 class Produto(models.Model):
@@ -46,6 +46,13 @@ class Produto(models.Model):
         verbose_name="Qtd em Estoque"
     )
 
+    # Nome + código sem acentos/minúsculo, indexado para o autocomplete (estoque.busca)
+    texto_busca = models.CharField(max_length=130, default="", editable=False)
+
+    # Cursor da sincronização incremental do catálogo com o PDV (estoque.sincronizacao).
+    # Atualizações em massa (QuerySet.update/bulk) precisam preencher este campo.
+    atualizado_em = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
+
     # ==================================================
     # 4. MÉTODOS E CONFIGURAÇÕES
     # ==================================================
@@ -53,8 +60,156 @@ class Produto(models.Model):
         """Retorna a representação textual do produto para o sistema."""
         return f"{self.nome} (R$ {self.preco})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Estoque como lido do banco: save() aplica a diferença com F() e a lança no razão
+        instancia._estoque_salvo = instancia.__dict__.get("estoque_atual")
+        return instancia
+
+    def save(self, *args, **kwargs):
+        from .busca import texto_busca
+        from .movimentos import registrar_movimentos
+
+        self.texto_busca = texto_busca(self.nome, self.codigo)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and ({"nome", "codigo"} & set(update_fields)):
+            update_fields = kwargs["update_fields"] = {*update_fields, "texto_busca"}
+
+        # Estoque digitado (cadastro, admin, CSV) entra no razão como entrada ou ajuste
+        if self._state.adding or kwargs.get("force_insert"):
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                registrar_movimentos(self.empresa_id, MovimentoEstoque.ENTRADA, {self.pk: self.estoque_atual},
+                                     aplicar=False)
+            self._estoque_salvo = self.estoque_atual
+            return
+
+        # Produto existente: estoque_atual nunca é regravado com o valor lido. Uma
+        # venda confirmada entre a leitura e o save (UPDATE com F()) se perderia;
+        # a edição entra como diferença sobre o valor lido, também com F()
+        alterar_estoque = update_fields is None or "estoque_atual" in update_fields
+        if update_fields is None:
+            update_fields = [f.name for f in self._meta.concrete_fields if not f.primary_key]
+        kwargs["update_fields"] = [campo for campo in update_fields if campo != "estoque_atual"]
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if not alterar_estoque:
+                return
+            produto = Produto.objects.select_for_update().filter(pk=self.pk)
+            anterior = getattr(self, "_estoque_salvo", None)
+            if anterior is None:
+                anterior = produto.values_list("estoque_atual", flat=True).get()
+            if registrar_movimentos(self.empresa_id, MovimentoEstoque.AJUSTE,
+                                    {self.pk: int(self.estoque_atual) - anterior}):
+                anterior = produto.values_list("estoque_atual", flat=True).get()
+            self.estoque_atual = self._estoque_salvo = anterior
+
     class Meta:
         """Configurações de exibição do modelo no banco e no Admin."""
         verbose_name = "Produto"
         verbose_name_plural = "Produtos"
-        unique_together = ('empresa', 'codigo')
\ No newline at end of file
+        unique_together = ('empresa', 'codigo')
+        indexes = [
+            # Delta do catálogo: filter(empresa, atualizado_em__gte=cursor)
+            models.Index(fields=['empresa', 'atualizado_em'], name='produto_atualizado_idx'),
+            # Termos de 1-2 letras no SQLite: intervalo de prefixo em texto_busca (estoque.busca)
+            models.Index(fields=['empresa', 'texto_busca'], name='produto_prefixo_idx'),
+        ]
+
+
+class ProdutoRemovido(models.Model):
+    """
+    Registro (tombstone) de produto excluído, para o PDV remover da cópia
+    local do catálogo na próxima sincronização incremental.
+    """
+
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, verbose_name="Loja/Empresa")
+    produto_id = models.BigIntegerField(verbose_name="ID do Produto")
+    codigo = models.CharField(max_length=20, verbose_name="Código (EAN/Ref)")
+    removido_em = models.DateTimeField(auto_now_add=True, verbose_name="Removido em")
+
+    def __str__(self):
+        return f"Produto {self.produto_id} removido em {self.removido_em:%d/%m/%Y %H:%M}"
+
+    class Meta:
+        verbose_name = "Produto Removido"
+        verbose_name_plural = "Produtos Removidos"
+        indexes = [
+            models.Index(fields=['empresa', 'removido_em'], name='produto_removido_idx'),
+        ]
+
+class MovimentoEstoque(models.Model):
+    """
+    Lançamento do razão de estoque: cada entrada, venda, cancelamento ou
+    ajuste de um produto, com a quantidade já com sinal (positiva entra,
+    negativa sai). A soma dos movimentos de um produto é o seu estoque.
+    """
+
+    ENTRADA = "entrada"
+    VENDA = "venda"
+    CANCELAMENTO = "cancelamento"
+    AJUSTE = "ajuste"
+    TIPOS = [
+        (ENTRADA, "Entrada"),
+        (VENDA, "Venda"),
+        (CANCELAMENTO, "Cancelamento de venda"),
+        (AJUSTE, "Ajuste manual"),
+    ]
+
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, verbose_name="Loja/Empresa")
+    # RESTRICT: o histórico do produto não some com ele; só sai junto com a empresa
+    produto = models.ForeignKey(
+        Produto, on_delete=models.RESTRICT, related_name="movimentos", verbose_name="Produto",
+    )
+    tipo = models.CharField(max_length=12, choices=TIPOS, verbose_name="Tipo")
+    quantidade = models.IntegerField(verbose_name="Quantidade")
+    # Sem FK no banco, como NotaFiscalItem.nota (tabela de notas particionável)
+    nota = models.ForeignKey(
+        "core.NotaFiscal",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="movimentos_estoque",
+        verbose_name="Nota Fiscal",
+        db_constraint=False,
+    )
+    criado_em = models.DateTimeField(auto_now_add=True, verbose_name="Data")
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.quantidade:+d} — produto {self.produto_id}"
+
+    class Meta:
+        verbose_name = "Movimento de Estoque"
+        verbose_name_plural = "Movimentos de Estoque"
+        indexes = [
+            # Extrato do produto e saldo em uma data: filter(produto, criado_em__lte=...)
+            models.Index(fields=['produto', 'criado_em'], name='movimento_produto_idx'),
+            models.Index(fields=['empresa', 'criado_em'], name='movimento_periodo_idx'),
+        ]
+
+
+class SaldoEstoque(models.Model):
+    """
+    Fechamento mensal do estoque: saldo de cada produto no fim do mês, para
+    consultar o estoque numa data sem somar todo o histórico de movimentos
+    (estoque.saldos). Produtos com saldo zero não têm linha.
+    """
+
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, verbose_name="Loja/Empresa")
+    produto = models.ForeignKey(
+        Produto, on_delete=models.CASCADE, related_name="saldos", verbose_name="Produto",
+    )
+    mes = models.DateField(verbose_name="Mês (1º dia)")
+    saldo = models.IntegerField(verbose_name="Saldo no fim do mês")
+
+    def __str__(self):
+        return f"Produto {self.produto_id} em {self.mes:%m/%Y}: {self.saldo}"
+
+    class Meta:
+        verbose_name = "Saldo de Estoque"
+        verbose_name_plural = "Saldos de Estoque"
+        constraints = [
+            models.UniqueConstraint(fields=['empresa', 'mes', 'produto'], name='saldo_estoque_unico'),
+        ]
@@ -0,0 +1,105 @@
+"""
+Razão de estoque (MovimentoEstoque) e baixa/estorno do saldo nas vendas.
+
+Cada nota autorizada lança um movimento 'venda' (quantidade negativa) por
+produto do carrinho; o cancelamento lança 'cancelamento' com as mesmas
+quantidades de volta. Os movimentos vão num único bulk_create e o saldo de
+todos os produtos do carrinho muda num único UPDATE:
+
+    UPDATE estoque_produto
+       SET estoque_atual = estoque_atual + CASE id WHEN 7 THEN -2 WHEN 9 THEN -1 END, ...
+     WHERE empresa_id = 1 AND id IN (7, 9)
+
+A soma é feita pelo banco (F()), então dois caixas vendendo o mesmo produto
+ao mesmo tempo nunca perdem uma baixa. Devem ser chamadas dentro da mesma
+transação que grava a nota.
+
+O atualizado_em também muda, para a cópia do PDV receber o novo saldo.
+
+Quantidades fracionadas (kg, m) são arredondadas para o inteiro mais
+próximo, a unidade de Produto.estoque_atual.
+
+Funções principais:
+    registrar_movimentos(empresa_id, tipo, quantidades, nota=None, aplicar=True)
+    baixar_estoque_venda(nota_fiscal, itens=None)
+    estornar_estoque_venda(nota_fiscal)
+"""
+
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Now
+
+from .models import MovimentoEstoque, Produto
+
+
+def _quantidade_inteira(quantidade):
+    return int(Decimal(str(quantidade)).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def registrar_movimentos(empresa_id, tipo, quantidades, nota=None, aplicar=True):
+    """
+    Lança um movimento `tipo` por produto de `quantidades` ({produto_id: quantidade
+    com sinal}) e, se `aplicar`, soma as quantidades ao estoque_atual num único
+    UPDATE. aplicar=False quando o saldo já foi gravado (Produto.save).
+    Retorna os movimentos criados.
+    """
+    quantidades = {produto_id: q for produto_id, q in quantidades.items() if q}
+    if not quantidades:
+        return []
+
+    movimentos = MovimentoEstoque.objects.bulk_create([
+        MovimentoEstoque(
+            empresa_id=empresa_id,
+            produto_id=produto_id,
+            tipo=tipo,
+            quantidade=quantidade,
+            nota_id=nota.id if nota is not None else None,
+        )
+        for produto_id, quantidade in quantidades.items()
+    ])
+
+    if aplicar:
+        # atualizado_em à mão: update() não passa pelo auto_now e o PDV sincroniza por ele
+        Produto.objects.filter(empresa_id=empresa_id, id__in=quantidades).update(
+            estoque_atual=F("estoque_atual") + Case(
+                *[When(id=produto_id, then=Value(q)) for produto_id, q in quantidades.items()],
+                default=Value(0),
+                output_field=IntegerField(),
+            ),
+            atualizado_em=Now(),
+        )
+    return movimentos
+
+
+def baixar_estoque_venda(nota_fiscal, itens=None):
+    """
+    Baixa do estoque os produtos de uma nota autorizada.
+    `itens` evita reler os NotaFiscalItem recém-criados; padrão nota.itens.
+    """
+    quantidades = {}
+    for item in (nota_fiscal.itens.all() if itens is None else itens):
+        if item.produto_id is not None:
+            quantidades[item.produto_id] = quantidades.get(item.produto_id, 0) - Decimal(str(item.quantidade))
+    return registrar_movimentos(
+        nota_fiscal.empresa_id,
+        MovimentoEstoque.VENDA,
+        {produto_id: _quantidade_inteira(q) for produto_id, q in quantidades.items()},
+        nota=nota_fiscal,
+    )
+
+
+def estornar_estoque_venda(nota_fiscal):
+    """Devolve ao estoque exatamente o que a venda da nota baixou."""
+    vendidos = (
+        MovimentoEstoque.objects.filter(nota=nota_fiscal, tipo=MovimentoEstoque.VENDA)
+        .values("produto_id")
+        .annotate(total=Sum("quantidade"))
+        .order_by()
+    )
+    return registrar_movimentos(
+        nota_fiscal.empresa_id,
+        MovimentoEstoque.CANCELAMENTO,
+        {linha["produto_id"]: -linha["total"] for linha in vendidos},
+        nota=nota_fiscal,
+    )
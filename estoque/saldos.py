@@ -0,0 +1,170 @@
+"""
+Fechamento mensal do estoque (SaldoEstoque) e saldo em qualquer data.
+
+O saldo de um produto é a soma dos seus movimentos (MovimentoEstoque). Para
+não somar o histórico inteiro a cada consulta, o comando fechar_estoque grava
+todo mês o saldo de fim de mês de cada produto, num único INSERT ... SELECT
+por empresa e mês:
+
+    saldo(fim do mês) = saldo do fechamento anterior + movimentos do mês
+
+O saldo numa data qualquer parte do último fechamento antes dela e soma só
+os movimentos seguintes (a "cauda"), duas consultas agregadas no banco.
+
+Os meses seguem o fuso da loja e só meses já encerrados são fechados.
+
+Funções principais:
+    fechar_meses(empresa=None, ate=None) -> [(empresa_id, mês, produtos com saldo)]
+    saldos_em(empresa, data, produtos=None) -> {produto_id: saldo}
+    inventario(empresa, data) -> list[dict]
+"""
+
+from datetime import date, timedelta
+
+from django.db import connection, transaction
+from django.db.models import Max, Min, Sum
+from django.utils import timezone
+
+from core.utils import inicio_do_dia
+
+from .models import MovimentoEstoque, Produto, SaldoEstoque
+
+
+def _primeiro_dia(data):
+    return date(data.year, data.month, 1)
+
+
+def _mes_seguinte(mes):
+    return date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+
+def ultimo_mes_encerrado(hoje=None):
+    """Primeiro dia do mês anterior ao atual (no fuso da loja)."""
+    hoje = hoje or timezone.localdate()
+    return _primeiro_dia(_primeiro_dia(hoje) - timedelta(days=1))
+
+
+def fechar_mes(empresa_id, mes):
+    """
+    Grava (ou regrava) o saldo de fim de `mes` dos produtos da empresa a partir
+    do fechamento anterior mais recente e dos movimentos desde ele. Sem
+    fechamento anterior, soma todos os movimentos até o fim do mês.
+    Retorna quantos produtos ficaram com saldo.
+    """
+    anterior = (
+        SaldoEstoque.objects.filter(empresa_id=empresa_id, mes__lt=mes).aggregate(mes=Max("mes"))["mes"]
+    )
+    fim = inicio_do_dia(_mes_seguinte(mes))
+    saldos = SaldoEstoque._meta.db_table
+    movimentos = MovimentoEstoque._meta.db_table
+    ops = connection.ops
+
+    base_sql = "SELECT produto_id, saldo AS quantidade FROM {saldos} WHERE empresa_id = %s AND mes = %s"
+    base_params = [empresa_id, ops.adapt_datefield_value(anterior)]
+    cauda_sql = "SELECT produto_id, quantidade FROM {movimentos} WHERE empresa_id = %s AND criado_em < %s"
+    cauda_params = [empresa_id, ops.adapt_datetimefield_value(fim)]
+    if anterior is not None:
+        cauda_sql += " AND criado_em >= %s"
+        cauda_params.append(ops.adapt_datetimefield_value(inicio_do_dia(_mes_seguinte(anterior))))
+
+    sql = (
+        "INSERT INTO {saldos} (empresa_id, produto_id, mes, saldo) "
+        "SELECT %s, produto_id, %s, SUM(quantidade) FROM ("
+        + base_sql + " UNION ALL " + cauda_sql +
+        ") t GROUP BY produto_id HAVING SUM(quantidade) <> 0"
+    ).format(saldos=saldos, movimentos=movimentos)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        SaldoEstoque.objects.filter(empresa_id=empresa_id, mes=mes).delete()
+        cursor.execute(sql, [empresa_id, ops.adapt_datefield_value(mes), *base_params, *cauda_params])
+        return cursor.rowcount
+
+
+def fechar_meses(empresa=None, ate=None):
+    """
+    Fecha, em ordem, os meses ainda sem fechamento de cada empresa com
+    movimentos, até `ate` (padrão: o último mês encerrado). Mês corrente ou
+    futuro é recusado (ValueError): movimentos lançados depois nesse mês
+    ficariam fora do saldo para sempre, já que mês fechado não é refeito.
+
+    Returns:
+        list[tuple]: (empresa_id, mês, produtos com saldo) de cada mês fechado
+    """
+    encerrado = ultimo_mes_encerrado()
+    ate = _primeiro_dia(ate) if ate else encerrado
+    if ate > encerrado:
+        raise ValueError(f"{ate:%m/%Y} ainda não terminou; o último mês que pode ser fechado é {encerrado:%m/%Y}.")
+    inicio_ate = inicio_do_dia(_mes_seguinte(ate))
+
+    movimentos = MovimentoEstoque.objects.filter(criado_em__lt=inicio_ate)
+    if empresa is not None:
+        movimentos = movimentos.filter(empresa=empresa)
+    primeiros = movimentos.values("empresa_id").annotate(primeiro=Min("criado_em")).order_by("empresa_id")
+
+    fechados = []
+    for linha in primeiros:
+        empresa_id = linha["empresa_id"]
+        ultimo = SaldoEstoque.objects.filter(empresa_id=empresa_id).aggregate(mes=Max("mes"))["mes"]
+        mes = _mes_seguinte(ultimo) if ultimo else _primeiro_dia(timezone.localtime(linha["primeiro"]))
+        while mes <= ate:
+            fechados.append((empresa_id, mes, fechar_mes(empresa_id, mes)))
+            mes = _mes_seguinte(mes)
+    return fechados
+
+
+# ─────────────────────────────────────────────
+# Consultas de saldo
+# ─────────────────────────────────────────────
+
+def saldos_em(empresa, data, produtos=None):
+    """
+    Saldo de cada produto da empresa no fim do dia `data` (date), a partir
+    do último fechamento anterior e dos movimentos seguintes. `produtos`
+    (ids) restringe a consulta. Produtos com saldo zero ficam de fora.
+    """
+    limite = inicio_do_dia(data, dias=1)
+    # Fechamento de `mes` vale até o início do mês seguinte, que deve ser <= limite
+    fechamentos = SaldoEstoque.objects.filter(empresa=empresa, mes__lt=_primeiro_dia(data + timedelta(days=1)))
+    cauda = MovimentoEstoque.objects.filter(empresa=empresa, criado_em__lt=limite)
+    if produtos is not None:
+        fechamentos = fechamentos.filter(produto_id__in=produtos)
+        cauda = cauda.filter(produto_id__in=produtos)
+
+    mes = fechamentos.aggregate(mes=Max("mes"))["mes"]
+    saldos = {}
+    if mes is not None:
+        saldos = dict(fechamentos.filter(mes=mes).values_list("produto_id", "saldo"))
+        cauda = cauda.filter(criado_em__gte=inicio_do_dia(_mes_seguinte(mes)))
+
+    for produto_id, quantidade in (
+        cauda.values("produto_id").annotate(total=Sum("quantidade")).values_list("produto_id", "total").order_by()
+    ):
+        saldos[produto_id] = saldos.get(produto_id, 0) + quantidade
+    return {produto_id: saldo for produto_id, saldo in saldos.items() if saldo}
+
+
+def inventario(empresa, data):
+    """
+    Inventário no fim do dia `data`: produtos com saldo, em ordem de nome,
+    valorizados pelo preço de cadastro (o sistema não guarda custo).
+    """
+    saldos = saldos_em(empresa, data)
+    linhas = []
+    # Sem id__in: dezenas de milhares de ids passam do limite de parâmetros do SQLite
+    for id_, codigo, nome, preco in (
+        Produto.objects.filter(empresa=empresa)
+        .order_by("nome")
+        .values_list("id", "codigo", "nome", "preco")
+        .iterator(chunk_size=5000)
+    ):
+        if id_ not in saldos:
+            continue
+        linhas.append({
+            "produto_id": id_,
+            "codigo": codigo,
+            "nome": nome,
+            "saldo": saldos[id_],
+            "preco": preco,
+            "valor": preco * saldos[id_],
+        })
+    return linhas
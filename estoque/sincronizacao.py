@@ -0,0 +1,114 @@
+"""
+Sincronização incremental do catálogo com o PDV (api/produtos/catalogo/).
+
+O PDV guarda uma cópia do catálogo da empresa (IndexedDB) e busca nela, sem
+ir ao servidor a cada tecla. Na primeira carga recebe o catálogo completo;
+depois, só o que mudou desde o cursor devolvido na resposta anterior:
+produtos com atualizado_em >= cursor e os ids excluídos (ProdutoRemovido).
+
+O cursor devolvido é a alteração mais recente vista (ou o horário da
+consulta, se for anterior) menos MARGEM_CURSOR, para não perder alterações
+de transações que confirmam fora de ordem; reenviar um produto já recebido
+é inofensivo (o PDV sobrescreve pelo id). Sem alterações desde o cursor, o
+próximo cursor é o mesmo, e o ETag (estado_catalogo) também: o PDV recebe 304.
+
+Funções principais:
+    estado_catalogo(empresa, desde=None) -> dict
+    delta_catalogo(empresa, desde=None) -> dict
+"""
+
+from datetime import timedelta
+
+from django.db.models import Count, Max, QuerySet
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Produto, ProdutoRemovido
+
+MARGEM_CURSOR = timedelta(seconds=5)
+CAMPOS = ["id", "codigo", "nome", "preco_unitario", "ncm", "estoque"]
+
+
+def ler_cursor(valor):
+    """Cursor ISO 8601 da resposta anterior; None (catálogo completo) se ausente ou inválido."""
+    try:
+        cursor = parse_datetime(valor or "")
+    except ValueError:
+        return None
+    if cursor is not None and timezone.is_naive(cursor):
+        cursor = timezone.make_aware(cursor)
+    return cursor
+
+
+def estado_catalogo(empresa, desde=None):
+    """
+    Quantos produtos e tombstones mudaram desde `desde` (tudo, sem cursor) e a
+    mais recente de cada, lidos do banco pelos índices (empresa, data). Base
+    do ETag e do próximo cursor: muda sempre que o delta de `desde` mudaria.
+    """
+    produtos = Produto.objects.filter(empresa=empresa)
+    removidos = ProdutoRemovido.objects.filter(empresa=empresa)
+    if desde is not None:
+        produtos = produtos.filter(atualizado_em__gte=desde)
+        removidos = removidos.filter(removido_em__gte=desde)
+    return {
+        **produtos.aggregate(produtos=Count("id"), ultimo_produto=Max("atualizado_em")),
+        **removidos.aggregate(removidos=Count("id"), ultimo_removido=Max("removido_em")),
+    }
+
+
+def _proximo_cursor(estado, desde):
+    agora = timezone.now()
+    alteracoes = [d for d in (estado["ultimo_produto"], estado["ultimo_removido"]) if d is not None]
+    if alteracoes:
+        referencia = min(max(alteracoes), agora)
+    else:
+        # Nada mudou desde o cursor: devolve o mesmo (o ETag fica igual)
+        referencia = desde + MARGEM_CURSOR if desde is not None else agora
+    return referencia - MARGEM_CURSOR
+
+
+def delta_catalogo(empresa, desde=None, estado=None):
+    """
+    Produtos (listas na ordem de CAMPOS, compactas e fáceis de comprimir)
+    alterados desde `desde`, ids removidos e o próximo cursor. Sem `desde`,
+    o catálogo inteiro (completo=True). `estado` evita recalcular o
+    estado_catalogo já lido para o ETag.
+    """
+    estado = estado_catalogo(empresa, desde) if estado is None else estado
+    cursor = _proximo_cursor(estado, desde)
+
+    produtos = Produto.objects.filter(empresa=empresa)
+    removidos = []
+    if desde is not None:
+        produtos = produtos.filter(atualizado_em__gte=desde)
+        removidos = list(
+            ProdutoRemovido.objects.filter(empresa=empresa, removido_em__gte=desde)
+            .values_list("produto_id", flat=True)
+        )
+
+    linhas = [
+        [id_, codigo, nome, float(preco), ncm, estoque]
+        for id_, codigo, nome, preco, ncm, estoque in produtos.order_by("id").values_list(
+            "id", "codigo", "nome", "preco", "ncm", "estoque_atual"
+        ).iterator(chunk_size=5000)
+    ]
+    return {
+        "completo": desde is None,
+        "cursor": cursor.isoformat(),
+        "campos": CAMPOS,
+        "produtos": linhas,
+        "removidos": removidos,
+    }
+
+
+# ─────────────────────────────────────────────
+# Sinal de Produto (conectado em EstoqueConfig.ready)
+# ─────────────────────────────────────────────
+
+def registrar_remocao(sender, instance, origin=None, **kwargs):
+    """Grava o tombstone de produto excluído (não quando a empresa inteira é excluída)."""
+    modelo_origem = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if modelo_origem is not Produto:
+        return
+    ProdutoRemovido.objects.create(empresa_id=instance.empresa_id, produto_id=instance.pk, codigo=instance.codigo)
@@ -1,3 +1,484 @@
-from django.test import TestCase
+"""
+Testes automatizados — Estoque
 
-# Create your tests here.
+Coberturas:
+1. Busca indexada de produtos (sem acento, prefixo primeiro)
+2. Leitura de código de barras (GTIN exato)
+3. Autocomplete (código exato ou busca textual)
+4. Sincronização incremental do catálogo (PDV)
+5. Razão de estoque e baixa na emissão
+6. Fechamento mensal e saldo de estoque em uma data
+7. Importação de produtos por CSV em lotes (upsert)
+"""
+
+import io
+import json
+import os
+import tempfile
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.models import Empresa, NotaFiscal, PerfilUsuario
+
+
+# ─────────────────────────────────────────────
+# Fixtures reutilizáveis
+# ─────────────────────────────────────────────
+
+def _empresa(cnpj='12345678000100', nome='Teste Ltda'):
+    return Empresa.objects.create(
+        nome=nome, nome_fantasia=nome, cnpj=cnpj,
+        crt='1', cep='65000000', logradouro='Rua A', numero='1',
+        bairro='Centro', cidade='São Luís', uf='MA',
+        cod_municipio='2111300', ambiente='homologacao', emissor_fiscal='nuvem',
+    )
+
+
+def _usuario(username, empresa):
+    u = User.objects.create_user(username=username, password='senha123')
+    PerfilUsuario.objects.create(user=u, empresa=empresa)
+    return u
+
+
+# ─────────────────────────────────────────────
+# 1. Busca indexada de produtos
+# ─────────────────────────────────────────────
+
+class BuscaProdutosTest(TestCase):
+
+    def setUp(self):
+        from estoque.models import Produto
+        self.empresa = _empresa()
+        _usuario('operador', self.empresa)
+        for codigo, nome in [('1', 'Açúcar Cristal 1kg'), ('2', 'Pão de Açúcar'), ('3', 'Cimento CP-II 50kg'),
+                             ('7891000100103', 'Tubo PVC 1/2')]:
+            Produto.objects.create(empresa=self.empresa, codigo=codigo, nome=nome, preco='5.00', ncm='12345678')
+        outra = _empresa(cnpj='99999999000199')
+        Produto.objects.create(empresa=outra, codigo='1', nome='Açúcar Mascavo', preco='5.00', ncm='12345678')
+
+    def _nomes(self, termo):
+        from estoque.busca import pesquisar_produtos
+        return [p.nome for p in pesquisar_produtos(self.empresa, termo)]
+
+    def test_sem_acento_e_prefixo_primeiro(self):
+        self.assertEqual(self._nomes('acucar'), ['Açúcar Cristal 1kg', 'Pão de Açúcar'])
+        self.assertEqual(self._nomes('AÇÚCAR pão'), ['Pão de Açúcar'])
+        self.assertEqual(self._nomes('1kg'), ['Açúcar Cristal 1kg'])  # palavra curta + dígito
+        self.assertEqual(self._nomes('7891000'), ['Tubo PVC 1/2'])     # pelo código
+        self.assertEqual(self._nomes('  '), [])
+
+    def test_so_palavras_curtas_busca_pelo_inicio(self):
+        self.assertEqual(self._nomes('ci'), ['Cimento CP-II 50kg'])
+        self.assertEqual(self._nomes('a'), ['Açúcar Cristal 1kg'])
+        self.assertEqual(self._nomes('de'), [])  # "Pão de Açúcar" só tem no meio
+        self.assertEqual(self._nomes('pa de'), ['Pão de Açúcar'])
+
+    def test_indice_acompanha_alteracoes(self):
+        from estoque.models import Produto
+        produto = Produto.objects.get(empresa=self.empresa, codigo='3')
+        produto.nome = 'Argamassa AC-III'
+        produto.save(update_fields=['nome'])
+        self.assertEqual(self._nomes('cimento'), [])
+        self.assertEqual(self._nomes('argamassa'), ['Argamassa AC-III'])
+        produto.delete()
+        self.assertEqual(self._nomes('argamassa'), [])
+
+    def test_apis_de_autocomplete(self):
+        client = Client()
+        client.login(username='operador', password='senha123')
+        resp = client.get(reverse('buscar_produtos'), {'q': 'acucar'})
+        self.assertEqual([p['nome'] for p in resp.json()], ['Açúcar Cristal 1kg', 'Pão de Açúcar'])
+
+
+# ─────────────────────────────────────────────
+# 2. Leitura de código de barras (GTIN exato)
+# ─────────────────────────────────────────────
+
+class CodigoDeBarrasTest(TestCase):
+
+    def setUp(self):
+        from estoque.models import Produto
+        self.empresa = _empresa()
+        _usuario('operador', self.empresa)
+        self.cimento = Produto.objects.create(empresa=self.empresa, codigo='7891234567895', nome='Cimento 50kg',
+                                              preco='35.00', ncm='25232910')
+        Produto.objects.create(empresa=self.empresa, codigo='17891234567892', nome='Cimento 50kg (fardo)',
+                               preco='350.00', ncm='25232910')
+        self.client = Client()
+        self.client.login(username='operador', password='senha123')
+
+    def test_gtin_em_uma_consulta(self):
+        from estoque.busca import produto_por_codigo_de_barras
+        with self.assertNumQueries(1):
+            self.assertEqual(produto_por_codigo_de_barras(self.empresa, '7891234567895'), self.cimento)
+        # GTIN-14 com zero à esquerda acha o EAN-13 cadastrado
+        self.assertEqual(produto_por_codigo_de_barras(self.empresa, '07891234567895'), self.cimento)
+        self.assertIsNone(produto_por_codigo_de_barras(self.empresa, '7890000000000'))
+        self.assertIsNone(produto_por_codigo_de_barras(self.empresa, 'cimento'))
+
+    def test_api_devolve_um_produto_exato_ou_cai_na_busca_textual(self):
+        resp = self.client.get(reverse('buscar_produtos'), {'q': '7891234567895'})
+        self.assertEqual([(p['nome'], p['exato']) for p in resp.json()], [('Cimento 50kg', True)])
+
+        resp = self.client.get(reverse('buscar_produtos'), {'q': '78912345'})  # formato EAN-8, sem cadastro
+        self.assertEqual(len(resp.json()), 2)
+        self.assertFalse(resp.json()[0]['exato'])
+
+
+# ─────────────────────────────────────────────
+# 3. Autocomplete (código exato ou busca textual)
+# ─────────────────────────────────────────────
+
+class AutocompleteTest(TestCase):
+
+    def setUp(self):
+        from estoque.models import Produto
+        self.empresa = _empresa()
+        for codigo, nome in [('7891234567895', 'Açúcar Cristal 1kg'), ('2', 'Pão de Açúcar'), ('3', 'Cimento 50kg')]:
+            Produto.objects.create(empresa=self.empresa, codigo=codigo, nome=nome, preco='5.90', ncm='12345678')
+
+    def test_uma_consulta_com_estoque_atual(self):
+        from estoque.busca import buscar
+        from estoque.models import Produto
+        from estoque.movimentos import registrar_movimentos
+
+        for termo in ['acucar', 'AÇÚCAR pão', '1kg', 'c', 'pa de', 'de', 'xyz']:
+            with self.assertNumQueries(1):
+                _, exato = buscar(self.empresa, termo)
+            self.assertFalse(exato)
+
+        cimento = Produto.objects.get(empresa=self.empresa, codigo='3')
+        registrar_movimentos(self.empresa.id, 'venda', {cimento.id: -7})
+        produtos, _ = buscar(self.empresa, 'cimento')
+        self.assertEqual([p.estoque_atual for p in produtos], [-7])
+
+        with self.assertNumQueries(1):
+            produtos, exato = buscar(self.empresa, '07891234567895')
+        self.assertTrue(exato)
+        self.assertEqual((produtos[0].nome, produtos[0].preco), ('Açúcar Cristal 1kg', Decimal('5.90')))
+
+
+# ─────────────────────────────────────────────
+# 4. Sincronização incremental do catálogo (PDV)
+# ─────────────────────────────────────────────
+
+class SincronizacaoCatalogoTest(TestCase):
+
+    def setUp(self):
+        from estoque.models import Produto
+        cache.clear()
+        self.empresa = _empresa()
+        _usuario('operador', self.empresa)
+        self.cimento = Produto.objects.create(empresa=self.empresa, codigo='1', nome='Cimento', preco='35.00', ncm='25232910')
+        self.areia = Produto.objects.create(empresa=self.empresa, codigo='2', nome='Areia', preco='80.00', ncm='25051000')
+        self.client = Client()
+        self.client.login(username='operador', password='senha123')
+        self.url = reverse('sincronizar_catalogo')
+
+    def test_completo_depois_delta_com_removidos(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from estoque.models import Produto
+
+        completo = self.client.get(self.url).json()
+        self.assertTrue(completo['completo'])
+        self.assertEqual(completo['campos'], ['id', 'codigo', 'nome', 'preco_unitario', 'ncm', 'estoque'])
+        self.assertEqual(completo['produtos'][0], [self.cimento.id, '1', 'Cimento', 35.0, '25232910', 0])
+
+        # Simula alterações feitas depois do cursor
+        Produto.objects.filter(id=self.cimento.id).update(atualizado_em=timezone.now() - timedelta(days=1))
+        self.areia.preco = '85.00'
+        self.areia.save()
+        removido_id = self.cimento.id
+        self.cimento.delete()
+
+        desde = (timezone.now() - timedelta(hours=1)).isoformat()
+        delta = self.client.get(self.url, {'desde': desde}).json()
+        self.assertFalse(delta['completo'])
+        self.assertEqual([p[2:4] for p in delta['produtos']], [['Areia', 85.0]])
+        self.assertEqual(delta['removidos'], [removido_id])
+
+    def test_etag_muda_com_o_catalogo(self):
+        resp = self.client.get(self.url)
+        etag = resp['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.areia.save()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_cursor_estavel_sem_alteracoes_e_304_no_delta(self):
+        from estoque.movimentos import registrar_movimentos
+
+        cursor = self.client.get(self.url).json()['cursor']
+        resp = self.client.get(self.url, {'desde': cursor})
+        self.assertEqual(resp.json()['cursor'], cursor)
+        self.assertEqual(self.client.get(self.url, {'desde': cursor}, HTTP_IF_NONE_MATCH=resp['ETag']).status_code, 304)
+
+        # Venda (UPDATE em massa, sem sinais) muda o estado lido do banco
+        registrar_movimentos(self.empresa.id, 'venda', {self.areia.id: -2})
+        resp = self.client.get(self.url, {'desde': cursor}, HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([p[5] for p in resp.json()['produtos'] if p[0] == self.areia.id], [-2])
+
+    def test_excluir_empresa_nao_gera_tombstones(self):
+        from estoque.models import ProdutoRemovido
+        self.empresa.delete()
+        self.assertFalse(ProdutoRemovido.objects.exists())
+
+
+# ─────────────────────────────────────────────
+# 5. Razão de estoque e baixa na emissão
+# ─────────────────────────────────────────────
+
+class MovimentoEstoqueTest(TestCase):
+
+    def setUp(self):
+        from estoque.models import Produto
+        self.empresa = _empresa()
+        _usuario('operador', self.empresa)
+        self.arroz = Produto.objects.create(empresa=self.empresa, codigo='1', nome='Arroz', preco='5.00',
+                                            ncm='10063021', estoque_atual=100)
+        self.feijao = Produto.objects.create(empresa=self.empresa, codigo='2', nome='Feijão', preco='8.00',
+                                             ncm='07133319', estoque_atual=50)
+        self.client = Client()
+        self.client.login(username='operador', password='senha123')
+
+    def _emitir(self, itens):
+        resposta_mock = {'id': 'nfc_1', 'numero': 1, 'serie': 2, 'chave': 'a' * 44}
+        with patch('core.fiscal_router.FiscalRouter.emitir_nfce', return_value=(True, resposta_mock, 10.0)):
+            resp = self.client.post(
+                reverse('emitir_nota'),
+                data=json.dumps({'itens': itens, 'forma_pagamento': '01'}),
+                content_type='application/json',
+            )
+        return NotaFiscal.objects.get(id=resp.json()['id_nota'])
+
+    def _saldos(self):
+        self.arroz.refresh_from_db()
+        self.feijao.refresh_from_db()
+        return self.arroz.estoque_atual, self.feijao.estoque_atual
+
+    def test_emissao_baixa_estoque_e_cancelamento_devolve(self):
+        from estoque.models import MovimentoEstoque
+        from estoque.movimentos import estornar_estoque_venda
+
+        item = {'nome': 'x', 'preco_unitario': 5.0, 'valor_total': 5.0, 'ncm': '10063021'}
+        nota = self._emitir([
+            {**item, 'id': self.arroz.id, 'quantidade': 2},
+            {**item, 'id': self.feijao.id, 'quantidade': 1},
+            {**item, 'id': self.arroz.id, 'quantidade': 3},
+        ])
+        self.assertEqual(self._saldos(), (95, 49))
+        vendas = MovimentoEstoque.objects.filter(nota=nota, tipo=MovimentoEstoque.VENDA)
+        self.assertEqual(sorted(vendas.values_list('produto_id', 'quantidade')),
+                         [(self.arroz.id, -5), (self.feijao.id, -1)])
+
+        estornar_estoque_venda(nota)
+        self.assertEqual(self._saldos(), (100, 50))
+
+    def test_falha_no_estorno_nao_desfaz_cancelamento_na_sefaz(self):
+        from types import SimpleNamespace
+        from core.sefaz_service import SefazService
+
+        item = {'nome': 'x', 'preco_unitario': 5.0, 'valor_total': 5.0, 'ncm': '10063021'}
+        nota = self._emitir([{**item, 'id': self.arroz.id, 'quantidade': 2}])
+        nota.protocolo_autorizacao = '1' * 15
+        evento = SimpleNamespace(infEvento=SimpleNamespace(cStat='135', xMotivo='ok', nProt='2' * 15))
+        edoc = MagicMock()
+        edoc.enviar_lote_evento.return_value = SimpleNamespace(
+            resposta=SimpleNamespace(cStat='128', retEvento=[evento]), processo_xml='<procEventoNFe/>',
+        )
+
+        with patch.object(SefazService, '_get_edoc', return_value=edoc), \
+                patch('core.sefaz_service.estornar_estoque_venda', side_effect=RuntimeError('banco')), \
+                self.assertLogs('core.sefaz_service', 'ERROR'):
+            ok, _ = SefazService.cancelar_nfce(self.empresa, nota, 'Cliente desistiu da compra')
+
+        self.assertTrue(ok)
+        nota.refresh_from_db()
+        self.assertEqual((nota.status, nota.protocolo_cancelamento), ('cancelado', '2' * 15))
+        self.assertEqual(self._saldos(), (98, 50))  # estorno pendente, para correção manual
+
+    def test_baixa_do_carrinho_em_duas_consultas(self):
+        from estoque.movimentos import baixar_estoque_venda
+        from core.models import NotaFiscalItem
+
+        nota = NotaFiscal.objects.create(empresa=self.empresa, numero=1, serie=1, valor_total=10, status='AUTORIZADA')
+        itens = [
+            NotaFiscalItem(nota=nota, produto=self.arroz, codigo='1', descricao='Arroz', quantidade=Decimal('1.6'),
+                           valor_unitario=5, valor_total=8),
+            NotaFiscalItem(nota=nota, produto=self.feijao, codigo='2', descricao='Feijão', quantidade=4,
+                           valor_unitario=8, valor_total=32),
+        ]
+        # bulk_create dos movimentos + um único UPDATE ... CASE para os saldos
+        with self.assertNumQueries(2):
+            baixar_estoque_venda(nota, itens)
+        self.assertEqual(self._saldos(), (98, 46))
+
+    def test_estoque_digitado_entra_no_razao(self):
+        from django.db.models import Sum
+
+        self.arroz.estoque_atual = 80
+        self.arroz.save()
+        self.arroz.save(update_fields=['preco'])
+
+        movimentos = self.arroz.movimentos.order_by('id')
+        self.assertEqual(list(movimentos.values_list('tipo', 'quantidade')), [('entrada', 100), ('ajuste', -20)])
+        self.assertEqual(movimentos.aggregate(saldo=Sum('quantidade'))['saldo'], 80)
+
+    def test_edicao_nao_sobrescreve_venda_confirmada_depois_da_leitura(self):
+        from django.db.models import Sum
+        from estoque.models import Produto
+
+        produto = Produto.objects.get(id=self.feijao.id)
+        item = {'nome': 'x', 'preco_unitario': 8.0, 'valor_total': 8.0, 'ncm': '07133319'}
+        self._emitir([{**item, 'id': self.feijao.id, 'quantidade': 3}])  # 50 -> 47
+
+        # Cadastro lido antes da venda: nome editado e estoque contado 50 -> 60
+        produto.nome = 'Feijão Carioca'
+        produto.estoque_atual = 60
+        produto.save()
+        self.assertEqual(produto.estoque_atual, 57)
+        self.assertEqual(self._saldos()[1], 57)
+        self.assertEqual(self.feijao.movimentos.aggregate(saldo=Sum('quantidade'))['saldo'], 57)
+
+        # Só o nome: o estoque lido (57) não volta para o banco
+        Produto.objects.filter(id=self.feijao.id).update(estoque_atual=55)
+        produto.nome = 'Feijão'
+        produto.save()
+        self.assertEqual(self._saldos()[1], 55)
+
+    def test_produto_com_movimentos_nao_e_excluido(self):
+        from estoque.models import Produto
+        resp = self.client.post(reverse('deletar_produto', args=[self.arroz.id]))
+        self.assertEqual(resp.status_code, 302)
+        self.assertTrue(Produto.objects.filter(id=self.arroz.id).exists())
+        self.assertEqual(self.arroz.movimentos.count(), 1)
+
+
+# ─────────────────────────────────────────────
+# 6. Fechamento mensal e saldo de estoque em uma data
+# ─────────────────────────────────────────────
+
+class SaldoEstoqueTest(TestCase):
+
+    def setUp(self):
+        from datetime import date
+        from estoque.models import MovimentoEstoque, Produto
+        from core.utils import inicio_do_dia
+        self.empresa = _empresa()
+        self.arroz = Produto.objects.create(empresa=self.empresa, codigo='1', nome='Arroz', preco='5.00', ncm='10063021')
+        self.feijao = Produto.objects.create(empresa=self.empresa, codigo='2', nome='Feijão', preco='8.00', ncm='07133319')
+
+        # (dia, produto, quantidade): entradas em janeiro, vendas em fevereiro e março
+        for dia, produto, quantidade in [
+            (date(2026, 1, 10), self.arroz, 100), (date(2026, 1, 31), self.feijao, 40),
+            (date(2026, 2, 1), self.arroz, -30), (date(2026, 2, 20), self.feijao, -40),
+            (date(2026, 3, 5), self.arroz, -10),
+        ]:
+            movimento = MovimentoEstoque.objects.create(empresa=self.empresa, produto=produto, tipo='ajuste',
+                                                        quantidade=quantidade)
+            MovimentoEstoque.objects.filter(id=movimento.id).update(criado_em=inicio_do_dia(dia))
+
+    def test_fechamento_soma_fechamento_anterior_e_movimentos_do_mes(self):
+        from datetime import date
+        from estoque.models import SaldoEstoque
+        from estoque.saldos import fechar_meses
+
+        self.assertEqual(len(fechar_meses(ate=date(2026, 2, 1))), 2)
+        fechamentos = SaldoEstoque.objects.order_by('mes', 'produto_id').values_list('mes', 'produto_id', 'saldo')
+        self.assertEqual(list(fechamentos), [
+            (date(2026, 1, 1), self.arroz.id, 100), (date(2026, 1, 1), self.feijao.id, 40),
+            (date(2026, 2, 1), self.arroz.id, 70),  # feijão zerado não tem linha
+        ])
+        # Só meses pendentes: nada a refazer até fevereiro
+        self.assertEqual(fechar_meses(ate=date(2026, 2, 1)), [])
+
+    def test_recusa_fechar_mes_corrente(self):
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        from django.utils import timezone
+        from estoque.models import SaldoEstoque
+
+        with self.assertRaises(CommandError):
+            call_command('fechar_estoque', ate=f'{timezone.localdate():%Y-%m}', stdout=io.StringIO())
+        self.assertFalse(SaldoEstoque.objects.exists())
+
+    def test_saldo_na_data_usa_fechamento_mais_cauda(self):
+        from datetime import date
+        from estoque.saldos import fechar_meses, inventario, saldos_em
+
+        sem_fechamento = {d: saldos_em(self.empresa, d) for d in (date(2026, 1, 31), date(2026, 3, 10))}
+        fechar_meses(ate=date(2026, 2, 1))
+
+        self.assertEqual(saldos_em(self.empresa, date(2026, 1, 31)), {self.arroz.id: 100, self.feijao.id: 40})
+        self.assertEqual(saldos_em(self.empresa, date(2026, 2, 10)), {self.arroz.id: 70, self.feijao.id: 40})
+        with self.assertNumQueries(3):
+            self.assertEqual(saldos_em(self.empresa, date(2026, 3, 10)), {self.arroz.id: 60})
+        self.assertEqual(sem_fechamento[date(2026, 3, 10)], saldos_em(self.empresa, date(2026, 3, 10)))
+        self.assertEqual(sem_fechamento[date(2026, 1, 31)], saldos_em(self.empresa, date(2026, 1, 31)))
+
+        [linha] = inventario(self.empresa, date(2026, 3, 31))
+        self.assertEqual((linha['nome'], linha['saldo'], linha['valor']), ('Arroz', 60, Decimal('300.00')))
+
+
+# ─────────────────────────────────────────────
+# 7. Importação de produtos por CSV em lotes (upsert)
+# ─────────────────────────────────────────────
+
+class ImportarCsvTest(TestCase):
+
+    CABECALHO = 'Código de Barras;Descrição;NCM;Preço Venda Varejo;Quantidade em Estoque\n'
+
+    def setUp(self):
+        from estoque.models import Produto
+        self.empresa = _empresa()
+        self.existente = Produto.objects.create(empresa=self.empresa, codigo='789001', nome='Cimento', preco='30.00',
+                                                ncm='25232910', estoque_atual=10)
+        self.pasta = tempfile.mkdtemp()
+        self.arquivo = os.path.join(self.pasta, 'Produtos.csv')
+
+    def _importar(self, linhas, **opcoes):
+        from django.core.management import call_command
+        with open(self.arquivo, 'w', encoding='utf-8-sig') as f:
+            f.write(self.CABECALHO + ''.join(linhas))
+        saida = io.StringIO()
+        call_command('importar_csv', self.empresa.id, arquivo=self.arquivo, stdout=saida, **opcoes)
+        return saida.getvalue()
+
+    def test_upsert_em_lotes_com_arquivo_de_erros(self):
+        from estoque.models import Produto
+        saida = self._importar([
+            '789001;Cimento Votoran 50kg;2523.29.10;35,90;25\n',
+            '789002;Açúcar Cristal;1701.14.00;4,50;3\n',
+            '789002;Açúcar Cristal 1kg;17011400;4,79;8\n',  # repetido no lote: vale a última
+            '789003;Sem preço;17011400;abc;1\n',
+            ';Sem código;17011400;1,00;1\n',
+        ], lote=4)
+
+        self.assertIn('Concluído! Importados para Teste Ltda: 1 novos | 1 atualizados | 2 rejeitados', saida)
+        self.assertIn('linhas/s', saida)
+
+        self.existente.refresh_from_db()
+        self.assertEqual((self.existente.nome, self.existente.preco, self.existente.estoque_atual),
+                         ('Cimento Votoran 50kg', Decimal('35.90'), 25))
+        self.assertEqual(self.existente.texto_busca, 'cimento votoran 50kg 789001')
+        acucar = Produto.objects.get(empresa=self.empresa, codigo='789002')
+        self.assertEqual((acucar.nome, acucar.texto_busca, acucar.estoque_atual),
+                         ('Açúcar Cristal 1kg', 'acucar cristal 1kg 789002', 8))
+
+        # Estoque do CSV lançado no razão: ajuste do existente, entrada do novo
+        self.assertEqual(list(self.existente.movimentos.order_by('id').values_list('tipo', 'quantidade')),
+                         [('entrada', 10), ('ajuste', 15)])
+        self.assertEqual(list(acucar.movimentos.values_list('tipo', 'quantidade')), [('entrada', 8)])
+
+        with open(os.path.join(self.pasta, 'Produtos.erros.csv'), encoding='utf-8-sig') as f:
+            erros = f.read().splitlines()
+        self.assertEqual(erros[0], self.CABECALHO.strip() + ';Motivo')
+        self.assertEqual([linha.split(';')[0] for linha in erros[1:]], ['789003', ''])
+        self.assertIn('Código de barras vazio', erros[2])
@@ -1,19 +1,27 @@
+import hashlib
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import JsonResponse
 from django.views.generic import ListView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q
+from django.db.models import Q, RestrictedError
+from django.utils.decorators import method_decorator
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition
 from .models import Produto
+from .busca import buscar
+from .sincronizacao import delta_catalogo, estado_catalogo, ler_cursor
 from .forms import ProdutoForm
 from core.services import get_empresa_usuario
 from core.utils import simular_carrinho_inteligente
+from core.db_router import leitura_em_replica
 
 # ==================================================
 # 1. VIEWS DE PÁGINA (HTML) - Catálogo e CRUD
 # ==================================================
 
+@method_decorator(leitura_em_replica, name='dispatch')
 class ProdutoListView(LoginRequiredMixin, ListView):
     model = Produto
     template_name = 'produtos.html'
@@ -92,7 +100,12 @@ def deletar_produto(request, id):
     produto = get_object_or_404(Produto, id=id, empresa=empresa)
     
     if request.method == 'POST':
-        produto.delete()
+        try:
+            produto.delete()
+        except RestrictedError:
+            # O razão de estoque guarda o histórico do produto
+            messages.error(request, 'Produto com movimentos de estoque não pode ser excluído.')
+            return redirect('listar_produtos')
         messages.success(request, 'Produto excluído com sucesso!')
         return redirect('listar_produtos')
         
@@ -131,21 +144,49 @@ def buscar_produtos(request):
     # Aceita 'q' (do select2) ou 'termo' (do autocomplete antigo)
     termo = request.GET.get('q', request.GET.get('termo', ''))
     
-    if termo:
-        produtos = Produto.objects.filter(
-            Q(nome__icontains=termo) | 
-            Q(codigo__icontains=termo),
-            empresa=empresa
-        )[:20]
-    else:
-        produtos = []
+    # Código de barras exato ou busca textual indexada, numa consulta ao banco
+    produtos, exato = buscar(empresa, termo, limite=20)
     
     data = [{
         'id': p.id, 
         'nome': p.nome, 
         'preco_unitario': p.preco, 
         'estoque': p.estoque_atual,
-        'ncm': p.ncm
+        'ncm': p.ncm,
+        'exato': exato,
     } for p in produtos]
     
-    return JsonResponse(data, safe=False)
\ No newline at end of file
+    return JsonResponse(data, safe=False)
+
+
+def _etag_catalogo(request):
+    """
+    Estado do catálogo no banco desde o cursor do pedido (quantidade e data
+    das alterações e exclusões), junto com o próprio cursor: 304 só quando a
+    resposta para esse cursor seria a mesma que o PDV já tem.
+    """
+    empresa = get_empresa_usuario(request)
+    if not empresa:
+        return None
+    desde = ler_cursor(request.GET.get('desde'))
+    estado = estado_catalogo(empresa, desde)
+    request.estado_catalogo = estado
+    assinatura = ":".join(str(v) for v in (empresa.id, desde, *sorted(estado.items())))
+    return hashlib.md5(assinatura.encode()).hexdigest()
+
+
+@login_required
+@gzip_page
+@condition(etag_func=_etag_catalogo)
+def sincronizar_catalogo(request):
+    """
+    Catálogo da empresa para a cópia local do PDV (estoque.sincronizacao):
+    completo sem ?desde=, ou só as alterações desde o cursor anterior.
+    Responde 304 quando nada mudou (If-None-Match).
+    """
+    empresa = get_empresa_usuario(request)
+    if not empresa:
+        return JsonResponse({'error': 'Usuário sem empresa configurada'}, status=403)
+
+    desde = ler_cursor(request.GET.get('desde'))
+    return JsonResponse(delta_catalogo(empresa, desde, getattr(request, 'estado_catalogo', None)))
@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+import tempfile
 import dj_database_url
 from decouple import config
 
@@ -44,6 +45,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.db_router.ReplicaMiddleware', # Leituras "grudam" no principal logo após uma escrita
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -88,6 +90,21 @@ if config('DATABASE_URL', default=None):
         ssl_require=True
     )
 
+# Réplica somente-leitura para relatórios e exportações (opcional).
+# Localmente dá para simular com outro SQLite: DATABASE_REPLICA_URL=sqlite:///replica.sqlite3
+if config('DATABASE_REPLICA_URL', default=None):
+    DATABASES['replica'] = dj_database_url.config(
+        default=config('DATABASE_REPLICA_URL'),
+        conn_max_age=600,
+    )
+    # Nos testes a réplica aponta para o mesmo banco de teste do principal
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+
+# Segundos após uma escrita em que a sessão continua lendo do principal
+REPLICA_LAG_TOLERANCE = config('REPLICA_LAG_TOLERANCE', default=5, cast=int)
+
 # ==================================================
 # 5. INTERNACIONALIZAÇÃO (TRADUÇÃO E HORÁRIO)
 # ==================================================
@@ -109,11 +126,28 @@ STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
 
+# Destino dos XMLs arquivados (core.arquivo_xml), que precisam ser guardados por 5 anos.
+# Sem XML_ARQUIVO_DIR (disco persistente montado) ou outro backend em XML_ARQUIVO_STORAGE
+# (ex.: storages.backends.s3.S3Storage), arquivar_xmls se recusa a tirar XMLs do banco.
+# Só o disco recebe `location`; outros backends leem as próprias settings (AWS_STORAGE_BUCKET_NAME...).
+XML_ARQUIVO_DIR = config('XML_ARQUIVO_DIR', default='')
+XML_ARQUIVO_STORAGE = config('XML_ARQUIVO_STORAGE', default='django.core.files.storage.FileSystemStorage')
+XML_ARQUIVO_OPTIONS = (
+    {"location": XML_ARQUIVO_DIR or str(BASE_DIR / 'arquivo_xml')}
+    if XML_ARQUIVO_STORAGE == 'django.core.files.storage.FileSystemStorage'
+    else {}
+)
+
 # Configuração do WhiteNoise para compressão de arquivos
 STORAGES = {
     "staticfiles": {
         "BACKEND": "whitenoise.storage.CompressedStaticFilesStorage",
     },
+    # XMLs de notas antigas tirados do banco (core.arquivo_xml)
+    "arquivo_xml": {
+        "BACKEND": XML_ARQUIVO_STORAGE,
+        "OPTIONS": XML_ARQUIVO_OPTIONS,
+    },
 }
 
 # ==================================================
@@ -128,4 +162,44 @@ LOGIN_URL = 'login' # URL da página de login
 # ==================================================
 # Chave separada de SECRET_KEY para cifrar certificados A1, senhas PFX e CSC.
 # Rotacionar SECRET_KEY não invalida certificados em repouso.
-FIELD_ENCRYPTION_KEY = config('FIELD_ENCRYPTION_KEY', default='')
\ No newline at end of file
+FIELD_ENCRYPTION_KEY = config('FIELD_ENCRYPTION_KEY', default='')
+
+# ==================================================
+# 9. EXPORTAÇÃO EM LOTE DE DANFEs
+# ==================================================
+# Processos usados para renderizar DANFEs em lote (1 = sem pool, na própria requisição).
+DANFE_LOTE_WORKERS = config('DANFE_LOTE_WORKERS', default=2, cast=int)
+
+# ==================================================
+# 10. CACHE DE DANFEs
+# ==================================================
+# Tempo (segundos) que o DANFE gerado na primeira impressão fica no cache.
+DANFE_CACHE_TIMEOUT = config('DANFE_CACHE_TIMEOUT', default=60 * 60 * 24, cast=int)
+
+# Cópia local dos PDFs baixados da Nuvem Fiscal (em serverless, só /tmp é gravável).
+NUVEM_PDF_CACHE_DIR = config('NUVEM_PDF_CACHE_DIR', default=os.path.join(tempfile.gettempdir(), 'mateco', 'nuvem_pdf'))
+# Dias que um PDF fica no cache, tamanho máximo do cache (MB) e espera (segundos) por outro
+# download do mesmo PDF antes de baixar sem cache.
+NUVEM_PDF_CACHE_DIAS = config('NUVEM_PDF_CACHE_DIAS', default=30, cast=int)
+NUVEM_PDF_CACHE_MAX_MB = config('NUVEM_PDF_CACHE_MAX_MB', default=200, cast=int)
+NUVEM_PDF_TRAVA_TIMEOUT = config('NUVEM_PDF_TRAVA_TIMEOUT', default=30, cast=int)
+
+# ==================================================
+# 11. DASHBOARD DE VENDAS
+# ==================================================
+# Tempo (segundos) das séries de vendas em cache; novas notas invalidam antes disso.
+DASHBOARD_CACHE_TIMEOUT = config('DASHBOARD_CACHE_TIMEOUT', default=60 * 60, cast=int)
+
+# ==================================================
+# 12. ARQUIVO DE XMLs ANTIGOS
+# ==================================================
+# Idade (dias) a partir da qual o comando arquivar_xmls tira o XML da nota do banco.
+# O destino (XML_ARQUIVO_DIR / XML_ARQUIVO_STORAGE) fica junto de STORAGES, na seção 6.
+XML_ARQUIVO_DIAS = config('XML_ARQUIVO_DIAS', default=180, cast=int)
+
+# ==================================================
+# 13. PACOTE DE XMLs DO CONTADOR
+# ==================================================
+# XMLs da NuvemFiscal baixados na própria requisição antes do ZIP começar (limite de tempo
+# do serverless); o comando exportar_xmls_mes baixa todos.
+XML_CONTADOR_DOWNLOADS_NA_REQUISICAO = config('XML_CONTADOR_DOWNLOADS_NA_REQUISICAO', default=40, cast=int)
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.urls import path, include
-from estoque.views import ProdutoListView, buscar_produtos, criar_produto, editar_produto, deletar_produto
+from estoque.views import ProdutoListView, buscar_produtos, criar_produto, editar_produto, deletar_produto, sincronizar_catalogo
 from core.views import *
 
 """
@@ -35,6 +35,9 @@ urlpatterns = [
     # Histórico e listagem de notas fiscais
     path('notas/', listar_notas, name='listar_notas'),
     
+    # Ranking de produtos vendidos e curva ABC
+    path('relatorios/produtos/', relatorio_produtos, name='relatorio_produtos'),
+
     # Estoque (Nova Rota)
     path('produtos/', ProdutoListView.as_view(), name='listar_produtos'),
     path('produto/novo/', criar_produto, name='criar_produto'),
@@ -46,15 +49,31 @@ urlpatterns = [
     # ==================================================
     # Busca de produtos e simulação de carrinho
     path('api/produtos/', buscar_produtos, name='buscar_produtos'),
+
+    # Catálogo (completo ou incremental) para a busca local do PDV
+    path('api/produtos/catalogo/', sincronizar_catalogo, name='sincronizar_catalogo'),
     
     # Processamento de emissão de NFC-e na Nuvem Fiscal
     path('emitir-nota/', emitir_nota, name='emitir_nota'), 
     
+    # Séries de vendas do dashboard (home)
+    path('api/vendas/serie/', api_serie_vendas, name='api_serie_vendas'),
+
     # Verifcar notas:
     path('verificar_nota/', verificar_status_nota, name='verificar_nota'),
     
     # Geração e download do PDF da nota fiscal
     path('imprimir-nota/<int:nota_id>/', imprimir_nota, name='imprimir_nota'),
+    path('imprimir-nota/<int:nota_id>/escpos/', imprimir_nota_escpos, name='imprimir_nota_escpos'),
+
+    # Download em lote dos DANFEs filtrados (ZIP em streaming)
+    path('notas/danfes/', exportar_danfes, name='exportar_danfes'),
+
+    # Exportação das notas filtradas em CSV/XLSX (streaming)
+    path('notas/exportar/', exportar_notas, name='exportar_notas'),
+
+    # XMLs do mês para o contador (ZIP em streaming, somente staff)
+    path('notas/xmls/', exportar_xmls_mes, name='exportar_xmls_mes'),
     
     # Configurações fiscais da empresa
     path('configuracoes/', configuracoes, name='configuracoes'),
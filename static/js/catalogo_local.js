@@ -0,0 +1,144 @@
+/**
+ * ============================================================================
+ * MATECO SISTEMAS - CATÁLOGO LOCAL DO PDV
+ * * Mantém uma cópia do catálogo da empresa no IndexedDB e busca nela:
+ * 1. Carrega a cópia salva e sincroniza com /api/produtos/catalogo/
+ *    (completo na primeira vez, depois só as alterações desde o cursor).
+ * 2. Ressincroniza periodicamente (ETag: 304 quando nada mudou).
+ * 3. Expõe CatalogoLocal.buscar(termo) e CatalogoLocal.porCodigo(codigo);
+ *    ambos devolvem null enquanto a cópia não está pronta (usar a API).
+ * ============================================================================
+ */
+
+const CatalogoLocal = (() => {
+    const empresaId = document.currentScript.dataset.empresa;
+    const URL_CATALOGO = '/api/produtos/catalogo/';
+    const INTERVALO_SYNC_MS = 60 * 1000;
+    const LIMITE = 20;
+
+    let produtos = null;   // Map id -> produto (mesmo formato da API de busca)
+    let porCodigo = new Map();
+    let estado = { cursor: null, etag: null };
+
+    // Mesma normalização do servidor: minúsculas, sem acentos e com espaços simples
+    const normalizar = (texto) => (texto || '').normalize('NFKD').replace(/[\u0300-\u036f]/g, '').toLowerCase()
+        .split(/\s+/).filter(Boolean).join(' ');
+
+    // ------------------------------------------------------------------
+    // IndexedDB (um registro por empresa)
+    // ------------------------------------------------------------------
+    function abrirBanco() {
+        return new Promise((resolve, reject) => {
+            const req = indexedDB.open('mateco_catalogo', 1);
+            req.onupgradeneeded = () => req.result.createObjectStore('catalogos');
+            req.onsuccess = () => resolve(req.result);
+            req.onerror = () => reject(req.error);
+        });
+    }
+
+    async function lerCopia() {
+        const db = await abrirBanco();
+        return new Promise((resolve) => {
+            const req = db.transaction('catalogos').objectStore('catalogos').get(empresaId);
+            req.onsuccess = () => resolve(req.result || null);
+            req.onerror = () => resolve(null);
+        });
+    }
+
+    async function salvarCopia() {
+        const db = await abrirBanco();
+        db.transaction('catalogos', 'readwrite').objectStore('catalogos')
+            .put({ ...estado, produtos: Array.from(produtos.values()) }, empresaId);
+    }
+
+    // ------------------------------------------------------------------
+    // Sincronização
+    // ------------------------------------------------------------------
+    function indexar(prod) {
+        prod.texto = normalizar(`${prod.nome} ${prod.codigo}`);
+        produtos.set(prod.id, prod);
+        porCodigo.set(prod.codigo, prod);
+    }
+
+    async function sincronizar() {
+        const url = estado.cursor ? `${URL_CATALOGO}?desde=${encodeURIComponent(estado.cursor)}` : URL_CATALOGO;
+        const headers = estado.etag ? { 'If-None-Match': estado.etag } : {};
+        const res = await fetch(url, { headers, cache: 'no-store' });
+        if (res.status === 304 || !res.ok) return;
+
+        const dados = await res.json();
+        if (dados.completo || !produtos) {
+            produtos = new Map();
+            porCodigo = new Map();
+        }
+        dados.removidos.forEach(id => {
+            const prod = produtos.get(id);
+            if (prod) porCodigo.delete(prod.codigo);
+            produtos.delete(id);
+        });
+        dados.produtos.forEach(linha => {
+            const prod = {};
+            dados.campos.forEach((campo, i) => { prod[campo] = linha[i]; });
+            const anterior = produtos.get(prod.id);
+            if (anterior) porCodigo.delete(anterior.codigo);
+            indexar(prod);
+        });
+
+        estado = { cursor: dados.cursor, etag: res.headers.get('ETag') };
+        await salvarCopia();
+    }
+
+    async function iniciar() {
+        if (!empresaId || !window.indexedDB) return;
+        try {
+            const copia = await lerCopia();
+            if (copia) {
+                produtos = new Map();
+                copia.produtos.forEach(indexar);
+                estado = { cursor: copia.cursor, etag: copia.etag };
+            }
+            await sincronizar();
+        } catch (error) {
+            console.error('Falha ao sincronizar o catálogo local', error);
+        }
+        setInterval(() => sincronizar().catch(error => console.error('Falha ao sincronizar o catálogo local', error)),
+                    INTERVALO_SYNC_MS);
+    }
+
+    // ------------------------------------------------------------------
+    // Busca (mesmas regras da API, estoque.busca: todas as palavras,
+    // prefixo primeiro; só palavras de 1-2 letras -> só quem começa pelo
+    // termo, em ordem alfabética do texto normalizado)
+    // ------------------------------------------------------------------
+    function buscar(termo) {
+        if (!produtos) return null;
+        const palavras = normalizar(termo).split(' ').filter(Boolean);
+        if (!palavras.length) return [];
+        const primeira = palavras[0];
+        const soCurtas = palavras.every(p => p.length < 3);
+
+        const encontrados = [];
+        for (const prod of produtos.values()) {
+            if (soCurtas && !prod.texto.startsWith(primeira)) continue;
+            if (palavras.every(p => prod.texto.includes(p))) encontrados.push(prod);
+        }
+        if (soCurtas) {
+            // Mesma ordem do índice (empresa, texto_busca) do banco
+            encontrados.sort((a, b) => (a.texto < b.texto ? -1 : a.texto > b.texto ? 1 : 0));
+        } else {
+            encontrados.sort((a, b) =>
+                (b.texto.startsWith(primeira) - a.texto.startsWith(primeira)) ||
+                (a.texto.length - b.texto.length) ||
+                a.nome.localeCompare(b.nome));
+        }
+        return encontrados.slice(0, LIMITE);
+    }
+
+    function buscarPorCodigo(codigo) {
+        if (!produtos) return null;
+        return porCodigo.get(codigo.trim()) || null;
+    }
+
+    iniciar();
+    return { buscar, porCodigo: buscarPorCodigo };
+})();
@@ -43,41 +43,82 @@ if (buscaInput) {
             return;
         }
 
+        // Cópia local do catálogo (catalogo_local.js); sem ela, busca no backend
+        const locais = window.CatalogoLocal ? CatalogoLocal.buscar(termo) : null;
+        if (locais) {
+            renderizarSugestoes(locais);
+            return;
+        }
+
         try {
             // Busca produtos no backend (Django)
             const res = await fetch(`/api/produtos/?q=${termo}`);
             if (!res.ok) throw new Error('Erro na busca');
-            
-            const produtos = await res.json();
-            listaSugestoes.innerHTML = '';
-
-            // Renderiza a lista de sugestões
-            if (produtos.length > 0) {
-                listaSugestoes.style.display = 'block';
-                produtos.forEach(prod => {
-                    const div = document.createElement('div');
-                    div.className = 'sugestao-item';
-                    div.innerHTML = `
-                        <div style="flex:1">
-                            <div style="font-weight:bold">${prod.nome}</div>
-                            <small style="color:#777">R$ ${prod.preco_unitario.toFixed(2)} | Est: ${prod.estoque}</small>
-                        </div>
-                        <div style="font-weight:bold; color:#2980b9; font-size: 1.2em;">+</div>
-                    `;
-                    // Define ação de clique para abrir modal de quantidade
-                    div.onclick = () => { abrirModalQtd(prod); };
-                    listaSugestoes.appendChild(div);
-                });
-            } else {
-                listaSugestoes.innerHTML = '<div style="padding: 10px; color: #999; text-align: center;">Nenhum produto encontrado.</div>';
-                listaSugestoes.style.display = 'block';
-            }
+
+            renderizarSugestoes(await res.json());
         } catch (error) {
             console.error("Falha ao buscar produtos", error);
         }
     });
 }
 
+/**
+ * Renderiza a lista de sugestões do autocomplete.
+ * @param {Array} produtos - Produtos no formato da API de busca.
+ */
+function renderizarSugestoes(produtos) {
+    listaSugestoes.innerHTML = '';
+
+    if (produtos.length > 0) {
+        listaSugestoes.style.display = 'block';
+        produtos.forEach(prod => {
+            const div = document.createElement('div');
+            div.className = 'sugestao-item';
+            div.innerHTML = `
+                <div style="flex:1">
+                    <div style="font-weight:bold">${prod.nome}</div>
+                    <small style="color:#777">R$ ${Number(prod.preco_unitario).toFixed(2)} | Est: ${prod.estoque}</small>
+                </div>
+                <div style="font-weight:bold; color:#2980b9; font-size: 1.2em;">+</div>
+            `;
+            // Define ação de clique para abrir modal de quantidade
+            div.onclick = () => { abrirModalQtd(prod); };
+            listaSugestoes.appendChild(div);
+        });
+    } else {
+        listaSugestoes.innerHTML = '<div style="padding: 10px; color: #999; text-align: center;">Nenhum produto encontrado.</div>';
+        listaSugestoes.style.display = 'block';
+    }
+}
+
+/**
+ * Leitor de código de barras: digita o código e envia Enter.
+ * Se a API achar o produto pelo código exato, abre direto o modal de quantidade.
+ */
+if (buscaInput) {
+    buscaInput.addEventListener('keydown', async (e) => {
+        const termo = e.target.value.trim();
+        if (e.key !== 'Enter' || !/^\d{8,14}$/.test(termo)) return;
+        e.preventDefault();
+
+        const local = window.CatalogoLocal ? CatalogoLocal.porCodigo(termo) : null;
+        if (local) {
+            abrirModalQtd(local);
+            return;
+        }
+
+        try {
+            const res = await fetch(`/api/produtos/?q=${termo}`);
+            if (!res.ok) throw new Error('Erro na busca');
+
+            const produtos = await res.json();
+            if (produtos.length === 1 && produtos[0].exato) abrirModalQtd(produtos[0]);
+        } catch (error) {
+            console.error("Falha ao buscar código de barras", error);
+        }
+    });
+}
+
 /**
  * Fecha a lista de sugestões se o utilizador clicar fora do input de busca.
  */